@@ -0,0 +1,273 @@
+from build.yaplParser import yaplParser
+from yaplAst import NodeKind
+
+# Class hierarchy of a program, built once from the syntax tree.
+#
+# Classes are kept in topological order (every parent before its children),
+# found with one pass over the inheritance edges, so cycles are detected in
+# O(N). Every class gets a preorder/postorder interval of the inheritance
+# tree: A conforms to B iff the interval of A is inside the one of B, an O(1)
+# check that needs no per-class ancestor set. Methods and attributes are
+# flattened per class (vtable style): inherited entries first, an override
+# keeps the slot of the method it replaces.
+
+ROOT_CLASS = "Object"
+SELF_TYPE = "SELF_TYPE"
+
+# name -> (parent, [(method, return type, [param types])])
+BUILTIN_CLASSES = {
+    "Object": (None, [
+        ("abort", "Object", []),
+        ("type_name", "String", []),
+        ("copy", SELF_TYPE, []),
+    ]),
+    "IO": ("Object", [
+        ("out_string", SELF_TYPE, ["String"]),
+        ("out_int", SELF_TYPE, ["Int"]),
+        ("in_string", "String", []),
+        ("in_int", "Int", []),
+    ]),
+    "Int": ("Object", []),
+    "Bool": ("Object", []),
+    "String": ("Object", [
+        ("length", "Int", []),
+        ("concat", "String", ["String"]),
+        ("substr", "String", ["Int", "Int"]),
+    ]),
+}
+
+
+def class_header(ast, node):
+    # (name, parents) terminals of a class_def: the TYPE_ID before INHERITS,
+    # -1 when missing, and the ones after it. A class being renamed parses as
+    # "class inherits B", with the parent as its only TYPE_ID
+    inherits = ast.token(node, yaplParser.INHERITS)
+    types = ast.tokens(node, yaplParser.TYPE_ID)
+    if inherits == -1:
+        return (types[0] if types else -1), []
+    name = types[0] if types and types[0] < inherits else -1
+    return name, [terminal for terminal in types if terminal > inherits]
+
+
+class Method:
+
+    __slots__ = ("name", "owner", "return_type", "param_types", "slot")
+
+    def __init__(self, name, owner, return_type, param_types):
+        self.name = name
+        self.owner = owner
+        self.return_type = return_type
+        self.param_types = param_types
+        # Position in the vtable of every class that has this method
+        self.slot = None
+
+    def same_signature(self, other):
+        return self.return_type == other.return_type and self.param_types == other.param_types
+
+
+class ClassInfo:
+
+    __slots__ = ("name", "parent", "position", "attributes", "methods", "method_table", "vtable", "attribute_table", "attribute_types", "depth", "pre", "post")
+
+    def __init__(self, name, parent, position=None):
+        self.name = name
+        self.parent = parent
+        # (line, column) of the class name, None for the basic classes
+        self.position = position
+        # Features declared by the class itself, in source order
+        self.attributes = {}
+        self.methods = {}
+        # Flattened tables, filled by ClassHierarchy
+        self.method_table = {}
+        self.vtable = []
+        self.attribute_table = []
+        self.attribute_types = {}
+        self.depth = 0
+        self.pre = None
+        self.post = None
+
+
+class ClassHierarchy:
+
+    def __init__(self):
+        self.classes = {}
+        # Parents first; classes in a cycle are left out
+        self.order = []
+        # Classes that are part of (or inherit from) an inheritance cycle
+        self.cycles = set()
+        # Every method name defined anywhere, for calls on a receiver of unknown type
+        self.method_names = set()
+
+        for name, (parent, methods) in BUILTIN_CLASSES.items():
+            info = self.classes[name] = ClassInfo(name, parent)
+            for method, return_type, param_types in methods:
+                info.methods[method] = Method(method, name, return_type, param_types)
+
+    @classmethod
+    def from_ast(cls, ast):
+        return cls.from_classes((ast, node) for node in ast.class_defs())
+
+    @classmethod
+    def from_classes(cls, class_defs):
+        # class_defs are (ast, class_def node) pairs
+        hierarchy = cls()
+        for ast, node in class_defs:
+            hierarchy.add_class(ast, node)
+        hierarchy.build()
+        return hierarchy
+
+    @classmethod
+    def from_signatures(cls, signatures):
+        # signatures are (name, parent, features, position), features being
+        # (name, type, [param types] or None for an attribute); yaplBuild
+        # keeps them in the interface of every class
+        hierarchy = cls()
+        for name, parent, features, position in signatures:
+            hierarchy.add_signature(name, parent, features, position)
+        hierarchy.build()
+        return hierarchy
+
+    def add_class(self, ast, node):
+        name, parents = class_header(ast, node)
+        # Classes and features the parser could not recognize are skipped
+        if name == -1:
+            return None
+        parent = ast.text(parents[0]) if parents else None
+
+        features = []
+        for feature in ast.children(node):
+            kind = ast.kind[feature]
+            if kind not in (NodeKind.FEAT_DEF, NodeKind.FEAT_ASGN):
+                continue
+            param_types = None
+            if kind == NodeKind.FEAT_DEF:
+                param_types = [str(ast.text(ast.token(formal, yaplParser.TYPE_ID))) for formal in ast.children(feature, NodeKind.FORMAL)]
+            features.append((str(ast.text(ast.token(feature, yaplParser.OBJECT_ID))), str(ast.text(ast.token(feature, yaplParser.TYPE_ID))), param_types))
+        return self.add_signature(ast.text(name), parent, features, ast.position(name))
+
+    def add_signature(self, name, parent, features, position):
+        # A redefinition does not replace the first class with that name
+        if name in self.classes and self.classes[name].position is not None:
+            return None
+
+        info = self.classes[name] = ClassInfo(name, parent if parent is not None else ROOT_CLASS, position)
+        for feature_name, feature_type, param_types in features:
+            if param_types is not None:
+                info.methods.setdefault(feature_name, Method(feature_name, name, feature_type, list(param_types)))
+            else:
+                info.attributes.setdefault(feature_name, feature_type)
+        return info
+
+    def build(self):
+        # Unknown parents are treated as Object so the rest of the index stays usable
+        children = {name: [] for name in self.classes}
+        roots = []
+        for info in self.classes.values():
+            if info.parent is None:
+                roots.append(info.name)
+            else:
+                if info.parent not in self.classes:
+                    info.parent = ROOT_CLASS
+                children[info.parent].append(info.name)
+
+        # Preorder walk from the roots; whatever is not reached hangs from a cycle
+        self.order = []
+        counter = 0
+        for root in roots:
+            pending = [(root, False)]
+            while pending:
+                name, done = pending.pop()
+                info = self.classes[name]
+                if done:
+                    info.post = counter
+                    counter += 1
+                    continue
+                info.pre = counter
+                counter += 1
+                if info.parent is not None:
+                    info.depth = self.classes[info.parent].depth + 1
+                self.order.append(name)
+                pending.append((name, True))
+                for child in reversed(children[name]):
+                    pending.append((child, False))
+
+        self.cycles = set(name for name, info in self.classes.items() if info.pre is None)
+
+        for name in self.order:
+            self.flatten(self.classes[name])
+            self.method_names.update(self.classes[name].methods)
+
+    def flatten(self, info):
+        parent = self.classes[info.parent] if info.parent is not None else None
+        info.method_table = dict(parent.method_table) if parent else {}
+        info.vtable = list(parent.vtable) if parent else []
+        info.attribute_table = list(parent.attribute_table) if parent else []
+        info.attribute_types = dict(parent.attribute_types) if parent else {}
+
+        for name, method in info.methods.items():
+            inherited = info.method_table.get(name)
+            if inherited is not None:
+                method.slot = inherited.slot
+                info.vtable[method.slot] = method
+            else:
+                method.slot = len(info.vtable)
+                info.vtable.append(method)
+            info.method_table[name] = method
+
+        for name, type_id in info.attributes.items():
+            if name not in info.attribute_types:
+                info.attribute_table.append((name, type_id))
+                info.attribute_types[name] = type_id
+
+    # ----------------------------------------------------------------------
+    # Queries
+    # ----------------------------------------------------------------------
+
+    def __contains__(self, name):
+        return str(name) in self.classes
+
+    def get(self, name):
+        return self.classes.get(str(name))
+
+    def conforms(self, name, ancestor):
+        # True if name is ancestor or inherits from it
+        info = self.classes.get(str(name))
+        other = self.classes.get(str(ancestor))
+        if info is None or other is None or info.pre is None or other.pre is None:
+            return False
+        return other.pre <= info.pre and info.post <= other.post
+
+    def ancestors(self, name):
+        # name and its ancestors, nearest first
+        info = self.classes.get(str(name))
+        while info is not None and info.pre is not None:
+            yield info.name
+            info = self.classes.get(info.parent) if info.parent is not None else None
+
+    def join(self, a, b):
+        # Nearest common ancestor of a and b
+        a, b = self.classes.get(str(a)), self.classes.get(str(b))
+        if a is None or b is None or a.pre is None or b.pre is None:
+            return ROOT_CLASS
+        while a.depth > b.depth:
+            a = self.classes[a.parent]
+        while b.depth > a.depth:
+            b = self.classes[b.parent]
+        while a is not b:
+            a, b = self.classes[a.parent], self.classes[b.parent]
+        return a.name
+
+    def lookup_method(self, name, method):
+        info = self.classes.get(str(name))
+        return info.method_table.get(str(method)) if info is not None else None
+
+    def lookup_attribute(self, name, attribute):
+        info = self.classes.get(str(name))
+        return info.attribute_types.get(str(attribute)) if info is not None else None
+
+    def overridden(self, name, method):
+        # Method of an ancestor that method of class name replaces, if any
+        info = self.classes.get(str(name))
+        if info is None or info.parent is None or info.pre is None:
+            return None
+        return self.lookup_method(info.parent, method)
@@ -0,0 +1,253 @@
+from collections import deque
+from intermediateCode import Op, Operand, KIND_MASK, DEFINING_OPS, uses, basic_blocks, function_ranges
+
+# Dataflow analyses over the intermediate code of one function.
+#
+# The control-flow graph has the basic blocks of the function body (the
+# instructions between FUNC and END_FUNC): the code of an if, a while or a
+# block of expressions only adds LABEL, GOTO and IF_FALSE instructions, so
+# they are what the edges come from. Sets of variables or definitions are
+# ints used as bitsets (bit i is item i of a BitIndex), and every analysis is
+# a gen/kill problem solved by solve() with a worklist:
+#
+#   Liveness             backward: variables read before written
+#   ReachingDefinitions  forward: definitions not overwritten yet
+#
+#   cfg = ControlFlowGraph(code)
+#   liveness = Liveness(cfg)
+#   liveness.variables.members(liveness.live_out[b])
+
+VARIABLE_KINDS = (Operand.TEMP, Operand.LOCAL)
+
+
+def variable_operands(instruction):
+    # (read, written) temporaries and locals of an instruction
+    op, arg1, arg2, result = instruction
+    read = [operand for operand in uses(op, arg1, arg2) if operand & KIND_MASK in VARIABLE_KINDS]
+    written = []
+    if op in DEFINING_OPS and result & KIND_MASK in VARIABLE_KINDS:
+        written.append(result)
+    elif op == Op.FORMAL:
+        written.append(arg1)
+    return read, written
+
+
+class BitIndex:
+
+    def __init__(self):
+        self.items = []
+        self.indexes = {}
+
+    def index(self, item):
+        if item not in self.indexes:
+            self.indexes[item] = len(self.items)
+            self.items.append(item)
+        return self.indexes[item]
+
+    def bit(self, item):
+        return 1 << self.index(item)
+
+    def bits(self, items):
+        bitset = 0
+        for item in items:
+            bitset |= 1 << self.index(item)
+        return bitset
+
+    def members(self, bitset):
+        members = []
+        while bitset:
+            low = bitset & -bitset
+            members.append(self.items[low.bit_length() - 1])
+            bitset ^= low
+        return members
+
+    def __len__(self):
+        return len(self.items)
+
+
+class ControlFlowGraph:
+
+    def __init__(self, code):
+        # code: [op, arg1, arg2, result] of a function body
+        self.code = code
+        self.blocks = basic_blocks(code)
+        self.successors = [[] for block in self.blocks]
+        self.predecessors = [[] for block in self.blocks]
+
+        label_block = {}
+        for b, (start, end) in enumerate(self.blocks):
+            if code[start][0] == Op.LABEL:
+                label_block[code[start][1]] = b
+
+        for b, (start, end) in enumerate(self.blocks):
+            op, arg1, arg2, result = code[end - 1]
+            following = [b + 1] if b + 1 < len(self.blocks) else []
+            if op == Op.GOTO:
+                following = [label_block[arg1]] if arg1 in label_block else []
+            elif op == Op.IF_FALSE and arg2 in label_block:
+                following = following + [label_block[arg2]]
+            elif op == Op.RETURN:
+                following = []
+            for successor in following:
+                if successor not in self.successors[b]:
+                    self.successors[b].append(successor)
+                    self.predecessors[successor].append(b)
+
+    @classmethod
+    def from_quads(cls, quads, start, end):
+        # Body of the function quads[start:end + 1]; block indexes are
+        # relative to start + 1
+        return cls([quads[i] for i in range(start + 1, end)])
+
+    def postorder(self):
+        # Blocks reachable from the entry, successors first
+        if not self.blocks:
+            return []
+        order = []
+        seen = {0}
+        stack = [(0, iter(self.successors[0]))]
+        while stack:
+            block, successors = stack[-1]
+            for successor in successors:
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append((successor, iter(self.successors[successor])))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        return order
+
+    def __len__(self):
+        return len(self.blocks)
+
+
+def solve(cfg, gen, kill, forward=True):
+    # (ins, outs) bitsets of every block for the transfer gen | (x & ~kill),
+    # with union as the meet
+    count = len(cfg.blocks)
+    ins = [0] * count
+    outs = [0] * count
+
+    if forward:
+        sources, targets, before, after = cfg.predecessors, cfg.successors, ins, outs
+        order = list(reversed(cfg.postorder()))
+    else:
+        sources, targets, before, after = cfg.successors, cfg.predecessors, outs, ins
+        order = cfg.postorder()
+    # Blocks the entry does not reach still get a value
+    reached = set(order)
+    order += [b for b in range(count) if b not in reached]
+
+    pending = deque(order)
+    queued = [True] * count
+    while pending:
+        b = pending.popleft()
+        queued[b] = False
+
+        value = 0
+        for source in sources[b]:
+            value |= after[source]
+        before[b] = value
+
+        value = gen[b] | (value & ~kill[b])
+        if value != after[b]:
+            after[b] = value
+            for target in targets[b]:
+                if not queued[target]:
+                    queued[target] = True
+                    pending.append(target)
+    return ins, outs
+
+
+class Liveness:
+
+    def __init__(self, cfg, operands=variable_operands):
+        # operands(instruction) -> (read, written) variables
+        self.cfg = cfg
+        self.operands = operands
+        self.variables = BitIndex()
+        gen = []
+        kill = []
+        for start, end in cfg.blocks:
+            read_first = 0
+            written = 0
+            for i in range(start, end):
+                read, write = operands(cfg.code[i])
+                read_first |= self.variables.bits(read) & ~written
+                written |= self.variables.bits(write)
+            gen.append(read_first)
+            kill.append(written)
+        self.live_in, self.live_out = solve(cfg, gen, kill, forward=False)
+
+    def backward(self, b):
+        # (i, variables live after instruction i) for the block, last first
+        start, end = self.cfg.blocks[b]
+        live = self.live_out[b]
+        for i in reversed(range(start, end)):
+            yield i, live
+            read, written = self.operands(self.cfg.code[i])
+            live = (live & ~self.variables.bits(written)) | self.variables.bits(read)
+
+
+class ReachingDefinitions:
+
+    def __init__(self, cfg, operands=variable_operands):
+        # Definitions are (instruction index, variable)
+        self.cfg = cfg
+        self.operands = operands
+        self.definitions = BitIndex()
+        # variable -> bitset of its definitions
+        self.of_variable = {}
+        for i, instruction in enumerate(cfg.code):
+            for variable in operands(instruction)[1]:
+                self.of_variable[variable] = self.of_variable.get(variable, 0) | self.definitions.bit((i, variable))
+
+        gen = []
+        kill = []
+        for start, end in cfg.blocks:
+            generated = 0
+            killed = 0
+            for i in range(start, end):
+                for variable in operands(cfg.code[i])[1]:
+                    others = self.of_variable[variable]
+                    generated = (generated & ~others) | self.definitions.bit((i, variable))
+                    killed |= others
+            gen.append(generated)
+            kill.append(killed)
+        self.reach_in, self.reach_out = solve(cfg, gen, kill, forward=True)
+
+    def forward(self, b):
+        # (i, definitions that reach instruction i) for the block, first first
+        start, end = self.cfg.blocks[b]
+        reaching = self.reach_in[b]
+        for i in range(start, end):
+            yield i, reaching
+            for variable in self.operands(self.cfg.code[i])[1]:
+                reaching = (reaching & ~self.of_variable[variable]) | self.definitions.bit((i, variable))
+
+    def reads(self):
+        # (i, variable, [instructions of the definitions that may reach the read])
+        for b in range(len(self.cfg.blocks)):
+            for i, reaching in self.forward(b):
+                for variable in self.operands(self.cfg.code[i])[0]:
+                    reached = reaching & self.of_variable.get(variable, 0)
+                    yield i, variable, [index for index, defined in self.definitions.members(reached)]
+
+
+def reads_of_defaults(quads, defaults):
+    # (name, position) of the let variables declared without a value that a
+    # read may see before anything else is assigned to them. defaults is
+    # yaplCodeGenerator.let_defaults: the value a let starts with is an
+    # ASSIGN, so a read is reached by that definition
+    found = []
+    for start, end in function_ranges(quads):
+        implicit = {i - start - 1 for i in range(start + 1, end) if i in defaults}
+        if not implicit:
+            continue
+        reaching = ReachingDefinitions(ControlFlowGraph.from_quads(quads, start, end))
+        for i, variable, definitions in reaching.reads():
+            for definition in definitions:
+                if definition in implicit and defaults[start + 1 + definition] not in found:
+                    found.append(defaults[start + 1 + definition])
+    return found
@@ -0,0 +1,158 @@
+import json
+from enum import IntEnum
+
+# Diagnostics of one analysis (lexer, parser and walker), in one place.
+#
+# Every diagnostic has a severity, a code and the position it refers to;
+# no ANTLR token is kept alive. Identical diagnostics (same severity, code,
+# message and position) are only kept once, and the analysis can be stopped
+# after max_errors errors: add() raises TooManyErrors once the limit is
+# reached, after keeping the error that reached it.
+#
+# Subscribers get every new diagnostic as it is found, so the output can be
+# streamed (write_text, write_json) instead of printed at the end:
+#
+#   diagnostics = Diagnostics(max_errors=100)
+#   diagnostics.subscribe(write_text(sys.stderr))
+#
+# sorted() returns them by position, the order of a report.
+
+# Codes
+SYNTAX = "syntax"
+UNDEFINED = "undefined"
+DUPLICATE = "duplicate"
+MAIN_CLASS = "main-class"
+MAIN_METHOD = "main-method"
+MAIN_INHERITS = "main-inherits"
+MAIN_PARAMS = "main-params"
+BASIC_INHERITANCE = "basic-inheritance"
+RECURSIVE_INHERITANCE = "recursive-inheritance"
+MULTIPLE_INHERITANCE = "multiple-inheritance"
+OVERRIDE_SIGNATURE = "override-signature"
+TYPE_MISMATCH = "type-mismatch"
+ARGUMENTS = "arguments"
+# Warnings
+UNASSIGNED = "unassigned"
+
+
+class Severity(IntEnum):
+    ERROR = 1
+    WARNING = 2
+    NOTE = 3
+
+
+class Diagnostic:
+
+    __slots__ = ("severity", "code", "msg", "line", "column")
+
+    def __init__(self, severity, code, msg, line=None, column=None):
+        self.severity = severity
+        self.code = code
+        self.msg = msg
+        self.line = line
+        self.column = column
+
+    def key(self):
+        return (self.severity, self.code, self.msg, self.line, self.column)
+
+    def position(self):
+        # Sort key; diagnostics without a position go last
+        return (self.line is None, self.line or 0, self.column or 0)
+
+    def to_dict(self):
+        return {"severity": self.severity.name.lower(), "code": self.code, "msg": self.msg, "line": self.line, "column": self.column}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(Severity[data["severity"].upper()], data["code"], data["msg"], data["line"], data["column"])
+
+    def __str__(self):
+        severity = self.severity.name.capitalize()
+        if self.line is None:
+            return "{severity}: {msg}".format(severity=severity, msg=self.msg)
+        return "{severity}: position {line}:{column} {msg}".format(severity=severity, line=self.line, column=self.column, msg=self.msg)
+
+
+class TooManyErrors(Exception):
+
+    def __init__(self, max_errors):
+        super().__init__("Se alcanzo el maximo de {max_errors} errores".format(max_errors=max_errors))
+        self.max_errors = max_errors
+
+
+class Diagnostics:
+
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors
+        # In the order they were found
+        self.items = []
+        self.keys = set()
+        self.error_count = 0
+        # Diagnostics that were dropped because an identical one was kept
+        self.duplicates = 0
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def add(self, diagnostic):
+        # Returns the diagnostic, or None if it was a duplicate
+        key = diagnostic.key()
+        if key in self.keys:
+            self.duplicates += 1
+            return None
+        self.keys.add(key)
+        self.items.append(diagnostic)
+        for callback in self.subscribers:
+            callback(diagnostic)
+
+        if diagnostic.severity == Severity.ERROR:
+            self.error_count += 1
+            if self.max_errors and self.error_count >= self.max_errors:
+                raise TooManyErrors(self.max_errors)
+        return diagnostic
+
+    def report(self, code, msg, line=None, column=None, severity=Severity.ERROR):
+        return self.add(Diagnostic(severity, code, msg, line, column))
+
+    def error(self, code, msg, position=None):
+        # Error at a (line, column) position, or without position
+        if position is None:
+            return self.report(code, msg)
+        return self.report(code, msg, *position)
+
+    def extend(self, diagnostics):
+        for diagnostic in diagnostics:
+            self.add(diagnostic)
+
+    def truncated(self):
+        return bool(self.max_errors) and self.error_count >= self.max_errors
+
+    def sorted(self):
+        # By position; the order they were found breaks ties
+        return sorted(self.items, key=Diagnostic.position)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+
+def write_text(file):
+    def write(diagnostic):
+        file.write(str(diagnostic) + "\n")
+    return write
+
+
+def write_json(file):
+    def write(diagnostic):
+        file.write(json.dumps(diagnostic.to_dict()) + "\n")
+    return write
@@ -0,0 +1,344 @@
+import json
+from array import array
+from enum import IntEnum
+
+# Three-address code stored as quadruples (op, arg1, arg2, result).
+#
+# The four fields live in parallel array('i') columns instead of one object
+# per instruction. Operands are tagged ints: the low 3 bits hold the operand
+# kind and the rest its payload. Temporaries and labels are just numbers;
+# constants, variable names and method/class names are stored once in a pool
+# and referenced by their position, so a program with 100k+ instructions
+# costs a few bytes per instruction.
+
+
+class Op(IntEnum):
+    ASSIGN = 0          # result = arg1
+    ADD = 1             # result = arg1 + arg2
+    SUB = 2             # result = arg1 - arg2
+    MUL = 3             # result = arg1 * arg2
+    DIV = 4             # result = arg1 / arg2
+    NEG = 5             # result = ~arg1
+    NOT = 6             # result = not arg1
+    LT = 7              # result = arg1 < arg2
+    LE = 8              # result = arg1 <= arg2
+    EQ = 9              # result = arg1 = arg2
+    ISVOID = 10         # result = isvoid arg1
+    LABEL = 11          # arg1:
+    GOTO = 12           # goto arg1
+    IF_FALSE = 13       # if_false arg1 goto arg2
+    PARAM = 14          # param arg1
+    CALL = 15           # result = call arg1, arg2 (dynamic dispatch on the first param)
+    STATIC_CALL = 16    # result = call arg1, arg2 (arg1 is "Type.method")
+    NEW = 17            # result = new arg1
+    CLASS = 18          # class arg1 inherits arg2
+    FUNC = 19           # function arg1, arg2 (arg1 is "Class.method", arg2 the number of formals)
+    FORMAL = 20         # formal arg1
+    RETURN = 21         # return arg1
+    END_FUNC = 22       # end function
+
+
+class Operand(IntEnum):
+    NONE = 0
+    TEMP = 1
+    LABEL = 2
+    LOCAL = 3           # formals, let variables and self
+    ATTR = 4            # attributes of self
+    CONST = 5           # Int, String, Bool or void
+    NAME = 6            # method and class names
+
+
+NONE = 0
+KIND_BITS = 3
+KIND_MASK = (1 << KIND_BITS) - 1
+
+BINARY_OPS = {Op.ADD: "+", Op.SUB: "-", Op.MUL: "*", Op.DIV: "/", Op.LT: "<", Op.LE: "<=", Op.EQ: "="}
+UNARY_OPS = {Op.NEG: "~", Op.NOT: "not ", Op.ISVOID: "isvoid "}
+
+# Operations without side effects whose result only depends on their arguments
+PURE_OPS = frozenset([Op.ASSIGN, Op.ADD, Op.SUB, Op.MUL, Op.DIV, Op.NEG, Op.NOT, Op.LT, Op.LE, Op.EQ, Op.ISVOID])
+# Operations that write their result field
+DEFINING_OPS = PURE_OPS | frozenset([Op.CALL, Op.STATIC_CALL, Op.NEW])
+# Operations that read arg1 / arg2 as values
+USES_ARG1 = frozenset([Op.ASSIGN, Op.ADD, Op.SUB, Op.MUL, Op.DIV, Op.NEG, Op.NOT, Op.LT, Op.LE, Op.EQ, Op.ISVOID, Op.IF_FALSE, Op.PARAM, Op.RETURN])
+USES_ARG2 = frozenset([Op.ADD, Op.SUB, Op.MUL, Op.DIV, Op.LT, Op.LE, Op.EQ])
+# Operations that end a basic block
+JUMP_OPS = frozenset([Op.GOTO, Op.IF_FALSE, Op.RETURN])
+
+# Name of the method that initializes the attributes of a class
+INIT_METHOD = "_init"
+
+
+def int_div(a, b):
+    # Integer division truncating toward zero
+    quotient = abs(a) // abs(b)
+    return quotient if (a >= 0) == (b >= 0) else -quotient
+
+
+def is_variable(operand):
+    # Temporaries, locals and attributes can be assigned; constants and names cannot
+    return (operand & KIND_MASK) in (Operand.TEMP, Operand.LOCAL, Operand.ATTR)
+
+
+def uses(op, arg1, arg2):
+    # Variable operands read by an instruction
+    used = []
+    if op in USES_ARG1 and arg1 & KIND_MASK in (Operand.TEMP, Operand.LOCAL, Operand.ATTR):
+        used.append(arg1)
+    if op in USES_ARG2 and arg2 & KIND_MASK in (Operand.TEMP, Operand.LOCAL, Operand.ATTR):
+        used.append(arg2)
+    return used
+
+
+def basic_blocks(code):
+    # (start, end) ranges, end excluded, of the basic blocks of a function body
+    blocks = []
+    start = 0
+    for i, instruction in enumerate(code):
+        if instruction[0] == Op.LABEL and i > start:
+            blocks.append((start, i))
+            start = i
+        if instruction[0] in JUMP_OPS:
+            blocks.append((start, i + 1))
+            start = i + 1
+    if start < len(code):
+        blocks.append((start, len(code)))
+    return blocks
+
+
+def function_ranges(quads):
+    # (start, end) of every FUNC ... END_FUNC, end included
+    start = None
+    for i, op in enumerate(quads.op):
+        if op == Op.FUNC:
+            start = i
+        elif op == Op.END_FUNC and start is not None:
+            yield start, i
+            start = None
+
+
+def operand_kind(operand):
+    return operand & KIND_MASK
+
+
+def operand_payload(operand):
+    return operand >> KIND_BITS
+
+
+class Quadruples:
+
+    def __init__(self):
+        self.op = array("i")
+        self.arg1 = array("i")
+        self.arg2 = array("i")
+        self.result = array("i")
+
+        # Pool of constants and names, deduplicated through pool_ids
+        self.pool = []
+        self.pool_ids = {}
+
+        self.temp_count = 0
+        self.label_count = 0
+
+        # Static class of the receiver of each CALL, by the temporary it defines
+        self.receivers = {}
+
+    def __len__(self):
+        return len(self.op)
+
+    def __getitem__(self, i):
+        return self.op[i], self.arg1[i], self.arg2[i], self.result[i]
+
+    def __iter__(self):
+        return zip(self.op, self.arg1, self.arg2, self.result)
+
+    def emit(self, op, arg1=NONE, arg2=NONE, result=NONE):
+        self.op.append(op)
+        self.arg1.append(arg1)
+        self.arg2.append(arg2)
+        self.result.append(result)
+        return len(self.op) - 1
+
+    def set(self, i, op, arg1=NONE, arg2=NONE, result=NONE):
+        self.op[i] = op
+        self.arg1[i] = arg1
+        self.arg2[i] = arg2
+        self.result[i] = result
+
+    def extend(self, other):
+        # Appends the code of another Quadruples: its constants and names go
+        # to this pool, its temporaries and labels after the ones used here
+        temps = self.temp_count << KIND_BITS
+        labels = self.label_count << KIND_BITS
+        pooled = {}
+
+        def operand(value):
+            kind = value & KIND_MASK
+            if kind == Operand.TEMP:
+                return value + temps
+            if kind == Operand.LABEL:
+                return value + labels
+            if kind in (Operand.LOCAL, Operand.ATTR, Operand.CONST, Operand.NAME):
+                if value not in pooled:
+                    pooled[value] = self.pooled(kind, other.pool[value >> KIND_BITS])
+                return pooled[value]
+            return value
+
+        for op, arg1, arg2, result in other:
+            self.emit(op, operand(arg1), operand(arg2), operand(result))
+        for temp, type_name in other.receivers.items():
+            self.receivers[temp + temps] = type_name
+        self.temp_count += other.temp_count
+        self.label_count += other.label_count
+
+    def replace(self, instructions):
+        # Replaces the whole code with a list of (op, arg1, arg2, result)
+        self.op = array("i", [instruction[0] for instruction in instructions])
+        self.arg1 = array("i", [instruction[1] for instruction in instructions])
+        self.arg2 = array("i", [instruction[2] for instruction in instructions])
+        self.result = array("i", [instruction[3] for instruction in instructions])
+
+    # ----------------------------------------------------------------------
+    # Operands
+    # ----------------------------------------------------------------------
+
+    def pooled(self, kind, value):
+        # bool is a subclass of int, so the type is part of the key (1 != true)
+        key = (kind, type(value).__name__, value)
+        index = self.pool_ids.get(key)
+        if index is None:
+            index = len(self.pool)
+            self.pool_ids[key] = index
+            self.pool.append(value)
+        return (index << KIND_BITS) | kind
+
+    def temp(self):
+        self.temp_count += 1
+        return (self.temp_count << KIND_BITS) | Operand.TEMP
+
+    def label(self):
+        self.label_count += 1
+        return (self.label_count << KIND_BITS) | Operand.LABEL
+
+    def const(self, value):
+        return self.pooled(Operand.CONST, value)
+
+    def local(self, name):
+        return self.pooled(Operand.LOCAL, name)
+
+    def attr(self, name):
+        return self.pooled(Operand.ATTR, name)
+
+    def name(self, name):
+        return self.pooled(Operand.NAME, name)
+
+    def value(self, operand):
+        # Python value of a pooled operand (constant value or name)
+        return self.pool[operand >> KIND_BITS]
+
+    def format(self, operand):
+        kind = operand & KIND_MASK
+        payload = operand >> KIND_BITS
+
+        if kind == Operand.NONE:
+            return ""
+        if kind == Operand.TEMP:
+            return "t{n}".format(n=payload)
+        if kind == Operand.LABEL:
+            return "L{n}".format(n=payload)
+        if kind == Operand.ATTR:
+            return "self.{name}".format(name=self.pool[payload])
+        if kind == Operand.CONST:
+            value = self.pool[payload]
+            if value is None:
+                return "void"
+            if isinstance(value, bool):
+                return "true" if value else "false"
+            if isinstance(value, str):
+                return json.dumps(value)
+            return str(value)
+        return str(self.pool[payload])
+
+    # ----------------------------------------------------------------------
+    # Text and serialization
+    # ----------------------------------------------------------------------
+
+    def to_string(self, i):
+        op, arg1, arg2, result = self[i]
+        a1, a2, r = self.format(arg1), self.format(arg2), self.format(result)
+
+        if op == Op.ASSIGN:
+            return "{r} = {a1}".format(r=r, a1=a1)
+        if op in BINARY_OPS:
+            return "{r} = {a1} {op} {a2}".format(r=r, a1=a1, op=BINARY_OPS[op], a2=a2)
+        if op in UNARY_OPS:
+            return "{r} = {op}{a1}".format(r=r, op=UNARY_OPS[op], a1=a1)
+        if op == Op.LABEL:
+            return "{a1}:".format(a1=a1)
+        if op == Op.GOTO:
+            return "goto {a1}".format(a1=a1)
+        if op == Op.IF_FALSE:
+            return "if_false {a1} goto {a2}".format(a1=a1, a2=a2)
+        if op == Op.PARAM:
+            return "param {a1}".format(a1=a1)
+        if op in (Op.CALL, Op.STATIC_CALL):
+            return "{r} = call {a1}, {a2}".format(r=r, a1=a1, a2=a2)
+        if op == Op.NEW:
+            return "{r} = new {a1}".format(r=r, a1=a1)
+        if op == Op.CLASS:
+            return "class {a1} inherits {a2}".format(a1=a1, a2=a2) if arg2 else "class {a1}".format(a1=a1)
+        if op == Op.FUNC:
+            return "function {a1}, {a2}:".format(a1=a1, a2=a2)
+        if op == Op.FORMAL:
+            return "formal {a1}".format(a1=a1)
+        if op == Op.RETURN:
+            return "return {a1}".format(a1=a1)
+        if op == Op.END_FUNC:
+            return "end function"
+        return "{op} {a1} {a2} {r}".format(op=Op(op).name, a1=a1, a2=a2, r=r)
+
+    def lines(self):
+        for i in range(len(self)):
+            op = self.op[i]
+            text = self.to_string(i)
+            # Labels and function headers are not indented
+            if op in (Op.LABEL, Op.FUNC, Op.END_FUNC, Op.CLASS):
+                yield text
+            else:
+                yield "    " + text
+
+    def __str__(self):
+        return "\n".join(self.lines())
+
+    def to_dict(self):
+        return {
+            "op": self.op.tolist(),
+            "arg1": self.arg1.tolist(),
+            "arg2": self.arg2.tolist(),
+            "result": self.result.tolist(),
+            "pool": self.pool,
+            "temp_count": self.temp_count,
+            "label_count": self.label_count,
+            "receivers": sorted(self.receivers.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        quads = cls()
+        quads.op = array("i", data["op"])
+        quads.arg1 = array("i", data["arg1"])
+        quads.arg2 = array("i", data["arg2"])
+        quads.result = array("i", data["result"])
+        quads.temp_count = data["temp_count"]
+        quads.label_count = data["label_count"]
+        quads.receivers = {temp: type_name for temp, type_name in data.get("receivers", [])}
+
+        # Rebuild the pool ids from the operands that reference each entry
+        quads.pool = list(data["pool"])
+        for column in (quads.arg1, quads.arg2, quads.result):
+            for operand in column:
+                kind = operand & KIND_MASK
+                if kind in (Operand.LOCAL, Operand.ATTR, Operand.CONST, Operand.NAME):
+                    value = quads.pool[operand >> KIND_BITS]
+                    quads.pool_ids.setdefault((kind, type(value).__name__, value), operand >> KIND_BITS)
+        return quads
@@ -1,17 +1,19 @@
-
-import sys
-import os
-from antlr4 import *
-from build.yaplLexer import yaplLexer
-from build.yaplParser import yaplParser
-from yaplWalker import yaplWalker
-from yaplErrorListener import yaplErrorListener
+from yaplSession import AnalysisWorker, write_output, MAX_ERRORS
+from symbolTable import SymbolKind, COLUMNS
+from yaplIncremental import IncrementalAnalyzer
 
 import tkinter as tk
 from tkinter import *
 from tkinter.ttk import *
 from tkinter.filedialog import askopenfile
-from prettytable import PrettyTable
+
+# Milliseconds between checks for finished analyses
+POLL_INTERVAL = 50
+# Milliseconds without typing before the buffer is checked again
+LIVE_CHECK_DELAY = 300
+# Pixels of a row of the symbol table view, and rows moved by the mouse wheel
+ROW_HEIGHT = 20
+WHEEL_ROWS = 3
 
 # Paleta de colores
 PALETTE = {
@@ -48,25 +50,116 @@ class LineNumbers(tk.Text):
         super().__init__(master, **kwargs)
 
         self.text_widget = text_widget
-        self.text_widget.bind('<KeyPress>', self.on_key_press)
+        self.text_widget.bind('<KeyRelease>', self.on_key_press, add='+')
 
+        self.lines = 1
         self.insert(1.0, '1')
-        self.configure(state='disabled')
+        self.configure(state='disabled', width=2)
 
     def on_key_press(self, event=None):
-        final_index = str(self.text_widget.index(tk.END))
-        num_of_lines = final_index.split('.')[0]
-        line_numbers_string = "\n".join(str(no + 1) for no in range(int(num_of_lines)))
-        width = len(str(num_of_lines))
-
-        self.configure(state='normal', width=width+1 if int(num_of_lines) < 10 else width)
-        self.delete(1.0, tk.END)
-        self.insert(1.0, line_numbers_string)
+        # Only the rows after the last line that did not change are rewritten
+        num_of_lines = int(self.text_widget.index('end-1c').split('.')[0])
+        if num_of_lines == self.lines:
+            return
+
+        self.configure(state='normal')
+        if num_of_lines > self.lines:
+            self.insert(tk.END, "".join("\n" + str(no) for no in range(self.lines + 1, num_of_lines + 1)))
+        else:
+            self.delete("{line}.end".format(line=num_of_lines), tk.END)
+        if len(str(num_of_lines)) != len(str(self.lines)):
+            width = len(str(num_of_lines))
+            self.configure(width=width+1 if num_of_lines < 10 else width)
         self.configure(state='disabled')
+        self.lines = num_of_lines
 
     
 
 
+# Symbol table view: the Treeview only has items for the rows that fit in it.
+# Scrolling moves a window over the selected rows and refills those items, so
+# the cost of showing a table does not depend on its size
+class SymbolTableView(Frame):
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+
+        self.table = None
+        # Rows of the table that pass the filters, and the first one shown
+        self.rows = []
+        self.offset = 0
+        self.visible_rows = 10
+
+        filters = Frame(self)
+        self.kind = Combobox(filters, values=[""] + [kind.name for kind in SymbolKind], state="readonly", width=12)
+        self.scope = Entry(filters, width=16)
+        self.name = Entry(filters, width=24)
+        self.count = Label(filters, text="")
+        Label(filters, text="kind").pack(side=tk.LEFT, padx=(0, 4))
+        self.kind.pack(side=tk.LEFT, padx=(0, 10))
+        Label(filters, text="scope").pack(side=tk.LEFT, padx=(0, 4))
+        self.scope.pack(side=tk.LEFT, padx=(0, 10))
+        Label(filters, text="id").pack(side=tk.LEFT, padx=(0, 4))
+        self.name.pack(side=tk.LEFT, padx=(0, 10))
+        self.count.pack(side=tk.LEFT)
+        self.kind.bind('<<ComboboxSelected>>', self.apply_filters)
+        self.scope.bind('<KeyRelease>', self.apply_filters)
+        self.name.bind('<KeyRelease>', self.apply_filters)
+
+        self.tree = Treeview(self, columns=COLUMNS, show="headings", height=self.visible_rows, selectmode="browse")
+        for column in COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=80, stretch=True)
+        self.scrollbar = Scrollbar(self, command=self.on_scroll)
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<MouseWheel>', self.on_wheel)
+        self.tree.bind('<Button-4>', self.on_wheel)
+        self.tree.bind('<Button-5>', self.on_wheel)
+
+        filters.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    def load(self, table):
+        self.table = table
+        self.apply_filters()
+
+    def apply_filters(self, event=None):
+        if self.table is None:
+            self.rows = []
+            self.count["text"] = ""
+        else:
+            self.rows = self.table.select(kind=self.kind.get() or None, scope=self.scope.get() or None, name=self.name.get())
+            self.count["text"] = "{shown} de {total} simbolos".format(shown=len(self.rows), total=len(self.table.records))
+        self.scroll_to(0)
+
+    def scroll_to(self, offset):
+        self.offset = max(0, min(offset, len(self.rows) - self.visible_rows))
+        self.tree.delete(*self.tree.get_children())
+        for row in self.rows[self.offset:self.offset + self.visible_rows]:
+            self.tree.insert("", tk.END, values=[str(value) for value in self.table.records[row].values()])
+
+        total = len(self.rows) or 1
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.rows)))
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self.scroll_to(self.offset + int(amount) * step)
+
+    def on_wheel(self, event):
+        up = event.num == 4 or event.delta > 0
+        self.scroll_to(self.offset + (-WHEEL_ROWS if up else WHEEL_ROWS))
+
+    def on_resize(self, event):
+        # One row of the height is taken by the headings
+        visible_rows = max(1, event.height // ROW_HEIGHT - 1)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.scroll_to(self.offset)
+
+
 def open_file():
     file_path = askopenfile(initialdir = "./input", mode='r', filetypes=[('YAPL Files', '*yapl'), ("all files", "*.*")])
     if file_path is not None:
@@ -77,78 +170,63 @@ def open_file():
         archivo1_ = "input/" + filename_splited
 
         content = file_path.read()
+        # The session is reused, so a new file replaces the buffer
+        text_area_code.delete('1.0', tk.END)
         text_area_code.insert(tk.INSERT, content, "\n")
+        l.on_key_press()
+        schedule_check()
         runbtn.config(state="normal")
 
 def run():
-    with open('input/temp.yapl', 'w') as f:
-        fetched_content = text_area_code.get('1.0', 'end-1c')
-        f.write(fetched_content)
-    run_main.set(True)
+    # The buffer goes straight to the worker thread; a run in progress is
+    # superseded and its result dropped
+    worker.submit(text_area_code.get('1.0', 'end-1c'))
+    label_file_explorer["text"] = "Analizando..."
+
+def schedule_check(event=None):
+    # Debounced: every key restarts the countdown
+    global pending_check
+    if pending_check is not None:
+        window.after_cancel(pending_check)
+    pending_check = window.after(LIVE_CHECK_DELAY, live_check)
+
+def live_check():
+    # Only the classes touched since the last check are parsed and walked again
+    global pending_check
+    pending_check = None
+    worker.submit(text_area_code.get('1.0', 'end-1c'), analyzer.check)
+
+def show_diagnostics(result):
+    text_area_code.tag_remove("error", '1.0', tk.END)
+    for diagnostic in result["diagnostics"]:
+        if diagnostic["line"] is not None:
+            text_area_code.tag_add("error", "{line}.0".format(line=diagnostic["line"]), "{line}.end".format(line=diagnostic["line"]))
+    label_file_explorer["text"] = "{errors} errores, {ms:.0f} ms".format(errors=len(result["diagnostics"]), ms=result["seconds"] * 1000)
 
 def clear():
-    python = sys.executable
-    os.execl(python, python, * sys.argv)
+    global pending_check
+    if pending_check is not None:
+        window.after_cancel(pending_check)
+        pending_check = None
+    worker.cancel()
+    text_area_code.tag_remove("error", '1.0', tk.END)
+    text_area_code.delete('1.0', tk.END)
+    symbol_view.load(None)
+    l.on_key_press()
+    label_file_explorer["text"] = " "
 
 def main():
-    # input = FileStream(argv[1])
-    input = FileStream('input/temp.yapl')
-
-    lexer = yaplLexer(input)
-    lexer.removeErrorListeners()
-    lexer.addErrorListener(yaplErrorListener())
-
-    stream = CommonTokenStream(lexer)
-    stream.fill()
-
-    print("Tokens:")
-    for token in stream.tokens:
-        print(token)
-
-    parser = yaplParser(stream)
-    parser.removeErrorListeners()
-    parser.addErrorListener(yaplErrorListener())
-
-    tree = parser.prog()
-    print("\nParse Tree:")
-    print(tree.toStringTree(parser.ruleNames))
-
-    walker = yaplWalker()
-    walker.initSymbolTable()
-    walker.visit(tree)
-
-    cont = 0
-    print("\nSymbol Table:")
-    myTable = PrettyTable()
-    for record in walker.symbolTable.records:
-        cont = cont + 1
-        # print("Symbol", record.toString())
-        myTable.field_names = record.keys()
-        myTable.add_row(record.values())
-    print(myTable)
-    text_area_symbolT.insert(tk.INSERT, myTable)
-
-
-
-    if len(walker.errors) >= 1:
-        print("\n" + yaplErrorListener.ANSI_RED)
-        print("----------------------------- ERROR -----------------------------")
-        for error in walker.errors:
-            if "payload" in error:
-                print("Error: position " + str(error["payload"].line) + ":" + str(error["payload"].column) + " " + error["msg"])
-                
-            else:
-                print("Error: " + error["msg"])
-            
-
-        print("-----------------------------------------------------------------")
-        print("\n" + yaplErrorListener.ANSI_RESET)
-
-
-    
-
-    
-
+    # Shows the newest finished analysis, then polls again; it runs on the Tk
+    # mainloop, never on the worker thread
+    result = worker.poll()
+    if result is not None and "diagnostics" in result:
+        show_diagnostics(result)
+        symbol_view.load(result["symbol_table"])
+    elif result is not None:
+        write_output(result["output"])
+        symbol_view.load(result["symbol_table"])
+        label_file_explorer["text"] = "{errors} errores, {ms:.0f} ms".format(errors=result["errors"], ms=result["seconds"] * 1000)
+    window.after(POLL_INTERVAL, main)
 
 
 if __name__ == '__main__':
@@ -157,7 +235,9 @@ if __name__ == '__main__':
     window.state('zoomed')
     window.configure(bg=PALETTE["background"])
 
-    run_main = BooleanVar()
+    worker = AnalysisWorker()
+    analyzer = IncrementalAnalyzer(max_errors=MAX_ERRORS)
+    pending_check = None
 
     # Styling UI elements
     style = Style()
@@ -171,8 +251,11 @@ if __name__ == '__main__':
     label_file_explorer = tk.Label(window, text=" ", width=20, height=2, fg=PALETTE["text"], bg=PALETTE["background"])
 
     frame_code, text_area_code = create_text_area(window, font=("Consolas", 12), fg=PALETTE["text"], bg=PALETTE["code_background"], highlightthickness=0)
-    frame_symbolT, text_area_symbolT = create_text_area(window, font=("Consolas", 10), fg="skyblue", bg=PALETTE["symbolT_background"], highlightthickness=0)
+    style.configure("Treeview", background=PALETTE["symbolT_background"], fieldbackground=PALETTE["symbolT_background"], foreground="skyblue", font=("Consolas", 10), rowheight=ROW_HEIGHT)
+    symbol_view = SymbolTableView(window)
     l = LineNumbers(window, text_area_code, font=("Consolas", 12), fg="gray", bg="#2e2e2e", highlightthickness=0)
+    text_area_code.tag_configure("error", foreground=PALETTE["highlight"], underline=True)
+    text_area_code.bind('<KeyRelease>', schedule_check, add='+')
 
     # Add elements to UI
     adharbtn.grid(row=0, column=0, padx=(10, 10), pady=(10, 0), sticky="news")
@@ -183,13 +266,12 @@ if __name__ == '__main__':
 
     l.grid(row=1, column=0, sticky="ns", padx=(10, 0))
     frame_code.grid(row=1, column=1, columnspan=4, pady=(10, 10), padx=(10, 10), sticky="news")
-    frame_symbolT.grid(row=2, column=0, columnspan=5, pady=(10, 10), padx=(10, 10), sticky="news")
+    symbol_view.grid(row=2, column=0, columnspan=5, pady=(10, 10), padx=(10, 10), sticky="news")
 
     # Stretch configurations
     for i in range(5):
         window.grid_columnconfigure(i, weight=1)
     window.grid_rowconfigure(1, weight=1)
 
-    runbtn.wait_variable(run_main)
     main()
     window.mainloop()
\ No newline at end of file
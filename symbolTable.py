@@ -0,0 +1,468 @@
+import sys
+from array import array
+from enum import IntEnum
+
+
+class SymbolKind(IntEnum):
+    TYPE_ID = 0
+    OBJECT_ID = 1
+    INT = 2
+    STRING = 3
+    TRUE = 4
+    FALSE = 5
+
+
+class ScopeType(IntEnum):
+    GLOBAL = 0
+    LOCAL = 1
+
+
+# Sentinel for missing integers in the columnar export
+NO_VALUE = -1
+
+# Fields of a row of the table, in Symbol.values() order
+COLUMNS = ("kind", "id", "class_type", "line", "column", "value", "scope", "scope_type", "numParams", "paramTypes", "size", "max_size", "address_id")
+
+# Main cannot inherit from IO, so its methods are visible from every class
+BUILTIN_CLASS = "IO"
+
+ESCAPES = {"b": "\b", "t": "\t", "n": "\n", "f": "\f", "r": "\r", '"': '"', "\\": "\\", "/": "/"}
+
+
+def string_value(text):
+    # Value of a STRING token: without the quotes and with the escapes applied
+    text = text[1:-1]
+    if "\\" not in text:
+        return text
+
+    value = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            char = text[i + 1]
+            if char == "u":
+                value.append(chr(int(text[i + 2:i + 6], 16)))
+                i += 6
+                continue
+            value.append(ESCAPES.get(char, char))
+            i += 2
+            continue
+        value.append(char)
+        i += 1
+    return "".join(value)
+
+
+def to_kind(kind):
+    if isinstance(kind, SymbolKind):
+        return kind
+    return SymbolKind[str(kind)]
+
+
+def to_scope_type(scope_type):
+    if scope_type is None or isinstance(scope_type, ScopeType):
+        return scope_type
+    return ScopeType[str(scope_type).upper()]
+
+
+def literal_value(kind, text):
+    # Python value of the text of a literal token
+    kind = to_kind(kind)
+    if kind == SymbolKind.INT:
+        return int(text)
+    if kind == SymbolKind.STRING:
+        return string_value(text)
+    return kind == SymbolKind.TRUE
+
+
+def table_lines(rows, values=lambda row: row):
+    # Text table (columns COLUMNS) of rows, one line at a time, so it can be
+    # written while it is built. values(row) gives the values of a row; rows
+    # is iterated twice, the first pass only measures the columns
+    widths = [len(column) for column in COLUMNS]
+    for row in rows:
+        for i, value in enumerate(values(row)):
+            widths[i] = max(widths[i], len(str(value)))
+
+    border = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+    yield border
+    yield "| " + " | ".join(column.center(width) for column, width in zip(COLUMNS, widths)) + " |"
+    yield border
+    for row in rows:
+        yield "| " + " | ".join(str(value).center(width) for value, width in zip(values(row), widths)) + " |"
+    yield border
+
+
+def intern(value):
+    # Names are stored as interned strings so no ANTLR node is kept alive
+    if value is None:
+        return None
+    return sys.intern(str(value))
+
+
+class Symbol:
+
+    __slots__ = ("kind", "id", "class_type", "line", "column", "value", "scope", "scope_type", "numParams", "paramTypes", "size", "max_size", "address_id")
+
+    def __init__(self, kind, id, class_type, line, column, value, scope, scope_type, numParams, paramTypes, size, max_size, address_id):
+        self.kind = to_kind(kind)
+        self.id = intern(id)
+        self.class_type = intern(class_type)
+        self.line = line
+        self.column = column
+        self.value = value
+        self.scope = intern(scope)
+        self.scope_type = to_scope_type(scope_type)
+        self.numParams = numParams
+        self.paramTypes = paramTypes
+        self.size = size
+        self.max_size = max_size
+        self.address_id = address_id
+
+    def keys(self):
+        return list(COLUMNS)
+
+    def values(self):
+        scope_type = self.scope_type.name.lower() if self.scope_type is not None else None
+        return [self.kind.name, self.id, self.class_type, self.line, self.column, self.value, self.scope, scope_type, self.numParams, self.paramTypes, self.size, self.max_size, self.address_id]
+
+
+class Constant:
+
+    __slots__ = ("index", "kind", "value", "symbol", "occurrences")
+
+    def __init__(self, index, kind, value, symbol):
+        self.index = index
+        self.kind = kind
+        self.value = value
+        # Row of the symbol table for this literal
+        self.symbol = symbol
+        # (line, column) of every occurrence, in source order
+        self.occurrences = []
+
+
+class ConstantPool:
+
+    # Every distinct literal of the program, once. Indexes are stable (the
+    # order of the first occurrence), so the code generator can reference a
+    # literal by its position in the pool.
+
+    def __init__(self):
+        self.constants = []
+        # (kind, value) -> Constant; the kind keeps 1 and true apart
+        self.index = {}
+
+    def __len__(self):
+        return len(self.constants)
+
+    def __iter__(self):
+        return iter(self.constants)
+
+    def __getitem__(self, index):
+        return self.constants[index]
+
+    def find(self, kind, value):
+        return self.index.get((to_kind(kind), value))
+
+
+class Scope:
+
+    # One scope of the chain: a class (global), a method or a let (local).
+    # parent is the enclosing scope, or the scope of the inherited class for
+    # a class scope, so a lookup walks local -> method -> class -> ancestors.
+
+    __slots__ = ("name", "scope_type", "parent", "symbols")
+
+    def __init__(self, name, scope_type, parent=None):
+        self.name = intern(name)
+        self.scope_type = scope_type
+        self.parent = parent
+        # id -> Symbol declared in this scope
+        self.symbols = {}
+
+    def lookup(self, id):
+        scope = self
+        while scope is not None:
+            symbol = scope.symbols.get(id)
+            if symbol is not None:
+                return symbol
+            scope = scope.parent
+        return None
+
+
+class SymbolColumns:
+
+    # Array-backed copy of a SymbolTable. Integer fields live in array('i')
+    # (NO_VALUE for None) and strings are stored once in `strings` and
+    # referenced by position, so rows can be filtered without building dicts.
+
+    def __init__(self, records):
+        self.strings = []
+        self.string_ids = {}
+
+        self.kind = array("b")
+        self.scope_type = array("b")
+        self.id = array("i")
+        self.class_type = array("i")
+        self.scope = array("i")
+        self.line = array("i")
+        self.column = array("i")
+        self.numParams = array("i")
+
+        for symbol in records:
+            self.kind.append(symbol.kind)
+            self.scope_type.append(NO_VALUE if symbol.scope_type is None else symbol.scope_type)
+            self.id.append(self.string_id(symbol.id))
+            self.class_type.append(self.string_id(symbol.class_type))
+            self.scope.append(self.string_id(symbol.scope))
+            self.line.append(NO_VALUE if symbol.line is None else symbol.line)
+            self.column.append(NO_VALUE if symbol.column is None else symbol.column)
+            self.numParams.append(NO_VALUE if symbol.numParams is None else symbol.numParams)
+
+    def __len__(self):
+        return len(self.kind)
+
+    def string_id(self, value):
+        if value is None:
+            return NO_VALUE
+        if value not in self.string_ids:
+            self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return self.string_ids[value]
+
+    def string(self, string_id):
+        return None if string_id == NO_VALUE else self.strings[string_id]
+
+    def select(self, kind=None, id=None, scope=None, scope_type=None):
+        # Returns the row numbers that match every given filter
+        rows = range(len(self))
+        if kind is not None:
+            kind = to_kind(kind)
+            rows = [row for row in rows if self.kind[row] == kind]
+        if scope_type is not None:
+            scope_type = to_scope_type(scope_type)
+            rows = [row for row in rows if self.scope_type[row] == scope_type]
+        for column, value in ((self.id, id), (self.scope, scope)):
+            if value is not None:
+                string_id = self.string_ids.get(str(value), None)
+                rows = [row for row in rows if string_id is not None and column[row] == string_id]
+        return list(rows)
+
+    def row(self, row):
+        return {
+            "kind": SymbolKind(self.kind[row]).name,
+            "id": self.string(self.id[row]),
+            "class_type": self.string(self.class_type[row]),
+            "line": None if self.line[row] == NO_VALUE else self.line[row],
+            "column": None if self.column[row] == NO_VALUE else self.column[row],
+            "scope": self.string(self.scope[row]),
+            "scope_type": None if self.scope_type[row] == NO_VALUE else ScopeType(self.scope_type[row]).name.lower(),
+            "numParams": None if self.numParams[row] == NO_VALUE else self.numParams[row],
+        }
+
+
+class SymbolTable:
+
+    def __init__(self):
+        # Ordered view of every symbol, used to render the table
+        self.records = []
+        # Index (kind, id, scope, scope_type) -> first symbol added with that key
+        self.index = {}
+        # Index (kind, id) -> first symbol added with that kind and id, in any scope
+        self.index_by_id = {}
+        # Rows (positions in records) of every kind, scope and id, in order
+        self.rows_by_kind = {}
+        self.rows_by_scope = {}
+        self.rows_by_id = {}
+        # Literals, one symbol per distinct value
+        self.constants = ConstantPool()
+        # (len(records), kind, text, line, column, max_size) of every literal
+        # occurrence, in order
+        self.literals = []
+        # Open scopes, innermost last, and the scope of every class by name
+        self.scopes = []
+        self.class_scopes = {}
+
+    def add(
+        self,
+        kind,
+        id,
+        class_type=None,
+        line=None,
+        column=None,
+        value=None,
+        scope=None,
+        scope_type=None,
+        is_array=False,
+        numParams=None,
+        paramTypes=None,
+        size=None,
+        max_size=None,
+        address_id=None,
+    ):
+
+        if not is_array:
+
+            # Default values for the basic types
+            if str(class_type) == "String" and not value:
+                value = ""
+            elif str(class_type) == "Int" and not value:
+                value = 0
+            elif str(class_type) == "Bool" and not value:
+                value = False
+
+            symbol = Symbol(
+                kind,
+                id,
+                class_type,
+                line,
+                column,
+                value,
+                scope,
+                scope_type,
+                numParams,
+                paramTypes,
+                size,
+                max_size,
+                address_id,
+            )
+            return self.register(symbol)
+
+    def register(self, symbol):
+        # Adds an existing Symbol to the records, the indexes and its scope
+        row = len(self.records)
+        self.records.append(symbol)
+        self.rows_by_kind.setdefault(symbol.kind, []).append(row)
+        self.rows_by_scope.setdefault(symbol.scope, []).append(row)
+        self.rows_by_id.setdefault(symbol.id, []).append(row)
+
+        # find() returns the first match, so later duplicates must not replace it
+        self.index.setdefault((symbol.kind, symbol.id, symbol.scope, symbol.scope_type), symbol)
+        self.index_by_id.setdefault((symbol.kind, symbol.id), symbol)
+
+        # Attributes and methods belong to the scope of their class, locals
+        # to the innermost open scope
+        if symbol.kind == SymbolKind.OBJECT_ID:
+            if symbol.scope_type == ScopeType.GLOBAL and symbol.scope is not None:
+                self.class_scope(symbol.scope).symbols.setdefault(symbol.id, symbol)
+            elif symbol.scope_type == ScopeType.LOCAL and self.scopes:
+                self.scopes[-1].symbols.setdefault(symbol.id, symbol)
+        return symbol
+
+    def add_literal(self, kind, text, line=None, column=None, max_size=None):
+        # Adds an occurrence of a literal; only its first occurrence adds a
+        # symbol, whose address_id is the index in the pool. Returns the Constant
+        kind = to_kind(kind)
+        value = literal_value(kind, text)
+        constant = self.constants.find(kind, value)
+        self.literals.append((len(self.records), kind, text, line, column, max_size))
+
+        if constant is None:
+            symbol = self.add(
+                kind,
+                text,
+                line=line,
+                column=column,
+                value=value,
+                size=sys.getsizeof(value),
+                max_size=max_size,
+                address_id=len(self.constants),
+            )
+            constant = Constant(len(self.constants), kind, value, symbol)
+            self.constants.constants.append(constant)
+            self.constants.index[(kind, value)] = constant
+
+        constant.occurrences.append((line, column))
+        return constant
+
+    # ----------------------------------------------------------------------
+    # Scopes
+    # ----------------------------------------------------------------------
+
+    def class_scope(self, name):
+        name = str(name)
+        scope = self.class_scopes.get(name)
+        if scope is None:
+            scope = self.class_scopes[name] = Scope(name, ScopeType.GLOBAL)
+        return scope
+
+    def enter_class(self, name, parent=None):
+        scope = self.class_scope(name)
+        if parent is not None:
+            parent_scope = self.class_scope(parent)
+            # An inheritance cycle would make lookups loop forever
+            if not self.inherits_from(parent_scope, scope):
+                scope.parent = parent_scope
+        self.scopes.append(scope)
+        return scope
+
+    def enter_scope(self, name):
+        scope = Scope(name, ScopeType.LOCAL, self.scopes[-1] if self.scopes else None)
+        self.scopes.append(scope)
+        return scope
+
+    def exit_scope(self):
+        return self.scopes.pop()
+
+    def current_scope(self):
+        return self.scopes[-1] if self.scopes else None
+
+    def declare(self, symbol):
+        # Makes a symbol visible in the innermost open scope
+        if self.scopes:
+            self.scopes[-1].symbols.setdefault(symbol.id, symbol)
+
+    def resolve(self, id):
+        # Innermost visible OBJECT_ID named id, following the scope chain
+        id = str(id)
+        symbol = self.scopes[-1].lookup(id) if self.scopes else None
+        if symbol is None and BUILTIN_CLASS in self.class_scopes:
+            symbol = self.class_scopes[BUILTIN_CLASS].symbols.get(id)
+        return symbol
+
+    def inherits_from(self, scope, ancestor):
+        while scope is not None:
+            if scope is ancestor:
+                return True
+            scope = scope.parent
+        return False
+
+    def find(self, kind, id, scope=None, scope_type=None):
+        if scope:
+            return self.index.get((to_kind(kind), str(id), str(scope), to_scope_type(scope_type)))
+
+        return self.index_by_id.get((to_kind(kind), str(id)))
+
+    def select(self, kind=None, id=None, scope=None, name=None):
+        # Rows that match every given filter, in order. kind, id and scope go
+        # through the row indexes; name matches any id that contains it,
+        # ignoring case
+        candidates = []
+        if kind is not None:
+            candidates.append(self.rows_by_kind.get(to_kind(kind), []))
+        if id is not None:
+            candidates.append(self.rows_by_id.get(str(id), []))
+        if scope is not None:
+            candidates.append(self.rows_by_scope.get(str(scope), []))
+
+        if candidates:
+            candidates.sort(key=len)
+            others = [set(rows) for rows in candidates[1:]]
+            rows = [row for row in candidates[0] if all(row in other for other in others)]
+        else:
+            rows = range(len(self.records))
+
+        if name:
+            name = str(name).lower()
+            rows = [row for row in rows if name in self.records[row].id.lower()]
+        return list(rows)
+
+    def lines(self, rows=None):
+        # The table as text, one line at a time (see table_lines)
+        if rows is None:
+            rows = range(len(self.records))
+        records = self.records
+        return table_lines(rows, lambda row: records[row].values())
+
+    def columns(self):
+        return SymbolColumns(self.records)
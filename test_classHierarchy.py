@@ -0,0 +1,22 @@
+from antlr4 import InputStream
+from yaplCompiler import analyze
+
+# A class header the parser had to recover must not stop the analysis: the
+# syntax error is reported and the rest of the program is still checked.
+
+MAIN = "class Main { main() : Int { 0 }; };\n"
+
+
+def test_class_without_name():
+    result = analyze(InputStream("class inherits B { };\nclass B { };\n" + MAIN))
+    assert [(error["line"], error["column"]) for error in result["syntax_errors"]] == [(1, 6)]
+
+
+def test_class_without_parent():
+    result = analyze(InputStream("class A inherits { };\n" + MAIN))
+    assert result["syntax_errors"]
+
+
+def test_class_used_above_its_definition():
+    result = analyze(InputStream("class Main { main() : Int { (new B).g() }; };\nclass B { g() : Int { 1 }; };\n"))
+    assert result["errors"] == []
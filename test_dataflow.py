@@ -0,0 +1,47 @@
+from intermediateCode import Quadruples, Op, NONE
+from dataflow import ControlFlowGraph, Liveness, ReachingDefinitions
+
+# Body of f(n) = { x <- 0; while x < n loop x <- x + 1 pool; if x = n then x <- 1 else x fi; x }
+
+quads = Quadruples()
+n, x, t = quads.local("n"), quads.local("x"), quads.temp()
+top, end, other = quads.label(), quads.label(), quads.label()
+
+CODE = [
+    [Op.FORMAL, n, NONE, NONE],             # 0
+    [Op.ASSIGN, quads.const(0), NONE, x],   # 1
+    [Op.LABEL, top, NONE, NONE],            # 2
+    [Op.LT, x, n, t],                       # 3
+    [Op.IF_FALSE, t, end, NONE],            # 4
+    [Op.ADD, x, quads.const(1), x],         # 5
+    [Op.GOTO, top, NONE, NONE],             # 6
+    [Op.LABEL, end, NONE, NONE],            # 7
+    [Op.EQ, x, n, t],                       # 8
+    [Op.IF_FALSE, t, other, NONE],          # 9
+    [Op.ASSIGN, quads.const(1), NONE, x],   # 10
+    [Op.LABEL, other, NONE, NONE],          # 11
+    [Op.RETURN, x, NONE, NONE],             # 12
+]
+
+
+def test_liveness():
+    liveness = Liveness(ControlFlowGraph(CODE))
+    live = {}
+    for b in range(len(liveness.cfg.blocks)):
+        for i, after in liveness.backward(b):
+            live[i] = set(liveness.variables.members(after))
+    # The loop keeps x and n live around its back edge
+    assert live[1] == live[5] == {x, n}
+    assert live[3] == {x, n, t}
+    assert live[8] == {x, t}
+    assert live[10] == {x}
+    assert live[12] == set()
+
+
+def test_reaching_definitions():
+    reaching = ReachingDefinitions(ControlFlowGraph(CODE))
+    reads = {(i, variable): sorted(definitions) for i, variable, definitions in reaching.reads()}
+    assert reads[(3, x)] == [1, 5]
+    assert reads[(3, n)] == [0]
+    assert reads[(9, t)] == [8]
+    assert reads[(12, x)] == [1, 5, 10]
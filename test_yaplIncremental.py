@@ -0,0 +1,61 @@
+from antlr4 import InputStream
+from yaplCompiler import analyze
+from yaplIncremental import IncrementalAnalyzer
+
+# The incremental analysis of a sequence of edits must report the same
+# errors as a full analysis of every version of the buffer. The edits keep
+# the length of the edited class, so the regions after it are reused.
+
+MAIN = "class Main { main() : Int { 0 }; };\n"
+
+UNDEFINED_TYPE = [
+    "class A { f() : Object { new Foo }; };\nclass B { g() : Object { new Foo }; };\n" + MAIN,
+    "class A { f() : Object { 0       }; };\nclass B { g() : Object { new Foo }; };\n" + MAIN,
+    "class A { f() : Object { new Foo }; };\nclass B { g() : Object { new Foo }; };\n" + MAIN,
+]
+
+UNDEFINED_ATTRIBUTE = [
+    "class A { x : Int <- y; };\nclass B inherits A { f() : Int { y }; };\n" + MAIN,
+    "class A { x : Int <- 0; };\nclass B inherits A { f() : Int { y }; };\n" + MAIN,
+    "class A { x : Int <- y; };\nclass B inherits A { f() : Int { y }; };\n" + MAIN,
+]
+
+# Renaming B goes through a class with no name
+RENAMED_CLASS = [
+    "class A { f() : Int { 1 }; };\nclass B inherits A { g() : Int { f() }; };\n" + MAIN,
+    "class A { f() : Int { 1 }; };\nclass inherits A { g() : Int { f() }; };\n" + MAIN,
+    "class A { f() : Int { 1 }; };\nclass C inherits A { g() : Int { f() }; };\n" + MAIN,
+]
+
+
+def errors(result):
+    return sorted((error["line"], error["column"], error["msg"]) for error in result["errors"])
+
+
+def check_edits(sources):
+    analyzer = IncrementalAnalyzer()
+    for source in sources:
+        assert errors(analyzer.check(source)) == errors(analyze(InputStream(source)))
+
+
+def test_undefined_type_declared_by_an_earlier_class():
+    check_edits(UNDEFINED_TYPE)
+
+
+def test_undefined_attribute_declared_by_a_parent():
+    check_edits(UNDEFINED_ATTRIBUTE)
+
+
+def test_class_being_renamed():
+    analyzer = IncrementalAnalyzer()
+    for source in RENAMED_CLASS:
+        result = analyzer.check(source)
+        assert errors(result) == errors(analyze(InputStream(source)))
+        assert [(error["line"], error["column"]) for error in result["syntax_errors"]] == ([(2, 6)] if "class inherits" in source else [])
+
+
+def test_unrelated_edit_replays():
+    analyzer = IncrementalAnalyzer()
+    analyzer.check(UNDEFINED_TYPE[0])
+    result = analyzer.check(UNDEFINED_TYPE[0].replace("{ new Foo }; };\nclass B", "{new Foo  }; };\nclass B"))
+    assert (result["stats"]["walked"], result["stats"]["replayed"]) == (1, 2)
@@ -0,0 +1,27 @@
+from antlr4 import InputStream
+from yaplCompiler import analyze
+
+# Attributes and methods are visible in the whole class and in its
+# subclasses, wherever they are defined.
+
+FORWARD = """class Main { main() : Int { (new B).g() }; };
+class B inherits A {
+    g() : Int { { f(1); x <- 3; h(); } };
+    f(n : Int) : Int { n };
+    x : Int;
+};
+class A { h() : Int { 1 }; };
+"""
+
+
+def undefined(source):
+    result = analyze(InputStream(source))
+    return [error["msg"] for error in result["errors"] if error["code"] == "undefined"]
+
+
+def test_forward_and_inherited_references():
+    assert undefined(FORWARD) == []
+
+
+def test_undefined_name():
+    assert undefined(FORWARD.replace("x <- 3", "z <- 3")) == ["Undefined: z"]
@@ -0,0 +1,405 @@
+import sys
+import inspect
+from array import array
+from enum import IntEnum
+from antlr4 import ParserRuleContext
+from antlr4.tree.Tree import TerminalNode
+from build.yaplParser import yaplParser
+
+# Compact syntax tree, lowered from the ANTLR parse tree.
+#
+# Nodes are rows of parallel arrays (struct of arrays), numbered in
+# preorder: kind, first child, next sibling, the span of source tokens they
+# cover and the position of their first token. The tokens the passes read
+# (names, types, literals, operators and keywords; punctuation is dropped)
+# are copied to a terminal table, also made of arrays, where the terminals
+# of a node are stored together; their text is interned once. After
+# Ast.from_tree() the ANTLR tree and its token stream can be released: a
+# program of N nodes is a few arrays instead of N context objects with child
+# lists, parent links and token objects.
+#
+# A let is lowered to one LET_VAR node per variable (its initializer, if
+# any, is its child) followed by the body, so the passes do not have to
+# re-parse the children of the let.
+#
+# AstVisitor walks an Ast without recursion (see below).
+
+ROOT = 0
+
+
+class NodeKind(IntEnum):
+    # A rule the parser could not recognize; its children are still visited
+    ERROR = 0
+    PROG = 1
+    CLASS_DEF = 2
+    FEAT_DEF = 3
+    FEAT_ASGN = 4
+    FORMAL = 5
+    LET_VAR = 6
+    EXPR_ASGN = 7
+    EXPR_CLASS_CALL = 8
+    EXPR_CALL = 9
+    EXPR_IF = 10
+    EXPR_WHILE = 11
+    EXPR_BRACKETS = 12
+    EXPR_DECL = 13
+    EXPR_INSTANCE = 14
+    EXPR_ISVOID = 15
+    EXPR_SUMA = 16
+    EXPR_MULT = 17
+    EXPR_NEGATIVE = 18
+    EXPR_NEGADO = 19
+    EXPR_LESS_THAN = 20
+    EXPR_EQUAL = 21
+    EXPR_NOT = 22
+    EXPR_PARENTHESIS = 23
+    EXPR_ID = 24
+    EXPR_INT = 25
+    EXPR_STR = 26
+    EXPR_TRUE = 27
+    EXPR_FALSE = 28
+    EXPR_SELF = 29
+
+
+CONTEXT_KINDS = {
+    yaplParser.ProgContext: NodeKind.PROG,
+    yaplParser.Class_defContext: NodeKind.CLASS_DEF,
+    yaplParser.Feat_defContext: NodeKind.FEAT_DEF,
+    yaplParser.Feat_asgnContext: NodeKind.FEAT_ASGN,
+    yaplParser.FormalContext: NodeKind.FORMAL,
+    yaplParser.Expr_asgnContext: NodeKind.EXPR_ASGN,
+    yaplParser.Expr_class_callContext: NodeKind.EXPR_CLASS_CALL,
+    yaplParser.Expr_callContext: NodeKind.EXPR_CALL,
+    yaplParser.Expr_ifContext: NodeKind.EXPR_IF,
+    yaplParser.Expr_whileContext: NodeKind.EXPR_WHILE,
+    yaplParser.Expr_bracketsContext: NodeKind.EXPR_BRACKETS,
+    yaplParser.Expr_declContext: NodeKind.EXPR_DECL,
+    yaplParser.Expr_instanceContext: NodeKind.EXPR_INSTANCE,
+    yaplParser.Expr_isvoidContext: NodeKind.EXPR_ISVOID,
+    yaplParser.Expr_sumaContext: NodeKind.EXPR_SUMA,
+    yaplParser.Expr_multContext: NodeKind.EXPR_MULT,
+    yaplParser.Expr_negativeContext: NodeKind.EXPR_NEGATIVE,
+    yaplParser.Expr_negadoContext: NodeKind.EXPR_NEGADO,
+    yaplParser.Expr_less_thanContext: NodeKind.EXPR_LESS_THAN,
+    yaplParser.Expr_equalContext: NodeKind.EXPR_EQUAL,
+    yaplParser.Expr_notContext: NodeKind.EXPR_NOT,
+    yaplParser.Expr_parenthesisContext: NodeKind.EXPR_PARENTHESIS,
+    yaplParser.Expr_idContext: NodeKind.EXPR_ID,
+    yaplParser.Expr_intContext: NodeKind.EXPR_INT,
+    yaplParser.Expr_strContext: NodeKind.EXPR_STR,
+    yaplParser.Expr_trueContext: NodeKind.EXPR_TRUE,
+    yaplParser.Expr_falseContext: NodeKind.EXPR_FALSE,
+    yaplParser.Expr_selfContext: NodeKind.EXPR_SELF,
+}
+
+# Kinds of the expressions; a rule the parser could not recognize may be one
+EXPRESSIONS = frozenset([NodeKind.ERROR] + [kind for kind in NodeKind if kind.name.startswith("EXPR_")])
+
+# Token types that no pass reads
+PUNCTUATION = frozenset(yaplParser.literalNames.index("'{text}'".format(text=text)) for text in (";", "{", "}", "(", ")", ",", ":", "<-", "@", "."))
+
+
+def let_variables(ctx):
+    # [(name, type, initializer)] and body of a let:
+    # LET id ':' TYPE ('<-' expr)? (',' id ':' TYPE ('<-' expr)?)* IN expr
+    children = ctx.children or []
+    in_token = ctx.IN()
+    variables = []
+    initializers = set()
+    i = 1
+    while i + 2 < len(children) and children[i] is not in_token:
+        name, type_id = children[i], children[i + 2]
+        i += 3
+
+        initializer = None
+        if i + 1 < len(children) and children[i].getText() == "<-":
+            if isinstance(children[i + 1], ParserRuleContext):
+                initializer = children[i + 1]
+                initializers.add(id(initializer))
+            i += 2
+        variables.append((name, type_id, initializer))
+
+        if i < len(children) and children[i].getText() == ",":
+            i += 1
+
+    exprs = ctx.expr()
+    body = exprs[-1] if exprs and id(exprs[-1]) not in initializers else None
+    return variables, body
+
+
+class Ast:
+
+    def __init__(self):
+        # Nodes, in preorder; the root (node 0) is the prog
+        self.kind = array("B")
+        # First child and next sibling, -1 if there is none
+        self.first = array("i")
+        self.next = array("i")
+        # Indices of the first and last source token of the node (token span)
+        self.start = array("i")
+        self.stop = array("i")
+        # Position of the first token, -1 if unknown
+        self.line = array("i")
+        self.column = array("i")
+        # First entry of the node in the terminal table; the entries of a node
+        # end where the ones of the next node start
+        self.terminals = array("i")
+
+        # Terminal table
+        self.token_type = array("h")
+        self.token_line = array("i")
+        self.token_column = array("i")
+        self.token_text = array("i")
+
+        # Interned text of the terminals, and the index of every text
+        self.names = []
+        self.name_index = {}
+
+    def __len__(self):
+        return len(self.kind)
+
+    # ----------------------------------------------------------------------
+    # Lowering
+    # ----------------------------------------------------------------------
+
+    @classmethod
+    def from_tree(cls, tree):
+        # Lowers a prog (or any rule) context; the tree is not kept
+        ast = cls()
+        # Last child lowered so far of every node, to link the next one
+        last = []
+        pending = [(tree, -1)]
+        while pending:
+            item, parent = pending.pop()
+            node = len(ast.kind)
+            ast.first.append(-1)
+            ast.next.append(-1)
+            last.append(-1)
+            if parent != -1:
+                if last[parent] == -1:
+                    ast.first[parent] = node
+                else:
+                    ast.next[last[parent]] = node
+                last[parent] = node
+            ast.terminals.append(len(ast.token_type))
+
+            if isinstance(item, tuple):
+                # A variable of a let: (name, type, initializer)
+                name, type_id, initializer = item
+                ast.kind.append(NodeKind.LET_VAR)
+                for terminal in (name, type_id):
+                    if isinstance(terminal, TerminalNode):
+                        ast.add_terminal(terminal.getSymbol())
+                first_token = name.getSymbol() if isinstance(name, TerminalNode) else None
+                last_token = initializer.stop if initializer is not None else (type_id.getSymbol() if isinstance(type_id, TerminalNode) else first_token)
+                ast.add_span(first_token, last_token)
+                children = [initializer] if initializer is not None else []
+            else:
+                kind = CONTEXT_KINDS.get(type(item), NodeKind.ERROR)
+                ast.kind.append(kind)
+                ast.add_span(item.start, item.stop)
+                if kind == NodeKind.EXPR_DECL:
+                    variables, body = let_variables(item)
+                    for terminal in (item.LET(), item.IN()):
+                        if terminal is not None:
+                            ast.add_terminal(terminal.getSymbol())
+                    children = variables + ([body] if body is not None else [])
+                else:
+                    children = []
+                    for child in item.children or ():
+                        if isinstance(child, ParserRuleContext):
+                            children.append(child)
+                        elif isinstance(child, TerminalNode) and child.getSymbol().type not in PUNCTUATION:
+                            ast.add_terminal(child.getSymbol())
+
+            for child in reversed(children):
+                pending.append((child, node))
+        return ast
+
+    def add_span(self, first_token, last_token):
+        self.start.append(first_token.tokenIndex if first_token is not None else -1)
+        self.stop.append(last_token.tokenIndex if last_token is not None else -1)
+        self.line.append(first_token.line if first_token is not None else -1)
+        self.column.append(first_token.column if first_token is not None else -1)
+
+    def add_terminal(self, token):
+        text = token.text
+        index = self.name_index.get(text)
+        if index is None:
+            index = self.name_index[text] = len(self.names)
+            self.names.append(sys.intern(text))
+        self.token_type.append(token.type)
+        self.token_line.append(token.line)
+        self.token_column.append(token.column)
+        self.token_text.append(index)
+
+    def shift_lines(self, delta):
+        # Moves every position delta lines down
+        for positions in (self.line, self.token_line):
+            for i, line in enumerate(positions):
+                if line != -1:
+                    positions[i] = line + delta
+
+    # ----------------------------------------------------------------------
+    # Queries
+    # ----------------------------------------------------------------------
+
+    def children(self, node, kind=None):
+        # Children of node, only the ones of that kind if given
+        children = []
+        child = self.first[node]
+        while child != -1:
+            if kind is None or self.kind[child] == kind:
+                children.append(child)
+            child = self.next[child]
+        return children
+
+    def exprs(self, node):
+        # Expression children of node, as ctx.expr() returned them
+        return [child for child in self.children(node) if self.kind[child] in EXPRESSIONS]
+
+    def class_defs(self):
+        return self.children(ROOT, NodeKind.CLASS_DEF) if len(self.kind) else []
+
+    def child(self, node, n=0):
+        # n-th child of node, or -1
+        child = self.first[node]
+        while child != -1 and n:
+            child = self.next[child]
+            n -= 1
+        return child
+
+    def end(self, node):
+        # One past the last node of the subtree of node
+        while self.next[node] == -1:
+            last = -1
+            child = self.first[node]
+            while child != -1:
+                last = child
+                child = self.next[child]
+            if last == -1:
+                return node + 1
+            node = last
+        return self.next[node]
+
+    def terminal_range(self, node):
+        end = self.terminals[node + 1] if node + 1 < len(self.kind) else len(self.token_type)
+        return range(self.terminals[node], end)
+
+    def token(self, node, token_type, n=0):
+        # n-th terminal of node with that token type, or -1
+        for terminal in self.terminal_range(node):
+            if self.token_type[terminal] == token_type:
+                if not n:
+                    return terminal
+                n -= 1
+        return -1
+
+    def tokens(self, node, token_type):
+        return [terminal for terminal in self.terminal_range(node) if self.token_type[terminal] == token_type]
+
+    def operator(self, node):
+        # Text of the first terminal of node: the operator of a unary or
+        # binary expression
+        terminals = self.terminal_range(node)
+        return self.text(terminals[0]) if terminals else None
+
+    def text(self, terminal):
+        if terminal == -1:
+            return None
+        return self.names[self.token_text[terminal]]
+
+    def position(self, terminal):
+        # (line, column) of a terminal, (None, None) for -1
+        if terminal == -1:
+            return (None, None)
+        return (self.token_line[terminal], self.token_column[terminal])
+
+    def start_position(self, node):
+        # (line, column) of the first token of node
+        if node == -1 or self.line[node] == -1:
+            return (None, None)
+        return (self.line[node], self.column[node])
+
+
+class AstVisitor:
+
+    # Visits the nodes of an Ast without recursion.
+    #
+    # The visitor of a kind is "visit" + the capitalized kind name
+    # (visitExpr_if for EXPR_IF), as with the ANTLR visitors, and gets the
+    # node number. A visitor that is a generator visits a child by yielding
+    # it, and gets back what the visitor of the child returned:
+    #
+    #     def visitExpr_suma(self, node):
+    #         left = yield self.ast.child(node, 0)
+    #         right = yield self.ast.child(node, 1)
+    #         ...
+    #
+    # visit() keeps the suspended visitors on an explicit stack, so long
+    # chains such as 1+1+...+1 and deeply nested lets and ifs do not reach
+    # the recursion limit. Kinds without a visitor visit their children and
+    # return what the last one returned; yielding -1 (a missing child)
+    # returns None.
+
+    ast = None
+    # If set, hooks.enter(name, node) and hooks.exit(name, node) are called
+    # around every visitor (yaplProfiler)
+    hooks = None
+    visitor_table = None
+
+    def walk(self, ast, node=ROOT):
+        self.ast = ast
+        return self.visit(node)
+
+    def visitChildren(self, node):
+        value = None
+        for child in self.ast.children(node):
+            value = yield child
+        return value
+
+    def visitors(self):
+        # (name, method, is a generator) of every kind
+        table = []
+        for kind in NodeKind:
+            name = "visit" + kind.name.capitalize()
+            method = getattr(self, name, self.visitChildren)
+            table.append((name, method, inspect.isgeneratorfunction(method)))
+        return table
+
+    def visit(self, node):
+        if self.visitor_table is None:
+            self.visitor_table = self.visitors()
+        table = self.visitor_table
+        kinds = self.ast.kind
+        hooks = self.hooks
+        # (name, node, generator) of the suspended visitors
+        stack = []
+
+        while True:
+            if node < 0:
+                value = None
+            else:
+                name, method, generator = table[kinds[node]]
+                if hooks is not None:
+                    hooks.enter(name, node)
+                if generator:
+                    stack.append((name, node, method(node)))
+                    value = None
+                else:
+                    value = method(node)
+                    if hooks is not None:
+                        hooks.exit(name, node)
+
+            # Resume the innermost suspended visitor until one asks for a child
+            while stack:
+                try:
+                    node = stack[-1][2].send(value)
+                    break
+                except StopIteration as stop:
+                    name, done, generator = stack.pop()
+                    value = stop.value
+                    if hooks is not None:
+                        hooks.exit(name, done)
+            else:
+                return value
@@ -0,0 +1,343 @@
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from antlr4 import *
+from build.yaplLexer import yaplLexer
+from build.yaplParser import yaplParser
+from yaplWalker import yaplWalker
+from yaplAst import Ast
+from yaplCodeGenerator import yaplCodeGenerator
+from yaplCompiler import analyze
+
+# Per-phase benchmark of the compiler pipeline on generated YAPL programs.
+#
+#   python yaplBenchmark.py --shapes classes nesting --sizes 100 1000 -o bench.json
+#   python yaplBenchmark.py --compare old.json -o new.json
+#
+# Each phase of main() is timed separately (token stream fill, prog(),
+# toStringTree, lowering to yaplAst, yaplWalker, symbol table render, and
+# code generation); the
+# best of --repeat runs is kept. Peak memory per phase comes from a separate
+# run under tracemalloc, so it does not slow down the timed runs.
+#
+# The generated programs are valid, as the ones the compiler generates code
+# for; a program with any diagnostic is rejected instead of timed.
+
+SHAPES = ["classes", "inheritance", "methods", "long_method", "nesting", "literals"]
+PHASES = ["lex", "parse", "tree", "lower", "walk", "render", "codegen"]
+
+
+# ----------------------------------------------------------------------
+# Program generator
+# ----------------------------------------------------------------------
+
+def expression(rng, names, depth=2):
+    if depth == 0 or rng.random() < 0.3:
+        if names and rng.random() < 0.5:
+            return rng.choice(names)
+        return str(rng.randint(0, 1000))
+    # Every expression is an Int: a comparison picks one of two values
+    op = rng.choice(["+", "-", "*", "<", "="])
+    value = "({a} {op} {b})".format(a=expression(rng, names, depth - 1), op=op, b=expression(rng, names, depth - 1))
+    if op in ("<", "="):
+        return "(if {value} then 1 else 0 fi)".format(value=value)
+    return value
+
+
+def method(rng, name, statements, names=("a", "b")):
+    body = ";\n      ".join(
+        "{target} <- {value}".format(target=rng.choice(names), value=expression(rng, list(names)))
+        for i in range(statements)
+    )
+    return "  {name}(a: Int, b: Int) : Int {{\n    {{\n      {body};\n    }}\n  }};\n".format(name=name, body=body)
+
+
+def main_class(body="(new IO).out_int(0)"):
+    return "class Main {{\n  main() : Object {{\n    {{\n      {body};\n    }}\n  }};\n}};\n".format(body=body)
+
+
+def generate_program(shape, size, seed=0):
+    rng = random.Random(seed)
+    parts = []
+
+    if shape == "classes":
+        for i in range(size):
+            parts.append("class C{i} {{\n  x: Int <- {i};\n  s: String <- \"c{i}\";\n{m}}};\n".format(i=i, m=method(rng, "f", 3)))
+        parts.append(main_class())
+
+    elif shape == "inheritance":
+        parts.append("class C0 {{\n  x: Int <- 0;\n{m}}};\n".format(m=method(rng, "f", 2)))
+        for i in range(1, size):
+            parts.append("class C{i} inherits C{parent} {{\n  x{i}: Int <- {i};\n{m}}};\n".format(i=i, parent=i - 1, m=method(rng, "g{i}".format(i=i), 2)))
+        parts.append(main_class("(new IO).out_int((new C{last}).f(1, 2))".format(last=size - 1)))
+
+    elif shape == "methods":
+        methods = "".join(method(rng, "m{i}".format(i=i), 3) for i in range(size))
+        parts.append("class Big {{\n  x: Int;\n{methods}}};\n".format(methods=methods))
+        parts.append(main_class())
+
+    elif shape == "long_method":
+        parts.append("class Big {{\n{m}}};\n".format(m=method(rng, "f", size)))
+        parts.append(main_class())
+
+    elif shape == "nesting":
+        # let and if nested size levels deep
+        body = "a"
+        for i in range(size):
+            if i % 2:
+                body = "let v{i} : Int <- {i} in ({body})".format(i=i, body=body)
+            else:
+                body = "if a < {i} then ({body}) else b fi".format(i=i, body=body)
+        parts.append("class Deep {{\n  f(a: Int, b: Int) : Int {{\n    {body}\n  }};\n}};\n".format(body=body))
+        parts.append(main_class())
+
+    elif shape == "literals":
+        literals = ";\n      ".join(rng.choice(["1", "42", "\"abc\"", "true", "false", str(i)]) for i in range(size))
+        parts.append(main_class(literals))
+
+    else:
+        raise ValueError("Unknown shape: {shape}".format(shape=shape))
+
+    return "".join(parts)
+
+
+# ----------------------------------------------------------------------
+# Phases
+# ----------------------------------------------------------------------
+
+def count_nodes(tree):
+    count = 0
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        count += 1
+        if getattr(node, "children", None):
+            pending.extend(node.children)
+    return count
+
+
+def run_phases(source, render=True):
+    # Returns the seconds of every phase and the sizes of the program
+    seconds = {}
+    state = {}
+
+    start = time.perf_counter()
+    lexer = yaplLexer(InputStream(source))
+    lexer.removeErrorListeners()
+    stream = CommonTokenStream(lexer)
+    stream.fill()
+    seconds["lex"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parser = yaplParser(stream)
+    parser.removeErrorListeners()
+    tree = parser.prog()
+    seconds["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tree.toStringTree(parser.ruleNames)
+    seconds["tree"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ast = Ast.from_tree(tree)
+    seconds["lower"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    walker = yaplWalker()
+    walker.initSymbolTable()
+    walker.walk(ast)
+    seconds["walk"] = time.perf_counter() - start
+
+    if render:
+        start = time.perf_counter()
+        for line in walker.symbolTable.lines():
+            pass
+        seconds["render"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    quads = yaplCodeGenerator(constants=walker.symbolTable.constants, types=walker.types).walk(ast)
+    seconds["codegen"] = time.perf_counter() - start
+
+    state["tokens"] = len(stream.tokens)
+    state["nodes"] = count_nodes(tree)
+    state["ast_nodes"] = len(ast)
+    state["symbols"] = len(walker.symbolTable.records)
+    state["instructions"] = len(quads)
+    return seconds, state
+
+
+def peak_memory(source, render=True):
+    # Peak traced memory of each phase, measured by running the phases again
+    peaks = {}
+    tracemalloc.start()
+    try:
+        lexer = yaplLexer(InputStream(source))
+        lexer.removeErrorListeners()
+        stream = CommonTokenStream(lexer)
+        tracemalloc.reset_peak()
+        stream.fill()
+        peaks["lex"] = tracemalloc.get_traced_memory()[1]
+
+        parser = yaplParser(stream)
+        parser.removeErrorListeners()
+        tracemalloc.reset_peak()
+        tree = parser.prog()
+        peaks["parse"] = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.reset_peak()
+        tree.toStringTree(parser.ruleNames)
+        peaks["tree"] = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.reset_peak()
+        ast = Ast.from_tree(tree)
+        peaks["lower"] = tracemalloc.get_traced_memory()[1]
+        # The parse tree has parent links, only the cycle collector frees it
+        tree = parser = stream = lexer = None
+        gc.collect()
+
+        tracemalloc.reset_peak()
+        walker = yaplWalker()
+        walker.initSymbolTable()
+        walker.walk(ast)
+        peaks["walk"] = tracemalloc.get_traced_memory()[1]
+
+        if render:
+            tracemalloc.reset_peak()
+            for line in walker.symbolTable.lines():
+                pass
+            peaks["render"] = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.reset_peak()
+        yaplCodeGenerator(constants=walker.symbolTable.constants, types=walker.types).walk(ast)
+        peaks["codegen"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def check_program(source, shape, size):
+    # The phases after the walker only run on programs without diagnostics
+    result = analyze(InputStream(source))
+    found = result["syntax_errors"] + result["errors"] + result["warnings"]
+    if found:
+        raise ValueError("El programa generado ({shape}, {size}) tiene {count} diagnosticos, el primero: {first}".format(
+            shape=shape, size=size, count=len(found), first=found[0]["msg"]))
+
+
+def benchmark(shape, size, repeat=3, render=True, memory=True, seed=0):
+    source = generate_program(shape, size, seed)
+    check_program(source, shape, size)
+
+    best = {}
+    state = {}
+    for i in range(repeat):
+        seconds, state = run_phases(source, render)
+        for phase, value in seconds.items():
+            best[phase] = min(best.get(phase, value), value)
+
+    peaks = peak_memory(source, render) if memory else {}
+
+    phases = {}
+    for phase in PHASES:
+        if phase in best:
+            phases[phase] = {"seconds": best[phase], "peak_bytes": peaks.get(phase)}
+
+    front_end = best["lex"] + best["parse"]
+    return {
+        "shape": shape,
+        "size": size,
+        "source_bytes": len(source),
+        "tokens": state["tokens"],
+        "nodes": state["nodes"],
+        "ast_nodes": state["ast_nodes"],
+        "symbols": state["symbols"],
+        "instructions": state["instructions"],
+        "phases": phases,
+        "total_seconds": sum(best.values()),
+        "tokens_per_sec": state["tokens"] / front_end if front_end else None,
+        "nodes_per_sec": state["nodes"] / best["walk"] if best["walk"] else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old, new):
+    # Prints the time ratio new/old of every phase of the matching runs
+    old_runs = {(run["shape"], run["size"]): run for run in old["results"]}
+    print("{shape:<12} {size:>7} {phase:<8} {old:>10} {new:>10} {ratio:>7}".format(shape="shape", size="size", phase="phase", old="old (s)", new="new (s)", ratio="ratio"))
+    for run in new["results"]:
+        previous = old_runs.get((run["shape"], run["size"]))
+        if previous is None:
+            continue
+        for phase, values in run["phases"].items():
+            if phase not in previous["phases"]:
+                continue
+            before = previous["phases"][phase]["seconds"]
+            after = values["seconds"]
+            print("{shape:<12} {size:>7} {phase:<8} {old:>10.4f} {new:>10.4f} {ratio:>7.2f}".format(
+                shape=run["shape"], size=run["size"], phase=phase, old=before, new=after, ratio=after / before if before else float("inf")
+            ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por fase del compilador de YAPL")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=SHAPES, help="formas de programa a generar")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000], help="tamanos de programa")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones por programa (se usa la mejor)")
+    parser.add_argument("--no-render", action="store_true", help="no medir el render de la tabla de simbolos")
+    parser.add_argument("--no-memory", action="store_true", help="no medir memoria pico")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dump", default=None, help="escribir el programa generado (primera forma y tamano) y salir")
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior para comparar")
+    parser.add_argument("-o", "--output", default=None, help="archivo JSON de resultados (default: stdout)")
+    args = parser.parse_args(argv)
+
+    # Deep nesting recurses in the ANTLR parser and in toStringTree; the
+    # syntax tree (yaplAst) and its visitors are walked without recursion
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000))
+
+    if args.dump:
+        with open(args.dump, "w", encoding="utf-8") as f:
+            f.write(generate_program(args.shapes[0], args.sizes[0], args.seed))
+        return 0
+
+    results = []
+    for shape in args.shapes:
+        for size in args.sizes:
+            run = benchmark(shape, size, args.repeat, not args.no_render, not args.no_memory, args.seed)
+            results.append(run)
+            print("{shape:<12} {size:>7} {tokens:>8} tokens {total:>8.3f}s".format(shape=shape, size=size, tokens=run["tokens"], total=run["total_seconds"]), file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,531 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from build.yaplParser import yaplParser
+from yaplParsing import PARSE_MODES
+from yaplWalker import yaplWalker
+from yaplAst import NodeKind
+from yaplIncremental import Region, split_classes, class_signature
+from yaplCodeGenerator import yaplCodeGenerator
+from yaplCompiler import collect_files, write_diagnostics
+from yaplCache import compiler_version
+from classHierarchy import ClassHierarchy, SELF_TYPE
+from symbolTable import SymbolKind
+from intermediateCode import Quadruples
+from diagnostics import Diagnostics, Diagnostic, Severity, MAIN_CLASS, MAIN_METHOD, UNASSIGNED
+from dataflow import reads_of_defaults
+
+# Separate compilation of a program split across several .yapl files.
+#
+# The files are read in the order given and their classes form one program,
+# as if the files were concatenated. Every class is compiled to an artifact
+# in the build directory (.yaplbuild/<Class>.json) with its interface (name,
+# parent and features, with numParams/paramTypes for the methods), the types
+# and methods it names, its diagnostics and its intermediate code. The link
+# step appends the code of the artifacts, in program order, into one
+# Quadruples and checks what only the whole program can tell (one Main, one
+# main).
+#
+# A class depends on the types it names (parent, attributes, formals,
+# return types, lets, new T, @T) and, through their interfaces, on the
+# types those interfaces name. It is compiled again only if its text
+# changed or if one of those interfaces changed (or moved before or after
+# it), so an edit inside a method body only rebuilds that class and a
+# signature change also rebuilds the classes that use it. The files are
+# split at the ';' that ends every class without running the lexer
+# (yaplIncremental.split_classes), and only the classes that are compiled
+# again are lexed and parsed.
+#
+# Each class is checked against the interfaces of the classes before it, not
+# against what their walks declared, so every class reports the undefined
+# names it uses even if an earlier class already did.
+#
+#   python yaplBuild.py src/ -o program.json
+#   python yaplVM.py program.json
+
+DEFAULT_BUILD_DIR = ".yaplbuild"
+MANIFEST = "manifest.json"
+
+
+def source_key(text, column):
+    key = hashlib.sha256()
+    key.update(compiler_version().encode("ascii"))
+    key.update(str(column).encode("ascii"))
+    key.update(text.encode("utf-8"))
+    return key.hexdigest()
+
+
+def trimmed(text, line, column):
+    # (text, line, column) without the blanks and comments before the class,
+    # so a comment added above it does not change its text
+    i = 0
+    while i < len(text):
+        if text[i].isspace():
+            i += 1
+        elif text.startswith("--", i):
+            end = text.find("\n", i)
+            i = end if end != -1 else len(text)
+        elif text.startswith("(*", i) and text.find("*)", i + 2) != -1:
+            i = text.find("*)", i + 2) + 2
+        else:
+            break
+    newlines = text.count("\n", 0, i)
+    if newlines:
+        column = i - text.rfind("\n", 0, i) - 1
+    else:
+        column += i
+    return text[i:], line + newlines, column
+
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value).encode("utf-8")).hexdigest()
+
+
+def interface_of(signature, position):
+    name, parent, features = signature
+    return {
+        "name": name,
+        "parent": parent,
+        "position": list(position),
+        "features": [
+            {"name": feature, "type": type_id, "numParams": len(params) if params is not None else None, "paramTypes": list(params) if params is not None else None}
+            for feature, type_id, params in features
+        ],
+    }
+
+
+def signature_of(interface):
+    # The (name, parent, features) of yaplIncremental.class_signature
+    features = tuple((feature["name"], feature["type"], tuple(feature["paramTypes"]) if feature["paramTypes"] is not None else None) for feature in interface["features"])
+    return (interface["name"], interface["parent"], features)
+
+
+def interface_types(signature):
+    # Types an interface names
+    name, parent, features = signature
+    types = set([parent]) if parent is not None else set()
+    for feature, type_id, params in features:
+        types.add(type_id)
+        types.update(params or ())
+    types.discard(SELF_TYPE)
+    return types
+
+
+def class_dependencies(ast, node):
+    # (types, method names) a class_def names anywhere in its text
+    types = set()
+    calls = set()
+    for child in range(node, ast.end(node)):
+        for terminal in ast.tokens(child, yaplParser.TYPE_ID):
+            types.add(str(ast.text(terminal)))
+        if ast.kind[child] in (NodeKind.EXPR_CLASS_CALL, NodeKind.EXPR_CALL):
+            name = ast.token(child, yaplParser.OBJECT_ID)
+            if name != -1:
+                calls.add(str(ast.text(name)))
+    types.discard(SELF_TYPE)
+    return sorted(types), sorted(calls)
+
+
+def interface_keys(named, hashes):
+    # name -> digest of its interface and of every interface it reaches
+    # through the types they name. named: name -> types its interface names.
+    # The classes of a cycle (A has a B, B has an A) share their key, and
+    # every other key is computed after the ones it reaches (Tarjan)
+    keys = {}
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    for root in named:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(sorted(named[root])))]
+        while work:
+            name, successors = work[-1]
+            for successor in successors:
+                if successor not in named:
+                    continue
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(sorted(named[successor]))))
+                    break
+                if successor in on_stack:
+                    low[name] = min(low[name], index[successor])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[name])
+                if low[name] != index[name]:
+                    continue
+                members = []
+                while not members or members[-1] != name:
+                    members.append(stack.pop())
+                    on_stack.discard(members[-1])
+                members.sort()
+                # Names without a class count too: defining one changes the key
+                reached = sorted(set(keys.get(type_id, type_id) for member in members for type_id in named[member] if type_id not in members))
+                key = digest([[(member, hashes[member]) for member in members], reached])
+                for member in members:
+                    keys[member] = key
+    return keys
+
+
+def declare_signature(table, signature):
+    # What visitClass_def leaves visible to the classes after it
+    name, parent, features = signature
+    table.add("TYPE_ID", name, "class")
+    table.enter_class(name, parent)
+    table.exit_scope()
+    for feature, type_id, params in features:
+        if params is not None:
+            table.add("OBJECT_ID", feature, type_id, numParams=len(params), paramTypes=list(params), scope=name, scope_type="global")
+        else:
+            table.add("OBJECT_ID", feature, type_id, scope=name, scope_type="global")
+
+
+def forget_undefined(table, undefined):
+    # The walker declares the types it reports as undefined; the next class
+    # must report them again
+    for kind, name in undefined:
+        if kind == "TYPE_ID":
+            symbol = table.index_by_id.pop((SymbolKind.TYPE_ID, str(name)), None)
+            if symbol is not None:
+                table.index.pop((symbol.kind, symbol.id, symbol.scope, symbol.scope_type), None)
+
+
+def shifted(diagnostics, delta):
+    for diagnostic in diagnostics:
+        if delta and diagnostic["line"] is not None:
+            diagnostic["line"] += delta
+    return diagnostics
+
+
+class Unit:
+
+    # One class of the program, with its artifact if it can be reused
+
+    __slots__ = ("file", "text", "line", "column", "source", "index", "signature", "dependencies", "calls", "artifact", "loaded", "region", "node", "dirty")
+
+    def __init__(self, file, text, line, column, source, index):
+        self.file = file
+        self.text = text
+        self.line = line
+        self.column = column
+        self.source = source
+        # Position among the classes of its region
+        self.index = index
+        self.artifact = None
+        # Artifact name it was read from
+        self.loaded = None
+        self.region = None
+        self.node = None
+        self.dirty = True
+
+    def reuse(self, artifact, name):
+        # The same text may have moved: its positions follow it
+        delta = self.line - artifact["line"]
+        artifact["line"] = self.line
+        artifact["file"] = self.file
+        if delta and artifact["interface"]["position"][0] is not None:
+            artifact["interface"]["position"][0] += delta
+        shifted(artifact["diagnostics"], delta)
+        self.artifact = artifact
+        self.loaded = name
+        self.signature = signature_of(artifact["interface"])
+        self.dependencies = artifact["dependencies"]
+        self.calls = artifact["calls"]
+
+    def parsed(self, region):
+        self.region = region
+        self.node = region.classes[self.index]
+        self.signature = class_signature(region.ast, self.node)
+        self.dependencies, self.calls = class_dependencies(region.ast, self.node)
+
+    def position(self):
+        if self.region is not None:
+            return self.region.ast.position(self.region.ast.token(self.node, yaplParser.TYPE_ID))
+        return tuple(self.artifact["interface"]["position"])
+
+
+class Build:
+
+    def __init__(self, directory=DEFAULT_BUILD_DIR, parse_mode="two-stage"):
+        self.directory = directory
+        self.parse_mode = parse_mode
+        os.makedirs(directory, exist_ok=True)
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        temp_path = "{path}.{pid}.tmp".format(path=path, pid=os.getpid())
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def run(self, files):
+        # Compiles what changed and links the program
+        start = time.perf_counter()
+        stats = {"files": len(files), "classes": 0, "compiled": 0, "reused": 0, "parsed": 0}
+
+        manifest = self.read(MANIFEST)
+        if manifest is None or manifest.get("version") != compiler_version():
+            manifest = {"sources": {}}
+        # Source key -> artifact names of every region with that text
+        previous = manifest["sources"]
+
+        units = []
+        # (file, syntax errors) of the regions without a class
+        loose = []
+        occurrences = {}
+        for path in files:
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+            for text, line, column in split_classes(source):
+                text, line, column = trimmed(text, line, column)
+                if not text:
+                    continue
+                key = source_key(text, column)
+                occurrence = occurrences.get(key, 0)
+                occurrences[key] = occurrence + 1
+
+                names = previous.get(key, [])
+                names = names[occurrence] if occurrence < len(names) else []
+                artifacts = [self.read(name) for name in names]
+                if artifacts and all(artifact is not None and artifact["source"] == key for artifact in artifacts):
+                    for index, (name, artifact) in enumerate(zip(names, artifacts)):
+                        unit = Unit(path, text, line, column, key, index)
+                        unit.reuse(artifact, name)
+                        units.append(unit)
+                    continue
+
+                region = Region(text, line, column, self.parse_mode)
+                stats["parsed"] += 1
+                if not region.classes:
+                    loose.append((path, region.syntax_errors))
+                for index in range(len(region.classes)):
+                    unit = Unit(path, text, line, column, key, index)
+                    unit.parsed(region)
+                    units.append(unit)
+        stats["classes"] = len(units)
+
+        hierarchy = ClassHierarchy.from_signatures([unit.signature + (unit.position(),) for unit in units])
+        self.plan(units, hierarchy, stats)
+        self.compile(units, hierarchy)
+        names = self.save(units, manifest)
+        result = self.link(units, loose)
+
+        stats["seconds"] = time.perf_counter() - start
+        result["stats"] = stats
+        result["graph"] = {name: unit.dependencies for name, unit in zip(names, units)}
+        return result
+
+    def plan(self, units, hierarchy, stats):
+        # Marks the units whose artifact was built against other interfaces
+        first = {}
+        for i, unit in enumerate(units):
+            first.setdefault(unit.signature[0], i)
+        interfaces = {name: units[i].signature for name, i in first.items()}
+        hashes = {name: digest(signature) for name, signature in interfaces.items()}
+        named = {name: interface_types(signature) for name, signature in interfaces.items()}
+        keys = interface_keys(named, hashes)
+
+        regions = {}
+        for i, unit in enumerate(units):
+            # While a class is checked, the types it names and the features
+            # of its ancestors are visible only if declared before it; the
+            # rest comes from the hierarchy
+            ancestors = {}
+            parent = unit.signature[1]
+            while parent in interfaces and parent not in ancestors:
+                ancestors[parent] = first[parent] < i
+                parent = interfaces[parent][1]
+            types = [(name, keys.get(name), first.get(name, i) < i) for name in unit.dependencies]
+            calls = [name for name in unit.calls if name in hierarchy.method_names]
+            against = digest([types, list(ancestors.values()), calls])
+
+            if unit.artifact is not None and unit.artifact["against"] == against:
+                unit.dirty = False
+                stats["reused"] += 1
+                continue
+            unit.artifact = {"against": against}
+            if unit.region is None:
+                key = (unit.file, unit.line, unit.column)
+                if key not in regions:
+                    regions[key] = Region(unit.text, unit.line, unit.column, self.parse_mode)
+                    stats["parsed"] += 1
+                unit.parsed(regions[key])
+            stats["compiled"] += 1
+
+    def compile(self, units, hierarchy):
+        # Walks and generates the code of the dirty units, in program order
+        if not any(unit.dirty for unit in units):
+            return
+        diagnostics = Diagnostics()
+        walker = yaplWalker(diagnostics)
+        walker.initSymbolTable()
+        walker.begin_program(hierarchy)
+        for unit in units:
+            if not unit.dirty:
+                declare_signature(walker.symbolTable, unit.signature)
+                continue
+
+            ast, node, region = unit.region.ast, unit.node, unit.region
+            errors, undefined = len(diagnostics), len(walker.undefined)
+            main_classes, main_methods = walker.main_class_count, walker.main_method_count
+            walker.types.clear()
+            walker.walk(ast, node)
+            found = list(region.syntax_errors if unit.index == 0 else []) + list(diagnostics[errors:])
+            forget_undefined(walker.symbolTable, walker.undefined[undefined:])
+            # Another class may report an identical diagnostic in another file
+            diagnostics.keys.clear()
+
+            code = None
+            if not region.syntax_errors and not any(diagnostic.severity == Severity.ERROR for diagnostic in found):
+                codegen = yaplCodeGenerator(types=walker.types)
+                codegen.walk(ast, node)
+                for name, position in reads_of_defaults(codegen.quads, codegen.let_defaults):
+                    found.append(Diagnostic(Severity.WARNING, UNASSIGNED, "La variable {name} se usa antes de asignarle un valor".format(name=name), *position))
+                code = codegen.quads.to_dict()
+
+            unit.artifact.update({
+                "source": unit.source,
+                "file": unit.file,
+                "line": unit.line,
+                "interface": interface_of(unit.signature, unit.position()),
+                "dependencies": unit.dependencies,
+                "calls": unit.calls,
+                "main_classes": walker.main_class_count - main_classes,
+                "main_methods": walker.main_method_count - main_methods,
+                "diagnostics": [diagnostic.to_dict() for diagnostic in found],
+                "code": code,
+            })
+
+    def save(self, units, manifest):
+        # Writes the new artifacts and the manifest, removes the stale ones.
+        # Returns the artifact name of every unit
+        names = []
+        counts = {}
+        sources = {}
+        occurrences = {}
+        for unit in units:
+            name = unit.signature[0]
+            counts[name] = counts.get(name, 0) + 1
+            artifact_name = "{name}.json".format(name=name) if counts[name] == 1 else "{name}~{n}.json".format(name=name, n=counts[name])
+            names.append(artifact_name)
+            if unit.dirty or unit.loaded != artifact_name:
+                self.write(artifact_name, unit.artifact)
+
+            # Every occurrence of a region text keeps its own artifacts
+            if unit.index == 0:
+                occurrences[unit.source] = occurrences.get(unit.source, -1) + 1
+                sources.setdefault(unit.source, []).append([])
+            sources[unit.source][occurrences[unit.source]].append(artifact_name)
+
+        stale = set(name for regions in manifest["sources"].values() for region in regions for name in region) - set(names)
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+        self.write(MANIFEST, {
+            "version": compiler_version(),
+            "sources": sources,
+            "classes": [{"name": unit.signature[0], "artifact": name, "file": unit.file, "line": unit.line, "dependencies": unit.dependencies} for name, unit in zip(names, units)],
+        })
+        return names
+
+    def link(self, units, loose):
+        # One Quadruples with the code of every class, if no class has errors
+        files = {}
+
+        def add(path, diagnostic):
+            found = files.setdefault(path, {"file": path, "syntax_errors": [], "errors": [], "warnings": []})
+            if diagnostic["severity"] != Severity.ERROR.name.lower():
+                found["warnings"].append(diagnostic)
+            else:
+                found["syntax_errors" if diagnostic["code"] == "syntax" else "errors"].append(diagnostic)
+
+        for path, syntax_errors in loose:
+            for diagnostic in syntax_errors:
+                add(path, diagnostic.to_dict())
+        for unit in units:
+            for diagnostic in unit.artifact["diagnostics"]:
+                add(unit.file, diagnostic)
+
+        program = []
+        if sum(unit.artifact["main_classes"] for unit in units) != 1:
+            program.append(Diagnostic(Severity.ERROR, MAIN_CLASS, "Solo una clase Main debe existir").to_dict())
+        if sum(unit.artifact["main_methods"] for unit in units) != 1:
+            program.append(Diagnostic(Severity.ERROR, MAIN_METHOD, "Solo un metodo main en la clase Main debe existir").to_dict())
+
+        ok = not program and not any(found["syntax_errors"] or found["errors"] for found in files.values())
+        quads = None
+        if ok:
+            quads = Quadruples()
+            for unit in units:
+                quads.extend(Quadruples.from_dict(unit.artifact["code"]))
+        return {"ok": ok, "files": list(files.values()), "program_errors": program, "program": quads}
+
+
+def main(argv=None):
+    from yaplOptimizer import PassManager, LEVELS
+    from yaplVM import YaplVM, YaplRuntimeError
+
+    parser = argparse.ArgumentParser(description="Compilacion separada de un programa YAPL repartido en varios archivos")
+    parser.add_argument("paths", nargs="+", help="archivos .yapl o directorios, en el orden del programa")
+    parser.add_argument("-o", "--output", default=None, help="programa enlazado (cuadruplos en JSON, para yaplVM/yaplNative)")
+    parser.add_argument("-O", dest="level", type=int, choices=sorted(LEVELS), default=0, help="nivel de optimizacion del programa enlazado")
+    parser.add_argument("--build-dir", default=DEFAULT_BUILD_DIR, help="directorio de los artefactos de cada clase")
+    parser.add_argument("--parse-mode", choices=PARSE_MODES, default="two-stage", help="SLL con reintento en LL, o solo LL")
+    parser.add_argument("--diagnostics", choices=["text", "json"], default="text", help="formato de los errores en stderr")
+    parser.add_argument("--graph", action="store_true", help="escribir el grafo de dependencias entre clases en JSON")
+    parser.add_argument("--run", action="store_true", help="ejecutar el programa enlazado en la maquina virtual")
+    parser.add_argument("--stats", action="store_true", help="mostrar cuantas clases se compilaron y cuantas se reutilizaron")
+    args = parser.parse_args(argv)
+
+    result = Build(args.build_dir, args.parse_mode).run(collect_files(args.paths))
+    for found in result["files"]:
+        write_diagnostics(found, args.diagnostics, sys.stderr)
+    if result["program_errors"]:
+        write_diagnostics({"file": "programa", "errors": result["program_errors"]}, args.diagnostics, sys.stderr)
+    if args.graph:
+        print(json.dumps(result["graph"], indent=2))
+    if args.stats:
+        print("Clases: {classes}, compiladas: {compiled}, reutilizadas: {reused}, regiones analizadas: {parsed} ({seconds:.3f}s)".format(**result["stats"]), file=sys.stderr)
+    if not result["ok"]:
+        return 1
+
+    quads = result["program"]
+    PassManager(args.level).run(quads)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(quads.to_dict(), f)
+
+    if args.run:
+        try:
+            YaplVM(quads).run_main()
+        except YaplRuntimeError as e:
+            print("\nError de ejecucion: {msg}".format(msg=e), file=sys.stderr)
+            return 1
+        finally:
+            sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+
+# On-disk cache of analysis results, keyed by the source text and by the
+# version of the compiler that produced them (grammar, generated parser and
+# the analysis modules). A hit lets the driver skip ANTLR entirely.
+# Entries are JSON files; the least recently used ones are evicted once the
+# directory grows past max_bytes.
+
+DEFAULT_CACHE_DIR = ".yaplcache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Any change to these files invalidates every cached result
+VERSION_FILES = [
+    "yapl.g4",
+    os.path.join("build", "yaplLexer.py"),
+    os.path.join("build", "yaplParser.py"),
+    "yaplAst.py",
+    "yaplWalker.py",
+    "symbolTable.py",
+    "classHierarchy.py",
+    "diagnostics.py",
+    "yaplTypeChecker.py",
+    "yaplErrorListener.py",
+    "yaplParsing.py",
+    "intermediateCode.py",
+    "yaplCodeGenerator.py",
+    "dataflow.py",
+    "yaplIncremental.py",
+    "yaplParallel.py",
+    "yaplCompiler.py",
+    "yaplBuild.py",
+]
+
+_compiler_version = None
+
+
+def compiler_version():
+    global _compiler_version
+
+    if _compiler_version is None:
+        digest = hashlib.sha256()
+        for name in VERSION_FILES:
+            path = os.path.join(BASE_DIR, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    digest.update(name.encode("utf-8"))
+                    digest.update(f.read())
+        _compiler_version = digest.hexdigest()
+
+    return _compiler_version
+
+
+class AnalysisCache:
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, source):
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        digest = hashlib.sha256()
+        digest.update(compiler_version().encode("ascii"))
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, source):
+        path = self.path(self.key(source))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Mark the entry as recently used for the LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return result
+
+    def put(self, source, result):
+        path = self.path(self.key(source))
+
+        # Write to a temporary file first so parallel workers never read a partial entry
+        temp_path = "{path}.{pid}.tmp".format(path=path, pid=os.getpid())
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(temp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                os.remove(entry.path)
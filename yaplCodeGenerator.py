@@ -0,0 +1,368 @@
+from build.yaplParser import yaplParser
+from yaplAst import AstVisitor, NodeKind
+from intermediateCode import Quadruples, Op, Operand, INIT_METHOD, operand_kind
+from symbolTable import string_value
+from classHierarchy import SELF_TYPE, class_header
+
+# This class generates three-address code (quadruples) from a syntax tree that
+# already went through yaplWalker without errors.
+#
+# Every expression visitor returns the operand that holds its value. Each
+# class produces a "class" header, a Class._init function with the attribute
+# initializations and one function per method. The static class of the
+# receiver of every dynamic call goes to quads.receivers for the -O3
+# devirtualization (yaplInterprocedural).
+
+# Classes that cannot be inherited (yaplWalker rejects it), so a call on a
+# receiver of one of these static types always runs that class's method
+SEALED_CLASSES = ("Int", "String", "Bool")
+
+# Expressions that cannot change a variable while they are evaluated
+LEAF_EXPRESSIONS = frozenset((
+    NodeKind.EXPR_ID,
+    NodeKind.EXPR_INT,
+    NodeKind.EXPR_STR,
+    NodeKind.EXPR_TRUE,
+    NodeKind.EXPR_FALSE,
+    NodeKind.EXPR_SELF,
+))
+
+
+class yaplCodeGenerator(AstVisitor):
+
+    def __init__(self, quads=None, constants=None, types=None) -> None:
+        self.quads = quads if quads is not None else Quadruples()
+        # Static types of the expressions (yaplWalker.types), if available
+        self.types = types if types is not None else {}
+        # With the ConstantPool of the walker, literal i is the CONST operand
+        # with payload i
+        if constants is not None:
+            for constant in constants:
+                self.quads.const(constant.value)
+        self.current_class = None
+        # Index of the ASSIGN of the default value of every let variable
+        # declared without one -> (name, position) of the variable
+        self.let_defaults = {}
+        # Stack of {source name: operand} for formals and let variables
+        self.scopes = []
+        # How many locals were created with each name in the current method
+        self.local_names = {}
+        super().__init__()
+
+    def default_value(self, type_id):
+        # Default values of the basic types, everything else starts as void
+        if type_id == "Int":
+            return self.quads.const(0)
+        if type_id == "String":
+            return self.quads.const("")
+        if type_id == "Bool":
+            return self.quads.const(False)
+        return self.quads.const(None)
+
+    def new_local(self, name):
+        # Shadowed names get a fresh local so inner lets do not overwrite outer ones
+        count = self.local_names.get(name, 0)
+        self.local_names[name] = count + 1
+        if count == 0:
+            return self.quads.local(name)
+        return self.quads.local("{name}.{n}".format(name=name, n=count))
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return self.quads.attr(name)
+
+    def text(self, node, token_type=yaplParser.OBJECT_ID):
+        return str(self.ast.text(self.ast.token(node, token_type)))
+
+    def begin_function(self, name, formals):
+        self.scopes = [{"self": self.quads.local("self")}]
+        self.local_names = {"self": 1}
+        self.quads.emit(Op.FUNC, self.quads.name("{cls}.{name}".format(cls=self.current_class, name=name)), self.quads.const(len(formals)))
+
+        scope = {}
+        for formal in formals:
+            local = self.new_local(self.text(formal))
+            scope[self.text(formal)] = local
+            self.quads.emit(Op.FORMAL, local)
+        self.scopes.append(scope)
+
+    def end_function(self, value):
+        self.quads.emit(Op.RETURN, value)
+        self.quads.emit(Op.END_FUNC)
+        self.scopes = []
+
+    def snapshot(self, value, following):
+        # A variable used as an operand must keep the value it had when it was
+        # evaluated, even if the following expressions assign it
+        if operand_kind(value) not in (Operand.LOCAL, Operand.ATTR):
+            return value
+        if all(self.ast.kind[node] in LEAF_EXPRESSIONS for node in following):
+            return value
+        result = self.quads.temp()
+        self.quads.emit(Op.ASSIGN, value, result=result)
+        return result
+
+    def emit_call(self, op, method, receiver, args, receiver_type=None):
+        # Arguments are evaluated left to right before any param is emitted
+        receiver = self.snapshot(receiver, args)
+        values = []
+        for i, arg in enumerate(args):
+            values.append(self.snapshot((yield arg), args[i + 1:]))
+
+        self.quads.emit(Op.PARAM, receiver)
+        for value in values:
+            self.quads.emit(Op.PARAM, value)
+
+        result = self.quads.temp()
+        self.quads.emit(op, self.quads.name(method), self.quads.const(len(values) + 1), result)
+        if op == Op.CALL and receiver_type is not None:
+            self.quads.receivers[result] = self.current_class if receiver_type == SELF_TYPE else receiver_type
+        return result
+
+    def emit_binary(self, op, node):
+        left, right = self.ast.exprs(node)
+        left = self.snapshot((yield left), [right])
+        right = yield right
+        result = self.quads.temp()
+        self.quads.emit(op, left, right, result)
+        return result
+
+    def emit_unary(self, op, node):
+        value = yield self.ast.child(node)
+        result = self.quads.temp()
+        self.quads.emit(op, value, result=result)
+        return result
+
+
+    # Visit a prog node.
+    def visitProg(self, node):
+        for class_def in self.ast.class_defs():
+            yield class_def
+        return self.quads
+
+
+    # Visit a class_def node.
+    def visitClass_def(self, node):
+        ast = self.ast
+        name, parents = class_header(ast, node)
+        self.current_class = ast.text(name)
+        parent = self.quads.name(ast.text(parents[0])) if parents else 0
+        self.quads.emit(Op.CLASS, self.quads.name(self.current_class), parent)
+
+        # Attribute initializations go to Class._init, which returns self
+        self.begin_function(INIT_METHOD, [])
+        for feature in ast.children(node, NodeKind.FEAT_ASGN):
+            yield feature
+        self.end_function(self.lookup("self"))
+
+        for feature in ast.children(node, NodeKind.FEAT_DEF):
+            yield feature
+        return None
+
+
+    # Visit a feat_def node.
+    def visitFeat_def(self, node):
+        self.begin_function(self.text(node), self.ast.children(node, NodeKind.FORMAL))
+        value = yield self.ast.exprs(node)[0]
+        self.end_function(value)
+        return None
+
+
+    # Visit a feat_asgn node.
+    def visitFeat_asgn(self, node):
+        exprs = self.ast.exprs(node)
+        if exprs:
+            value = yield exprs[0]
+        else:
+            value = self.default_value(self.text(node, yaplParser.TYPE_ID))
+        self.quads.emit(Op.ASSIGN, value, result=self.quads.attr(self.text(node)))
+        return None
+
+
+    # ========================================================================================
+    # Expressions
+    # ========================================================================================
+
+
+    # Visit an expr_asgn node.
+    def visitExpr_asgn(self, node):
+        value = yield self.ast.child(node)
+        self.quads.emit(Op.ASSIGN, value, result=self.lookup(self.text(node)))
+        return value
+
+
+    # Visit an expr_class_call node.
+    def visitExpr_class_call(self, node):
+        exprs = self.ast.exprs(node)
+        receiver = yield exprs[0]
+        if self.ast.token(node, yaplParser.TYPE_ID) != -1:
+            method = "{type}.{name}".format(type=self.text(node, yaplParser.TYPE_ID), name=self.text(node))
+            return (yield from self.emit_call(Op.STATIC_CALL, method, receiver, exprs[1:]))
+        # The type checker already knows the class of a basic receiver
+        receiver_type = self.types.get(exprs[0])
+        if receiver_type in SEALED_CLASSES:
+            method = "{type}.{name}".format(type=receiver_type, name=self.text(node))
+            return (yield from self.emit_call(Op.STATIC_CALL, method, receiver, exprs[1:]))
+        return (yield from self.emit_call(Op.CALL, self.text(node), receiver, exprs[1:], receiver_type))
+
+
+    # Visit an expr_call node.
+    def visitExpr_call(self, node):
+        return (yield from self.emit_call(Op.CALL, self.text(node), self.lookup("self"), self.ast.exprs(node), SELF_TYPE))
+
+
+    # Visit an expr_if node.
+    def visitExpr_if(self, node):
+        condition, then, otherwise = self.ast.exprs(node)
+        result = self.quads.temp()
+        else_label = self.quads.label()
+        end_label = self.quads.label()
+
+        condition = yield condition
+        self.quads.emit(Op.IF_FALSE, condition, else_label)
+        self.quads.emit(Op.ASSIGN, (yield then), result=result)
+        self.quads.emit(Op.GOTO, end_label)
+        self.quads.emit(Op.LABEL, else_label)
+        self.quads.emit(Op.ASSIGN, (yield otherwise), result=result)
+        self.quads.emit(Op.LABEL, end_label)
+        return result
+
+
+    # Visit an expr_while node.
+    def visitExpr_while(self, node):
+        condition, body = self.ast.exprs(node)
+        start_label = self.quads.label()
+        end_label = self.quads.label()
+
+        self.quads.emit(Op.LABEL, start_label)
+        condition = yield condition
+        self.quads.emit(Op.IF_FALSE, condition, end_label)
+        yield body
+        self.quads.emit(Op.GOTO, start_label)
+        self.quads.emit(Op.LABEL, end_label)
+
+        # The value of a while is void
+        return self.quads.const(None)
+
+
+    # Visit an expr_brackets node.
+    def visitExpr_brackets(self, node):
+        value = None
+        for expr in self.ast.exprs(node):
+            value = yield expr
+        return value
+
+
+    # Visit an expr_decl node.
+    def visitExpr_decl(self, node):
+        ast = self.ast
+        scope = {}
+        self.scopes.append(scope)
+
+        # One let_var per variable, then the body
+        value = None
+        for child in ast.children(node):
+            if ast.kind[child] != NodeKind.LET_VAR:
+                value = yield child
+                continue
+
+            name = self.text(child)
+            if ast.first[child] != -1:
+                initial = yield ast.first[child]
+            else:
+                initial = self.default_value(self.text(child, yaplParser.TYPE_ID))
+                self.let_defaults[len(self.quads)] = (name, ast.position(ast.token(child, yaplParser.OBJECT_ID)))
+
+            # The new name is visible after its own initializer
+            local = self.new_local(name)
+            self.quads.emit(Op.ASSIGN, initial, result=local)
+            scope[name] = local
+
+        self.scopes.pop()
+        return value
+
+
+    # Visit an expr_instance node.
+    def visitExpr_instance(self, node):
+        result = self.quads.temp()
+        self.quads.emit(Op.NEW, self.quads.name(self.text(node, yaplParser.TYPE_ID)), result=result)
+        return result
+
+
+    # Visit an expr_isvoid node.
+    def visitExpr_isvoid(self, node):
+        return (yield from self.emit_unary(Op.ISVOID, node))
+
+
+    # Visit an expr_suma node.
+    def visitExpr_suma(self, node):
+        return (yield from self.emit_binary(Op.ADD if self.ast.operator(node) == "+" else Op.SUB, node))
+
+
+    # Visit an expr_mult node.
+    def visitExpr_mult(self, node):
+        return (yield from self.emit_binary(Op.MUL if self.ast.operator(node) == "*" else Op.DIV, node))
+
+
+    # Visit an expr_negative node.
+    def visitExpr_negative(self, node):
+        return (yield from self.emit_unary(Op.NEG, node))
+
+
+    # Visit an expr_negado node.
+    def visitExpr_negado(self, node):
+        return (yield from self.emit_unary(Op.NEG, node))
+
+
+    # Visit an expr_less_than node.
+    def visitExpr_less_than(self, node):
+        return (yield from self.emit_binary(Op.LT if self.ast.operator(node) == "<" else Op.LE, node))
+
+
+    # Visit an expr_equal node.
+    def visitExpr_equal(self, node):
+        return (yield from self.emit_binary(Op.EQ, node))
+
+
+    # Visit an expr_not node.
+    def visitExpr_not(self, node):
+        return (yield from self.emit_unary(Op.NOT, node))
+
+
+    # Visit an expr_parenthesis node.
+    def visitExpr_parenthesis(self, node):
+        return (yield self.ast.child(node))
+
+
+    # Visit an expr_id node.
+    def visitExpr_id(self, node):
+        if self.ast.token(node, yaplParser.OBJECT_ID) != -1:
+            return self.lookup(self.text(node))
+        return self.quads.name(self.text(node, yaplParser.TYPE_ID))
+
+
+    # Visit an expr_int node.
+    def visitExpr_int(self, node):
+        return self.quads.const(int(self.text(node, yaplParser.INT)))
+
+
+    # Visit an expr_str node.
+    def visitExpr_str(self, node):
+        return self.quads.const(string_value(self.text(node, yaplParser.STRING)))
+
+
+    # Visit an expr_true node.
+    def visitExpr_true(self, node):
+        return self.quads.const(True)
+
+
+    # Visit an expr_false node.
+    def visitExpr_false(self, node):
+        return self.quads.const(False)
+
+
+    # Visit an expr_self node.
+    def visitExpr_self(self, node):
+        return self.lookup("self")
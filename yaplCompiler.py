@@ -0,0 +1,355 @@
+import os
+import sys
+import json
+import time
+import argparse
+from functools import partial
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from antlr4 import *
+from build.yaplLexer import yaplLexer
+from yaplParsing import parse, warm_up, dfa_size, PARSE_MODES
+from yaplWalker import yaplWalker
+from yaplAst import Ast
+from yaplErrorListener import yaplErrorListener
+from yaplCodeGenerator import yaplCodeGenerator
+from intermediateCode import Quadruples
+from yaplOptimizer import PassManager, LEVELS
+from yaplCache import AnalysisCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from yaplProfiler import Profiler
+from yaplParallel import walk_program
+from symbolTable import SymbolKind, COLUMNS, table_lines
+from diagnostics import Diagnostics, Diagnostic, Severity, TooManyErrors, SYNTAX, UNASSIGNED
+from dataflow import reads_of_defaults
+
+# Headless compiler driver. Runs lexer -> parser -> yaplWalker without the Tk
+# GUI, so it can check many .yapl files at once:
+#
+#   python yaplCompiler.py input/ -o results.jsonl
+#
+# Tkinter and PrettyTable are never imported from here.
+
+YAPL_EXTENSION = ".yapl"
+
+
+def null_phase(name):
+    return nullcontext()
+
+
+def split_diagnostics(diagnostics):
+    # (syntax errors, semantic errors, warnings) as dicts, each by position
+    syntax_errors, errors, warnings = [], [], []
+    for diagnostic in diagnostics.sorted():
+        if diagnostic.severity != Severity.ERROR:
+            warnings.append(diagnostic.to_dict())
+        else:
+            (syntax_errors if diagnostic.code == SYNTAX else errors).append(diagnostic.to_dict())
+    return syntax_errors, errors, warnings
+
+
+def analyze(input_stream, parse_mode="two-stage", profiler=None, max_errors=None, diagnostics=None, class_jobs=None):
+    # diagnostics, if given, is used instead of a new Diagnostics(max_errors),
+    # e.g. to subscribe to the errors as they are found. Once max_errors is
+    # reached the analysis stops and the result is "truncated". class_jobs > 1
+    # walks the classes on that many processes (yaplParallel), with the same result
+    timings = {}
+    phase = profiler.phase if profiler is not None else null_phase
+    if profiler is not None:
+        profiler.record_dfa("before", dfa_size())
+
+    diagnostics = diagnostics if diagnostics is not None else Diagnostics(max_errors)
+    walker = yaplWalker(diagnostics)
+    walker.initSymbolTable()
+    stream = None
+    ast = None
+    tokens = 0
+    used_ll = False
+    truncated = False
+
+    try:
+        start = time.perf_counter()
+        with phase("lex"):
+            lexer = yaplLexer(input_stream)
+            lexer.removeErrorListeners()
+            lexer.addErrorListener(yaplErrorListener(quiet=True, diagnostics=diagnostics))
+
+            stream = CommonTokenStream(lexer)
+            stream.fill()
+        timings["lex"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with phase("parse"):
+            tree, parser, used_ll = parse(stream, [yaplErrorListener(quiet=True, diagnostics=diagnostics)], parse_mode, profiler)
+        timings["parse"] = time.perf_counter() - start
+
+        if profiler is not None:
+            profiler.record_dfa("after", dfa_size())
+
+        # The passes only read the syntax tree; the parse tree and the tokens
+        # can go once it is built
+        start = time.perf_counter()
+        with phase("lower"):
+            ast = Ast.from_tree(tree)
+            tokens = len(stream.tokens)
+            tree = parser = stream = None
+        timings["lower"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with phase("walk"):
+            if profiler is not None:
+                profiler.instrument_walker(walker)
+                profiler.instrument_symbol_table(walker.symbolTable)
+            if class_jobs and class_jobs > 1:
+                walk_program(walker, ast, class_jobs)
+            else:
+                walker.walk(ast)
+        timings["walk"] = time.perf_counter() - start
+    except TooManyErrors:
+        truncated = True
+
+    # Intermediate code is only generated for programs without errors
+    quads = None
+    if not diagnostics.error_count and ast is not None:
+        start = time.perf_counter()
+        with phase("codegen"):
+            codegen = yaplCodeGenerator(constants=walker.symbolTable.constants, types=walker.types)
+            quads = codegen.walk(ast)
+        timings["codegen"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with phase("dataflow"):
+            for name, position in reads_of_defaults(quads, codegen.let_defaults):
+                diagnostics.report(UNASSIGNED, "La variable {name} se usa antes de asignarle un valor".format(name=name), *position, severity=Severity.WARNING)
+        timings["dataflow"] = time.perf_counter() - start
+
+    symbol_kinds = {}
+    rows = []
+    for record in walker.symbolTable.records:
+        symbol_kinds[record.kind.name] = symbol_kinds.get(record.kind.name, 0) + 1
+        rows.append(record.values())
+
+    syntax_errors, errors, warnings = split_diagnostics(diagnostics)
+    return {
+        "tokens": len(stream.tokens) if stream is not None else tokens,
+        "syntax_errors": syntax_errors,
+        "errors": errors,
+        "warnings": warnings,
+        "duplicates": diagnostics.duplicates,
+        "truncated": truncated,
+        "symbols": len(walker.symbolTable.records),
+        "constants": len(walker.symbolTable.constants),
+        "symbol_kinds": symbol_kinds,
+        "symbol_table": rows,
+        "ll_fallback": used_ll,
+        "instructions": len(quads) if quads is not None else None,
+        "intermediate_code": quads.to_dict() if quads is not None else None,
+        "timings": timings,
+    }
+
+
+def analyze_file(path, cache=None, symbol_table=False, parse_mode="two-stage", code=False, level=0, profile=False, allocations=False, max_errors=None, class_jobs=None):
+    result = {"file": path}
+    start = time.perf_counter()
+    # A profiled run always analyzes the file, a cache hit would measure nothing
+    profiler = Profiler(allocations) if profile else None
+    try:
+        with open(path, "rb") as f:
+            source = f.read()
+
+        cached = cache.get(source) if cache and not profile else None
+        # A complete entry with more errors than the limit is not what this
+        # run would produce
+        if cached is not None and max_errors and len(cached["syntax_errors"]) + len(cached["errors"]) > max_errors:
+            cached = None
+        if cached is not None:
+            # The cached timings belong to the run that produced the entry
+            cached["timings"] = {}
+            result.update(cached)
+            result["cached"] = True
+        else:
+            analysis = analyze(InputStream(source.decode("utf-8")), parse_mode, profiler, max_errors, class_jobs=class_jobs)
+            # A truncated analysis is not stored, the entry would depend on the limit
+            if cache and not analysis["truncated"]:
+                cache.put(source, analysis)
+            result.update(analysis)
+            result["cached"] = False
+    except Exception as e:
+        result["exception"] = "{name}: {msg}".format(name=type(e).__name__, msg=e)
+    result["ok"] = not (result.get("exception") or result.get("syntax_errors") or result.get("errors"))
+    result.setdefault("timings", {})
+
+    if not symbol_table:
+        result.pop("symbol_table", None)
+
+    # The cache keeps the unoptimized code, so every level can reuse it
+    intermediate_code = result.pop("intermediate_code", None)
+    if intermediate_code is not None and (code or level):
+        quads = Quadruples.from_dict(intermediate_code)
+        if level:
+            optimize_start = time.perf_counter()
+            with profiler.phase("optimize") if profiler is not None else nullcontext():
+                result["optimizations"] = PassManager(level).run(quads)
+            result["timings"]["optimize"] = time.perf_counter() - optimize_start
+            result["instructions"] = len(quads)
+        if code:
+            result["intermediate_code"] = list(quads.lines())
+
+    result["timings"]["total"] = time.perf_counter() - start
+    if profiler is not None:
+        result["profile"] = profiler.report()
+    return result
+
+
+def filter_symbols(rows, kind=None, scope=None, name=None):
+    # Rows of an analysis (Symbol.values()) that match every given filter;
+    # name matches any id that contains it, ignoring case
+    kind = SymbolKind[kind.upper()].name if kind else None
+    name = name.lower() if name else None
+    columns = {column: i for i, column in enumerate(COLUMNS)}
+    return [
+        row for row in rows
+        if (kind is None or row[columns["kind"]] == kind)
+        and (scope is None or row[columns["scope"]] == scope)
+        and (name is None or name in str(row[columns["id"]]).lower())
+    ]
+
+
+def write_diagnostics(result, format, file):
+    # Errors and warnings of one analyze_file() result, by position
+    diagnostics = sorted(result.get("syntax_errors", []) + result.get("errors", []) + result.get("warnings", []), key=lambda error: Diagnostic.from_dict(error).position())
+    for error in diagnostics:
+        if format == "json":
+            file.write(json.dumps(dict(error, file=result["file"])) + "\n")
+        elif error["line"] is None:
+            file.write("{file}: {severity} [{code}] {msg}\n".format(file=result["file"], **error))
+        else:
+            file.write("{file}:{line}:{column}: {severity} [{code}] {msg}\n".format(file=result["file"], **error))
+
+    if result.get("truncated") or result.get("exception"):
+        msg = result.get("exception") or "analisis detenido despues de {count} errores".format(count=len(diagnostics))
+        if format == "json":
+            file.write(json.dumps({"file": result["file"], "truncated": bool(result.get("truncated")), "msg": msg}) + "\n")
+        else:
+            file.write("{file}: {msg}\n".format(file=result["file"], msg=msg))
+    file.flush()
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in sorted(names):
+                    if name.endswith(YAPL_EXTENSION):
+                        files.append(os.path.join(root, name))
+        else:
+            files.append(path)
+    return files
+
+
+def run_batch(files, jobs=None, cache=None, symbol_table=False, parse_mode="two-stage", warm_files=(), code=False, level=0, profile=False, allocations=False, max_errors=None, callback=None, class_jobs=None):
+    # callback(result) is called for every file, in order, as soon as its
+    # result (and the ones of the files before it) is available
+    jobs = jobs or os.cpu_count() or 1
+    jobs = min(jobs, len(files)) or 1
+    task = partial(analyze_file, cache=cache, symbol_table=symbol_table, parse_mode=parse_mode, code=code, level=level, profile=profile, allocations=allocations, max_errors=max_errors, class_jobs=class_jobs)
+
+    results = []
+    if jobs == 1:
+        warm_up(warm_files)
+        for result in map(task, files):
+            results.append(result)
+            if callback is not None:
+                callback(result)
+        return results
+
+    # Small chunks keep every worker busy when file sizes are uneven
+    chunksize = max(1, len(files) // (jobs * 4))
+    # Every worker warms its own prediction DFA before taking files
+    with ProcessPoolExecutor(max_workers=jobs, initializer=warm_up, initargs=(list(warm_files),)) as executor:
+        for result in executor.map(task, files, chunksize=chunksize):
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analizador semantico de YAPL sin interfaz grafica")
+    parser.add_argument("paths", nargs="+", help="archivos .yapl o directorios")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="procesos a utilizar (default: numero de cores)")
+    parser.add_argument("-o", "--output", default=None, help="archivo JSON lines de salida (default: stdout)")
+    parser.add_argument("--symbols", action="store_true", help="incluir las filas de la tabla de simbolos")
+    parser.add_argument("--table", action="store_true", help="escribir la tabla de simbolos de cada archivo como texto en lugar de JSON")
+    parser.add_argument("--kind", choices=[kind.name for kind in SymbolKind], type=str.upper, default=None, help="solo simbolos de este tipo")
+    parser.add_argument("--scope", default=None, help="solo simbolos de este scope")
+    parser.add_argument("--name", default=None, help="solo simbolos cuyo id contiene este texto")
+    parser.add_argument("--code", action="store_true", help="incluir el codigo intermedio (cuadruplos)")
+    parser.add_argument("-O", dest="level", type=int, choices=sorted(LEVELS), default=0, help="nivel de optimizacion del codigo intermedio")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="directorio del cache de resultados")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES, help="tamano maximo del cache en bytes")
+    parser.add_argument("--no-cache", action="store_true", help="no leer ni escribir el cache")
+    parser.add_argument("--parse-mode", choices=PARSE_MODES, default="two-stage", help="SLL con reintento en LL, o solo LL")
+    parser.add_argument("--warm", action="append", default=[], help="archivos o directorios para precalentar el DFA de prediccion")
+    parser.add_argument("--profile", action="store_true", help="medir fases, visitors, tabla de simbolos y prediccion (ignora el cache)")
+    parser.add_argument("--profile-allocations", action="store_true", help="medir tambien la memoria asignada por fase (implica --profile)")
+    parser.add_argument("--profile-out", default=None, help="archivo JSON con el reporte de profiling")
+    parser.add_argument("--flamegraph", default=None, help="archivo de pilas plegadas (flamegraph.pl, speedscope)")
+    parser.add_argument("--class-jobs", type=int, default=None, help="procesos para analizar las clases de cada archivo (programas grandes)")
+    parser.add_argument("--max-errors", type=int, default=None, help="detener el analisis de un archivo despues de N errores")
+    parser.add_argument("--diagnostics", choices=["text", "json"], default=None, help="escribir los errores de cada archivo en stderr en cuanto se analiza")
+    args = parser.parse_args(argv)
+
+    profile = args.profile or args.profile_allocations or bool(args.profile_out or args.flamegraph)
+    cache = None if args.no_cache else AnalysisCache(args.cache_dir, args.cache_size)
+
+    files = collect_files(args.paths)
+    # Worker profiles are merged into one report for the whole batch
+    profiler = Profiler(args.profile_allocations) if profile else None
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    def write_result(result):
+        # Every result is written as soon as it arrives
+        report = result.pop("profile", None)
+        if profiler is not None and report is not None:
+            profiler.merge(report)
+        if "symbol_table" in result:
+            result["symbol_table"] = filter_symbols(result["symbol_table"], args.kind, args.scope, args.name)
+
+        if args.diagnostics:
+            write_diagnostics(result, args.diagnostics, sys.stderr)
+
+        if args.table:
+            # Written a line at a time, the table is never built as one string
+            output.write("{file}:\n".format(file=result["file"]))
+            for line in table_lines(result.get("symbol_table", [])):
+                output.write(line + "\n")
+        else:
+            output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    try:
+        results = run_batch(files, args.jobs, cache, args.symbols or args.table, args.parse_mode, collect_files(args.warm), args.code, args.level, profile, args.profile_allocations, args.max_errors, write_result, args.class_jobs)
+    finally:
+        if args.output:
+            output.close()
+
+    parsed = [result for result in results if "ll_fallback" in result and not result.get("cached")]
+    if args.parse_mode == "two-stage" and parsed:
+        fallbacks = len([result for result in parsed if result["ll_fallback"]])
+        print("LL fallback: {fallbacks}/{total} archivos".format(fallbacks=fallbacks, total=len(parsed)), file=sys.stderr)
+
+    if profiler is not None:
+        print(profiler.format_report(), file=sys.stderr)
+        if args.profile_out:
+            with open(args.profile_out, "w", encoding="utf-8") as f:
+                json.dump(profiler.report(), f, indent=2)
+        if args.flamegraph:
+            profiler.write_folded(args.flamegraph)
+
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
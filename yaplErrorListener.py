@@ -0,0 +1,27 @@
+
+from antlr4 import *
+from antlr4.error.ErrorListener import *
+from diagnostics import Diagnostics, SYNTAX
+
+class yaplErrorListener(ErrorListener):
+
+    ANSI_RESET = "\u001B[0m"
+    ANSI_RED = "\u001B[31m"
+
+    def __init__(self, quiet=False, diagnostics=None):
+        super().__init__()
+        # Syntax errors are always collected, in the Diagnostics shared with
+        # the rest of the analysis if one is given; quiet only skips printing them
+        self.quiet = quiet
+        self.errors = diagnostics if diagnostics is not None else Diagnostics()
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        # Duplicates are neither kept nor printed again
+        if self.errors.report(SYNTAX, msg, line, column) is None or self.quiet:
+            return
+
+        print("\n" + self.ANSI_RED)
+        print("----------------------------- ERROR -----------------------------")
+        print("Error: position " + str(line) + ":" + str(column) + " " + msg)
+        print("-----------------------------------------------------------------")
+        print("\n" + self.ANSI_RESET)
@@ -0,0 +1,317 @@
+import time
+from antlr4 import *
+from build.yaplLexer import yaplLexer
+from build.yaplParser import yaplParser
+from yaplParsing import parse
+from yaplWalker import yaplWalker
+from yaplAst import Ast, NodeKind
+from yaplErrorListener import yaplErrorListener
+from diagnostics import Diagnostics, TooManyErrors, SYNTAX
+from classHierarchy import ClassHierarchy, class_header
+from symbolTable import SymbolKind
+from yaplSession import AnalysisCancelled
+
+# Incremental re-analysis of a buffer that is being edited.
+#
+# The source is split at the top level ';' that ends every class, without
+# running the lexer (strings and comments are skipped by hand). Each region
+# is lexed and parsed on its own and kept, keyed by its text, until the next
+# check: an edit only re-lexes and re-parses the regions it touched, and a
+# region that just moved (lines inserted above it) only gets its token lines
+# shifted. Only the syntax tree of a region (yaplAst) is kept between checks.
+#
+# The walker then runs class by class. What a class adds to the symbol table
+# (symbols, literals, errors) only depends on its own text and on the
+# interface of the program (names, parents and feature signatures of every
+# class) and on the undefined names earlier classes declared: the walker
+# declares a name it reports as undefined, a type for the whole program and
+# an object id in its scope (a class scope is seen by the subclasses), so
+# later uses resolve to it. While the interface does not change and the
+# undefined names declared before a region that it mentions are the same,
+# the contribution of an unchanged region is replayed instead of walked again.
+
+LITERAL_KINDS = (SymbolKind.INT, SymbolKind.STRING, SymbolKind.TRUE, SymbolKind.FALSE)
+
+
+def split_classes(source):
+    # (text, line, column) of every region; the regions cover the source
+    regions = []
+    start = 0
+    start_line, start_column = 1, 0
+    line, line_start = 1, 0
+    depth = 0
+    i = 0
+    length = len(source)
+
+    while i < length:
+        char = source[i]
+        if char == "\n":
+            line += 1
+            line_start = i + 1
+        elif char == '"':
+            i += 1
+            while i < length and source[i] != '"':
+                if source[i] == "\\":
+                    i += 1
+                elif source[i] == "\n":
+                    line += 1
+                    line_start = i + 1
+                i += 1
+        elif char == "-" and source.startswith("--", i):
+            end = source.find("\n", i)
+            i = (end if end != -1 else length) - 1
+        elif char == "(" and source.startswith("(*", i):
+            end = source.find("*)", i + 2)
+            end = end + 1 if end != -1 else length - 1
+            newlines = source.count("\n", i, end)
+            if newlines:
+                line += newlines
+                line_start = source.rfind("\n", i, end) + 1
+            i = end
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth = max(0, depth - 1)
+        elif char == ";" and depth == 0:
+            regions.append((source[start:i + 1], start_line, start_column))
+            start = i + 1
+            start_line, start_column = line, i + 1 - line_start
+        i += 1
+
+    if source[start:].strip():
+        regions.append((source[start:], start_line, start_column))
+    return regions
+
+
+def class_signature(ast, node):
+    # The part of a class other classes can see
+    name, parents = class_header(ast, node)
+    features = []
+    for feature in ast.children(node):
+        params = None
+        if ast.kind[feature] == NodeKind.FEAT_DEF:
+            params = tuple(str(ast.text(ast.token(formal, yaplParser.TYPE_ID))) for formal in ast.children(feature, NodeKind.FORMAL))
+        elif ast.kind[feature] != NodeKind.FEAT_ASGN:
+            # A feature the parser could not recognize
+            continue
+        features.append((str(ast.text(ast.token(feature, yaplParser.OBJECT_ID))), str(ast.text(ast.token(feature, yaplParser.TYPE_ID))), params))
+    return (ast.text(name), ast.text(parents[0]) if parents else None, tuple(features))
+
+
+def walk_classes(walker, ast, classes):
+    # Walks the class_def nodes of ast and returns what they added, for
+    # replay_classes
+    table = walker.symbolTable
+    records, literals, errors = len(table.records), len(table.literals), len(walker.errors)
+    undefined = len(walker.undefined)
+    main_classes, main_methods = walker.main_class_count, walker.main_method_count
+
+    for node in classes:
+        walker.walk(ast, node)
+
+    # Symbols and literal occurrences, by their position among the records
+    # of the classes, so a replay adds them in the same order
+    contribution = []
+    for offset, symbol in enumerate(table.records[records:]):
+        if symbol.kind not in LITERAL_KINDS:
+            contribution.append((offset, symbol))
+    for position, kind, text, line, column, max_size in table.literals[literals:]:
+        contribution.append((position - records, (kind, text, line, column, max_size)))
+    contribution.sort(key=lambda item: (item[0], 0 if isinstance(item[1], tuple) else 1))
+
+    return {
+        "records": contribution,
+        "errors": walker.errors[errors:],
+        "undefined": walker.undefined[undefined:],
+        "main_classes": walker.main_class_count - main_classes,
+        "main_methods": walker.main_method_count - main_methods,
+    }
+
+
+def replay_classes(walker, classes, contribution):
+    # Adds a contribution of walk_classes() again; classes are the (name,
+    # parent) of the walked classes, whose scopes are linked to their parents
+    # as the walker would have
+    table = walker.symbolTable
+    for name, parent in classes:
+        table.enter_class(name, parent)
+        table.exit_scope()
+
+    for offset, entry in contribution["records"]:
+        if isinstance(entry, tuple):
+            table.add_literal(*entry)
+        else:
+            table.register(entry)
+    walker.errors.extend(contribution["errors"])
+    walker.undefined.extend(contribution["undefined"])
+    walker.main_class_count += contribution["main_classes"]
+    walker.main_method_count += contribution["main_methods"]
+
+
+class Region:
+
+    __slots__ = ("text", "line", "column", "ast", "classes", "signatures", "names", "syntax_errors", "interface", "seen", "declared", "contribution")
+
+    def __init__(self, text, line, column, parse_mode="two-stage"):
+        self.text = text
+        self.line = line
+        self.column = column
+
+        lexer = yaplLexer(InputStream(text))
+        lexer.removeErrorListeners()
+        lexer_listener = yaplErrorListener(quiet=True)
+        lexer.addErrorListener(lexer_listener)
+        stream = CommonTokenStream(lexer)
+        stream.fill()
+
+        # Positions in the whole buffer instead of the region; the lexer
+        # errors were reported before the shift, the parser ones after it
+        for token in stream.tokens:
+            if token.line == 1:
+                token.column += column
+            token.line += line - 1
+        for error in lexer_listener.errors:
+            if error.line == 1:
+                error.column += column
+            error.line += line - 1
+
+        parser_listener = yaplErrorListener(quiet=True)
+        tree, parser, used_ll = parse(stream, [parser_listener], parse_mode)
+        self.syntax_errors = list(lexer_listener.errors) + list(parser_listener.errors)
+        # Only the syntax tree is kept, not the parse tree and its tokens
+        self.ast = Ast.from_tree(tree)
+        self.classes = [node for node in self.ast.class_defs() if class_header(self.ast, node)[0] != -1]
+        self.signatures = tuple(class_signature(self.ast, node) for node in self.classes)
+        # Every identifier in the region
+        self.names = frozenset(self.ast.names)
+
+        # Walker results, valid while the interface of the program is the same
+        # (same IncrementalAnalyzer.version) and the region sees the same
+        # undefined names of earlier regions (seen); declared are the ones it
+        # declares itself, ("TYPE_ID", name) or ("OBJECT_ID", class, name)
+        self.interface = None
+        self.seen = None
+        self.declared = frozenset()
+        self.contribution = None
+
+    def move(self, line):
+        delta = line - self.line
+        if not delta:
+            return
+        self.line = line
+        self.ast.shift_lines(delta)
+        for error in self.syntax_errors:
+            error.line += delta
+
+        if self.contribution is not None:
+            records = self.contribution["records"]
+            for i, (offset, entry) in enumerate(records):
+                if isinstance(entry, tuple):
+                    kind, text, line, column, max_size = entry
+                    records[i] = (offset, (kind, text, line + delta, column, max_size))
+                elif entry.line is not None:
+                    entry.line += delta
+            for error in self.contribution["errors"]:
+                if error.line is not None:
+                    error.line += delta
+
+
+class IncrementalAnalyzer:
+
+    def __init__(self, parse_mode="two-stage", max_errors=None):
+        self.parse_mode = parse_mode
+        self.max_errors = max_errors
+        # Region text -> regions with that text from the previous check
+        self.regions = {}
+        self.interface = None
+        # Increased every time the interface changes
+        self.version = 0
+        self.hierarchy = None
+
+    def check(self, source, cancelled=lambda: False):
+        start = time.perf_counter()
+        stats = {"regions": 0, "parsed": 0, "moved": 0, "walked": 0, "replayed": 0}
+
+        previous = self.regions
+        self.regions = {}
+        regions = []
+        for text, line, column in split_classes(source):
+            candidates = [region for region in previous.get(text, ()) if region.column == column]
+            if candidates:
+                region = candidates[0]
+                previous[text].remove(region)
+                if region.line != line:
+                    stats["moved"] += 1
+                region.move(line)
+            else:
+                region = Region(text, line, column, self.parse_mode)
+                stats["parsed"] += 1
+            regions.append(region)
+            self.regions.setdefault(text, []).append(region)
+            if cancelled():
+                # Regions that were not reached stay available for the next check
+                for text, unused in previous.items():
+                    self.regions.setdefault(text, []).extend(unused)
+                raise AnalysisCancelled()
+        stats["regions"] = len(regions)
+
+        interface = tuple(region.signatures for region in regions)
+        if interface != self.interface:
+            self.interface = interface
+            self.version += 1
+            self.hierarchy = ClassHierarchy.from_classes([(region.ast, node) for region in regions for node in region.classes])
+
+        # A region interrupted by the error limit keeps its previous
+        # contribution, which no longer matches the version, and is walked
+        # again by the next check
+        diagnostics = Diagnostics(self.max_errors)
+        walker = yaplWalker(diagnostics)
+        walker.initSymbolTable()
+        truncated = False
+        try:
+            for region in regions:
+                diagnostics.extend(region.syntax_errors)
+            walker.begin_program(self.hierarchy)
+            declared = set()
+            for region in regions:
+                seen = frozenset(entry for entry in declared if entry[-1] in region.names)
+                if region.contribution is not None and region.interface == self.version and region.seen == seen:
+                    self.replay(walker, region)
+                    stats["replayed"] += 1
+                else:
+                    self.walk(walker, region)
+                    region.interface = self.version
+                    region.seen = seen
+                    stats["walked"] += 1
+                declared.update(region.declared)
+                if cancelled():
+                    raise AnalysisCancelled()
+            walker.end_program()
+        except TooManyErrors:
+            truncated = True
+
+        found = [diagnostic.to_dict() for diagnostic in diagnostics.sorted()]
+        return {
+            "syntax_errors": [diagnostic for diagnostic in found if diagnostic["code"] == SYNTAX],
+            "errors": [diagnostic for diagnostic in found if diagnostic["code"] != SYNTAX],
+            "diagnostics": found,
+            "truncated": truncated,
+            "symbol_table": walker.symbolTable,
+            "stats": stats,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def walk(self, walker, region):
+        region.contribution = walk_classes(walker, region.ast, region.classes)
+
+        # Undefined names the region declared where later regions can see them
+        declared = set(("TYPE_ID", name) for kind, name in region.contribution["undefined"] if kind == "TYPE_ID")
+        for name, parent, features in region.signatures:
+            scope = walker.symbolTable.class_scopes.get(name)
+            if scope is not None:
+                feature_names = set(feature[0] for feature in features)
+                declared.update(("OBJECT_ID", name, symbol) for symbol in scope.symbols if symbol not in feature_names)
+        region.declared = frozenset(declared)
+
+    def replay(self, walker, region):
+        replay_classes(walker, [(name, parent) for name, parent, features in region.signatures], region.contribution)
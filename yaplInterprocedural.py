@@ -0,0 +1,335 @@
+from classHierarchy import BUILTIN_CLASSES, ROOT_CLASS
+from intermediateCode import Op, Operand, NONE, KIND_MASK, DEFINING_OPS, INIT_METHOD
+
+# Whole-program optimizations over the intermediate code (-O3).
+#
+# Unlike the passes of yaplOptimizer, these look at every function at once.
+# The class headers give the hierarchy and the function headers the methods
+# each class defines; method tables are built the way yaplVM builds them
+# (every class resolves the built-in methods), so the method a call runs is
+# known whenever the receiver's class and all its subclasses share it.
+#
+#   devirtualization  a CALL whose target is unique becomes a STATIC_CALL
+#   inlining          small leaf methods are copied into their static calls
+#   tail_calls        a method calling itself on self right before returning
+#                     assigns its formals and jumps back to its start
+#
+# Each pass returns how many calls it changed. STATIC_CALL still fails on a
+# void receiver, so an inlined call keeps that check unless the receiver is
+# self or the result of a new.
+
+# Largest method body, in instructions, that is inlined
+INLINE_BUDGET = 12
+
+CALL_OPS = (Op.PARAM, Op.CALL, Op.STATIC_CALL, Op.NEW)
+RENAMED_KINDS = (Operand.TEMP, Operand.LOCAL, Operand.LABEL)
+
+
+class Program:
+
+    def __init__(self, segments, quads):
+        # segments are the ones of yaplOptimizer.split_functions; the passes
+        # replace the functions they change in place
+        self.segments = segments
+        self.quads = quads
+        self.self_operand = quads.local("self")
+
+        builtins = {}
+        parents = {}
+        defined = {}
+        for name, (parent, methods) in BUILTIN_CLASSES.items():
+            parents[name] = parent
+            defined[name] = {}
+            for method in methods:
+                builtins[method[0]] = "{cls}.{method}".format(cls=name, method=method[0])
+
+        # "Class.method" -> index of its segment
+        self.functions = {}
+        for index, segment in enumerate(segments):
+            op, arg1, arg2, result = segment[0]
+            if op == Op.CLASS:
+                name = quads.value(arg1)
+                parents[name] = quads.value(arg2) if arg2 else ROOT_CLASS
+                defined.setdefault(name, {})
+            elif op == Op.FUNC:
+                name = quads.value(arg1)
+                self.functions[name] = index
+                cls, method = name.split(".", 1)
+                if method != INIT_METHOD:
+                    defined.setdefault(cls, {})[method] = name
+
+        # Method tables, parents before children
+        self.methods = {}
+        order = []
+        for name in parents:
+            chain = []
+            while name is not None and name not in self.methods and name not in chain:
+                chain.append(name)
+                name = parents.get(name)
+            table = self.methods.get(name, builtins)
+            for cls in reversed(chain):
+                table = dict(table)
+                table.update(defined.get(cls, {}))
+                self.methods[cls] = table
+                order.append(cls)
+
+        # Methods redefined by some class below each class
+        self.overridden = {name: set() for name in order}
+        for cls in reversed(order):
+            parent = parents[cls]
+            if parent in self.overridden and parent != cls:
+                self.overridden[parent] |= self.overridden[cls]
+                self.overridden[parent].update(defined.get(cls, ()))
+
+    def target(self, type_name, method, exact=False):
+        # Function every receiver of static type type_name runs for method
+        # (a built-in is named after its class), or None when a subclass
+        # redefines it. exact: the receiver is of that class, not a subclass
+        table = self.methods.get(type_name)
+        if table is None or (not exact and method in self.overridden[type_name]):
+            return None
+        return table.get(method)
+
+    def resolve(self, name):
+        # Function a STATIC_CALL "Type.method" runs
+        type_name, method = name.split(".", 1)
+        return self.target(type_name, method, exact=True)
+
+    def formals(self, name):
+        # Number of formals of a function, None for a built-in
+        index = self.functions.get(name)
+        return None if index is None else self.quads.value(self.segments[index][0][2])
+
+    def bodies(self):
+        # (index, code) of every function
+        for index, code in enumerate(self.segments):
+            if code[0][0] == Op.FUNC:
+                yield index, code
+
+
+def params_start(code, end, count):
+    # Index of the first of the count params right before code[end], or None
+    # when they are not all there
+    start = end - count
+    if start < 1 or any(code[i][0] != Op.PARAM for i in range(start, end)):
+        return None
+    return start
+
+
+def created_objects(code, quads):
+    # Temporaries that only hold the result of a new: class name
+    definitions = {}
+    for op, arg1, arg2, result in code:
+        if op in DEFINING_OPS:
+            definitions[result] = definitions.get(result, 0) + 1
+    return {result: quads.value(arg1) for op, arg1, arg2, result in code if op == Op.NEW and definitions[result] == 1}
+
+
+# ----------------------------------------------------------------------
+# Passes
+# ----------------------------------------------------------------------
+
+def devirtualization(program):
+    quads = program.quads
+    changed = 0
+
+    for index, code in program.bodies():
+        cls = quads.value(code[0][1]).split(".", 1)[0]
+        created = created_objects(code, quads)
+
+        for i, instruction in enumerate(code):
+            op, arg1, arg2, result = instruction
+            if op != Op.CALL:
+                continue
+            count = quads.value(arg2)
+            start = params_start(code, i, count)
+            if start is None:
+                continue
+
+            receiver = code[start][1]
+            method = quads.value(arg1)
+            if receiver in created:
+                target = program.target(created[receiver], method, exact=True)
+            elif receiver == program.self_operand:
+                target = program.target(cls, method)
+            else:
+                target = program.target(quads.receivers.get(result), method)
+
+            # A call with the wrong number of arguments keeps failing at run time
+            if target is None or program.formals(target) not in (None, count - 1):
+                continue
+            instruction[:] = [Op.STATIC_CALL, quads.name(target), arg2, result]
+            changed += 1
+
+    return changed
+
+
+def leaf_method(code, budget):
+    # (formals, body, uses attributes) of a method that makes no calls and
+    # fits the budget, None otherwise
+    formals = [instruction[1] for instruction in code[1:] if instruction[0] == Op.FORMAL]
+    body = code[1 + len(formals):-1]
+    if len(body) > budget or any(instruction[0] in CALL_OPS for instruction in body):
+        return None
+    uses_attrs = any(operand & KIND_MASK == Operand.ATTR for instruction in body for operand in instruction[1:])
+    return formals, body, uses_attrs
+
+
+def inline_call(program, leaf, params, call, guarded):
+    # Code that runs the leaf method on the values of params and leaves its
+    # value in the result of call
+    quads = program.quads
+    formals, body, uses_attrs = leaf
+    receiver = params[0][1]
+    result = call[3]
+    end = quads.label()
+    code = []
+
+    if guarded:
+        # A void receiver still goes through the call, which reports it
+        is_void = quads.temp()
+        inlined = quads.label()
+        code.append([Op.ISVOID, receiver, NONE, is_void])
+        code.append([Op.IF_FALSE, is_void, inlined, NONE])
+        code.extend(list(param) for param in params)
+        code.append(list(call))
+        code.append([Op.GOTO, end, NONE, NONE])
+        code.append([Op.LABEL, inlined, NONE, NONE])
+
+    # Temporaries, locals and labels of the method get fresh names here
+    renamed = {}
+    if receiver == program.self_operand:
+        renamed[receiver] = receiver
+
+    def rename(operand):
+        kind = operand & KIND_MASK
+        if kind not in RENAMED_KINDS:
+            return operand
+        if operand not in renamed:
+            renamed[operand] = quads.label() if kind == Operand.LABEL else quads.temp()
+        return renamed[operand]
+
+    if receiver != program.self_operand:
+        code.append([Op.ASSIGN, receiver, NONE, rename(program.self_operand)])
+    for formal, param in zip(formals, params[1:]):
+        code.append([Op.ASSIGN, param[1], NONE, rename(formal)])
+
+    for i, (op, arg1, arg2, target) in enumerate(body):
+        if op == Op.RETURN:
+            code.append([Op.ASSIGN, rename(arg1), NONE, result])
+            if i + 1 < len(body):
+                code.append([Op.GOTO, end, NONE, NONE])
+        else:
+            code.append([op, rename(arg1), rename(arg2), rename(target)])
+
+    code.append([Op.LABEL, end, NONE, NONE])
+    return code
+
+
+def inlining(program, budget=INLINE_BUDGET):
+    quads = program.quads
+    changed = 0
+
+    # Leaf methods make no calls, so inlining never changes them
+    leaves = {}
+    for name, index in program.functions.items():
+        if not name.endswith("." + INIT_METHOD):
+            leaf = leaf_method(program.segments[index], budget)
+            if leaf is not None:
+                leaves[name] = leaf
+
+    for index, code in program.bodies():
+        created = created_objects(code, quads)
+        rewritten = []
+        for instruction in code:
+            op, arg1, arg2, result = instruction
+            leaf = leaves.get(program.resolve(quads.value(arg1))) if op == Op.STATIC_CALL else None
+            count = quads.value(arg2) if leaf is not None else 0
+            start = params_start(rewritten, len(rewritten), count) if leaf is not None and count == len(leaf[0]) + 1 else None
+            if start is None:
+                rewritten.append(instruction)
+                continue
+
+            # Attributes of the method are the ones of self here, so a method
+            # that uses them is only inlined into calls on self
+            receiver = rewritten[start][1]
+            if leaf[2] and receiver != program.self_operand:
+                rewritten.append(instruction)
+                continue
+
+            guarded = not (receiver == program.self_operand or receiver in created)
+            params = rewritten[start:]
+            del rewritten[start:]
+            rewritten.extend(inline_call(program, leaf, params, instruction, guarded))
+            changed += 1
+
+        program.segments[index] = rewritten
+
+    return changed
+
+
+def in_tail_position(code, i, labels):
+    # Whether the value of the call at code[i] is returned right away, maybe
+    # through copies and jumps
+    value = code[i][3]
+    seen = set()
+    j = i + 1
+    while j < len(code) and j not in seen:
+        seen.add(j)
+        op, arg1, arg2, result = code[j]
+        if op == Op.LABEL:
+            j += 1
+        elif op == Op.GOTO:
+            j = labels.get(arg1, len(code))
+        elif op == Op.ASSIGN and arg1 == value and result & KIND_MASK in (Operand.TEMP, Operand.LOCAL):
+            value = result
+            j += 1
+        else:
+            return op == Op.RETURN and arg1 == value
+    return False
+
+
+def tail_calls(program):
+    # Nothing read after the jump was assigned by the previous round: the
+    # generated code writes every temporary and let variable before reading it
+    quads = program.quads
+    changed = 0
+
+    for index, code in program.bodies():
+        name = quads.value(code[0][1])
+        formals = [instruction[1] for instruction in code[1:] if instruction[0] == Op.FORMAL]
+        labels = {instruction[1]: i for i, instruction in enumerate(code) if instruction[0] == Op.LABEL}
+        start = None
+        rewritten = []
+
+        for i, instruction in enumerate(code):
+            op, arg1, arg2, result = instruction
+            if op == Op.STATIC_CALL and quads.value(arg2) == len(formals) + 1 and program.resolve(quads.value(arg1)) == name:
+                first = params_start(rewritten, len(rewritten), len(formals) + 1)
+                if first is not None and rewritten[first][1] == program.self_operand and in_tail_position(code, i, labels):
+                    if start is None:
+                        start = quads.label()
+
+                    # The arguments may read the formals they replace
+                    args = rewritten[first + 1:]
+                    del rewritten[first:]
+                    copies = [quads.temp() for formal in formals]
+                    rewritten.extend([Op.ASSIGN, arg[1], NONE, copy] for arg, copy in zip(args, copies))
+                    rewritten.extend([Op.ASSIGN, copy, NONE, formal] for copy, formal in zip(copies, formals))
+                    rewritten.append([Op.GOTO, start, NONE, NONE])
+                    changed += 1
+                    continue
+            rewritten.append(instruction)
+
+        if start is not None:
+            rewritten.insert(1 + len(formals), [Op.LABEL, start, NONE, NONE])
+            program.segments[index] = rewritten
+
+    return changed
+
+
+PROGRAM_PASSES = {
+    "devirtualization": devirtualization,
+    "inlining": inlining,
+    "tail_calls": tail_calls,
+}
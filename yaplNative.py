@@ -0,0 +1,1224 @@
+import os
+import sys
+import json
+import time
+import bisect
+import argparse
+import tempfile
+import subprocess
+from intermediateCode import Quadruples, Op, Operand, KIND_MASK, KIND_BITS, INIT_METHOD, function_ranges
+from dataflow import ControlFlowGraph, Liveness, VARIABLE_KINDS, variable_operands
+from yaplVM import YaplVM, Function
+
+# Native back end: x86-64 assembly (GNU as, AT&T syntax) from the
+# intermediate code, linked with gcc against the C library.
+#
+# Values are 64 bit words:
+#   Int     n << 1 | 1 (63 bits, wraps on overflow instead of growing)
+#   Bool    2 (false) or 6 (true)
+#   void    0
+#   objects pointers to [class, attributes...]
+#   String  pointers to [String class, length in bytes, bytes..., 0]
+# A class is [name, parent, instance size, 0] followed by its vtable. The
+# class layouts and method tables are the ones of YaplVM, so both back ends
+# agree on attributes and dispatch. Every method name gets a vtable slot,
+# shared with names no class understands at the same time, and each entry
+# keeps the name id next to the function so a call on an object that does
+# not have the method fails instead of running another one.
+#
+# Calls push the receiver and then the arguments, the caller pops them, and
+# the result comes back in %rax. Each function gets its temporaries and
+# locals in registers by linear scan over their live intervals: values that
+# live across a call only get the callee-saved registers, the others also
+# use the caller-saved ones that do not pass arguments to the C library.
+# What does not fit is spilled to the frame (formals to the slot the caller
+# pushed them in). %rax, %rdx and %r11 are scratch.
+#
+# Build and run a program with: python yaplNative.py input/p2_fibonacci.yapl -O2 --run
+
+CALLEE_SAVED = ("%rbx", "%r12", "%r13", "%r14", "%r15")
+CALLER_SAVED = ("%rcx", "%rsi", "%rdi", "%r8", "%r9", "%r10")
+REGISTERS_32 = {
+    "%rbx": "%ebx", "%r12": "%r12d", "%r13": "%r13d", "%r14": "%r14d", "%r15": "%r15d",
+    "%rcx": "%ecx", "%rsi": "%esi", "%rdi": "%edi", "%r8": "%r8d", "%r9": "%r9d", "%r10": "%r10d",
+}
+
+# Jump taken by IF_FALSE after a comparison
+NEGATED = {"e": "ne", "l": "ge", "le": "g"}
+
+CALL_OPS = (Op.CALL, Op.STATIC_CALL, Op.NEW)
+
+VOID = 0
+FALSE = 2
+TRUE = 6
+# Name, parent, instance size and a free word come before the vtable
+CLASS_HEADER = 32
+VTABLE_ENTRY = 16
+
+
+def tagged(value):
+    # Word of an Int, Bool or void constant
+    if value is None:
+        return VOID
+    if isinstance(value, bool):
+        return TRUE if value else FALSE
+    word = (2 * value + 1) & 0xFFFFFFFFFFFFFFFF
+    return word - (1 << 64) if word >= 1 << 63 else word
+
+
+def fits_imm32(value):
+    return -(1 << 31) <= value < (1 << 31)
+
+
+def is_register(location):
+    return location.startswith("%")
+
+
+def string_bytes(value):
+    data = list(value.encode("utf-8")) + [0]
+    return "\n".join("    .byte " + ", ".join(str(b) for b in data[i:i + 16]) for i in range(0, len(data), 16))
+
+
+class Interval:
+
+    __slots__ = ("operand", "start", "end", "crosses_call", "location")
+
+    def __init__(self, operand, position):
+        self.operand = operand
+        self.start = position
+        self.end = position
+        self.crosses_call = False
+        # Register or frame slot, set by linear_scan
+        self.location = None
+
+
+def instruction_variables(instruction, self_operand):
+    # (read, written) temporaries and locals of an instruction; attributes are
+    # read and written through self
+    read, written = variable_operands(instruction)
+    op, arg1, arg2, result = instruction
+    if Operand.ATTR in (arg1 & KIND_MASK, arg2 & KIND_MASK, result & KIND_MASK):
+        read.append(self_operand)
+    return read, written
+
+
+def live_intervals(quads, start, end, self_operand):
+    # Live interval of every variable of the function quads[start:end + 1],
+    # by instruction index: from its first definition or use to its last use,
+    # covering the blocks it is live through. Self and the formals start at
+    # the FUNC instruction, where the caller already set them
+    cfg = ControlFlowGraph.from_quads(quads, start, end)
+    operands = lambda instruction: instruction_variables(instruction, self_operand)
+    liveness = Liveness(cfg, operands)
+    members = liveness.variables.members
+    base = start + 1
+
+    intervals = {}
+
+    def extend(operand, position):
+        interval = intervals.get(operand)
+        if interval is None:
+            intervals[operand] = Interval(operand, position)
+        elif position < interval.start:
+            interval.start = position
+        elif position > interval.end:
+            interval.end = position
+
+    extend(self_operand, start)
+    i = base
+    while quads.op[i] == Op.FORMAL:
+        extend(quads.arg1[i], start)
+        i += 1
+
+    for b, (first, last) in enumerate(cfg.blocks):
+        for operand in members(liveness.live_in[b]):
+            extend(operand, base + first)
+        for operand in members(liveness.live_out[b]):
+            extend(operand, base + last - 1)
+        for i in range(first, last):
+            read, written = operands(cfg.code[i])
+            for operand in read + written:
+                extend(operand, base + i)
+
+    calls = [i for i in range(start + 1, end) if quads.op[i] in CALL_OPS]
+    for interval in intervals.values():
+        # A value written by the call itself does not cross it
+        first_call = bisect.bisect_right(calls, interval.start)
+        interval.crosses_call = first_call < len(calls) and calls[first_call] < interval.end
+
+    entry_live = set(members(liveness.live_in[0])) if cfg.blocks else set()
+    return intervals, entry_live
+
+
+def linear_scan(intervals):
+    # Assigns a register to each interval, or None if it has to be spilled
+    free = {"callee": list(CALLEE_SAVED), "caller": list(CALLER_SAVED)}
+    pool_of = dict([(register, "callee") for register in CALLEE_SAVED] + [(register, "caller") for register in CALLER_SAVED])
+    active = []
+    spilled = []
+
+    for interval in sorted(intervals, key=lambda interval: (interval.start, interval.end)):
+        # Intervals that ended before this one starts give their register back
+        still_active = []
+        for other in active:
+            if other.end < interval.start:
+                free[pool_of[other.location]].append(other.location)
+            else:
+                still_active.append(other)
+        active = still_active
+
+        pools = ("callee",) if interval.crosses_call else ("caller", "callee")
+        register = None
+        for pool in pools:
+            if free[pool]:
+                register = free[pool].pop(0)
+                break
+
+        if register is None:
+            # Spill whichever ends last, if its register can hold this interval
+            candidates = [other for other in active if pool_of[other.location] in pools]
+            victim = max(candidates, key=lambda other: other.end) if candidates else None
+            if victim is None or victim.end <= interval.end:
+                spilled.append(interval)
+                continue
+            register = victim.location
+            victim.location = None
+            spilled.append(victim)
+            active.remove(victim)
+
+        interval.location = register
+        active.append(interval)
+    return spilled
+
+
+class NativeGenerator:
+
+    def __init__(self, quads):
+        self.quads = quads
+        # Class layouts, method tables and static calls come from the VM
+        self.vm = YaplVM(quads)
+        self.lines = []
+        self.strings = {}
+        self.missing = {}
+        self.stats = {"functions": 0, "intervals": 0, "spilled": 0}
+        self.assign_slots()
+
+    def emit(self, line):
+        self.lines.append(line)
+
+    def ins(self, text):
+        self.lines.append("    " + text)
+
+    def string_label(self, value):
+        if value not in self.strings:
+            self.strings[value] = "str.{n}".format(n=len(self.strings))
+        return self.strings[value]
+
+    def missing_label(self, name):
+        # Stub that reports a method that does not exist
+        if name not in self.missing:
+            self.missing[name] = ".Lnomethod{n}".format(n=len(self.missing))
+        return self.missing[name]
+
+    @staticmethod
+    def method_label(method):
+        if isinstance(method, Function):
+            return method.name
+        return "builtin." + method.__name__
+
+    # ----------------------------------------------------------------------
+    # Vtables
+    # ----------------------------------------------------------------------
+
+    def assign_slots(self):
+        # Greedy coloring: a name takes the first slot that no class
+        # understanding it already uses for another name
+        classes = self.vm.class_list
+        understood = {}
+        for cls in classes:
+            for name_id in cls.methods:
+                understood.setdefault(name_id, []).append(cls)
+
+        used = {cls.name: set() for cls in classes}
+        self.slots = {}
+        for name_id in sorted(understood, key=lambda name_id: (-len(understood[name_id]), name_id)):
+            slot = 0
+            while any(slot in used[cls.name] for cls in understood[name_id]):
+                slot += 1
+            self.slots[name_id] = slot
+            for cls in understood[name_id]:
+                used[cls.name].add(slot)
+        self.vtable_size = max(self.slots.values()) + 1 if self.slots else 0
+
+    def class_data(self, cls):
+        size = 8 * (1 + len(cls.attributes))
+        self.emit("    .balign 8")
+        self.emit("class.{name}:".format(name=cls.name))
+        self.ins(".quad {name}, {parent}, {size}, 0".format(
+            name=self.string_label(cls.name),
+            parent="class." + cls.parent if cls.parent else "0",
+            size=size))
+        entries = [None] * self.vtable_size
+        for name_id, method in cls.methods.items():
+            entries[self.slots[name_id]] = (name_id, self.method_label(method))
+        for entry in entries:
+            self.ins(".quad {id}, {label}".format(id=entry[0], label=entry[1]) if entry else ".quad -1, 0")
+
+    def new_function(self, cls):
+        # new.Class: allocates the object and runs the _init functions, root
+        # class first
+        self.emit("new.{name}:".format(name=cls.name))
+        if cls.name == "Int":
+            self.ins("mov ${word}, %eax".format(word=tagged(0)))
+            self.ins("ret")
+            return
+        if cls.name == "Bool":
+            self.ins("mov ${word}, %eax".format(word=FALSE))
+            self.ins("ret")
+            return
+        if cls.name == "String":
+            self.ins("lea {label}(%rip), %rax".format(label=self.string_label("")))
+            self.ins("ret")
+            return
+
+        inits = []
+        current = cls
+        while current is not None:
+            init = current.functions.get(INIT_METHOD)
+            if init is not None:
+                inits.append(init)
+            current = self.vm.classes.get(current.parent)
+
+        self.ins("push %rbx")
+        self.ins("mov ${size}, %edi".format(size=8 * (1 + len(cls.attributes))))
+        self.ins("call rt_alloc")
+        self.ins("lea class.{name}(%rip), %r11".format(name=cls.name))
+        self.ins("mov %r11, (%rax)")
+        self.ins("mov %rax, %rbx")
+        for init in reversed(inits):
+            self.ins("push %rbx")
+            self.ins("call {label}".format(label=init.name))
+            self.ins("add $8, %rsp")
+        self.ins("mov %rbx, %rax")
+        self.ins("pop %rbx")
+        self.ins("ret")
+
+    # ----------------------------------------------------------------------
+    # Functions
+    # ----------------------------------------------------------------------
+
+    def function(self, start, end):
+        quads = self.quads
+        name = quads.value(quads.arg1[start])
+        formals = quads.value(quads.arg2[start])
+        self.cls = self.vm.classes[name.split(".", 1)[0]]
+        self.self_operand = quads.local("self")
+        self.return_label = ".Lreturn{n}".format(n=start)
+
+        intervals, entry_live = live_intervals(quads, start, end, self.self_operand)
+        spilled = linear_scan(intervals.values())
+        self.stats["functions"] += 1
+        self.stats["intervals"] += len(intervals)
+        self.stats["spilled"] += len(spilled)
+
+        # Self and the formals stay in the slots the caller pushed them to
+        homes = {self.self_operand: "{offset}(%rbp)".format(offset=16 + 8 * formals)}
+        i = start + 1
+        while quads.op[i] == Op.FORMAL:
+            homes[quads.arg1[i]] = "{offset}(%rbp)".format(offset=16 + 8 * (formals - (i - start)))
+            i += 1
+
+        saved = [register for register in CALLEE_SAVED if any(interval.location == register for interval in intervals.values())]
+        slots = 0
+        for interval in spilled:
+            if interval.operand in homes:
+                interval.location = homes[interval.operand]
+            else:
+                slots += 1
+                interval.location = "{offset}(%rbp)".format(offset=-8 * (len(saved) + slots))
+        self.intervals = intervals
+        self.locations = {operand: interval.location for operand, interval in intervals.items()}
+
+        self.emit("")
+        self.emit("{name}:".format(name=name))
+        self.ins("push %rbp")
+        self.ins("mov %rsp, %rbp")
+        for register in saved:
+            self.ins("push {register}".format(register=register))
+        if slots:
+            self.ins("sub ${size}, %rsp".format(size=8 * slots))
+        for operand, home in homes.items():
+            if operand in self.locations and is_register(self.locations[operand]):
+                self.ins("mov {home}, {register}".format(home=home, register=self.locations[operand]))
+        # Variables read before they are written start as void, as in the VM
+        for operand in entry_live:
+            if operand in homes:
+                continue
+            location = self.locations[operand]
+            if is_register(location):
+                self.ins("xor {register}, {register}".format(register=REGISTERS_32[location]))
+            else:
+                self.ins("movq $0, {slot}".format(slot=location))
+
+        fused = False
+        for i in range(start + 1, end):
+            if fused:
+                fused = False
+                continue
+            fused = self.instruction(i, i == end - 1)
+
+        self.emit(self.return_label + ":")
+        if saved:
+            self.ins("lea {offset}(%rbp), %rsp".format(offset=-8 * len(saved)))
+            for register in reversed(saved):
+                self.ins("pop {register}".format(register=register))
+        else:
+            self.ins("mov %rbp, %rsp")
+        self.ins("pop %rbp")
+        self.ins("ret")
+
+    # Operands
+
+    def attribute(self, operand):
+        # Memory operand of an attribute of self
+        base = self.locations[self.self_operand]
+        if not is_register(base):
+            self.ins("mov {base}, %r11".format(base=base))
+            base = "%r11"
+        index = self.cls.attribute_index[self.quads.value(operand)]
+        return "{offset}({base})".format(offset=8 * (1 + index), base=base)
+
+    def source(self, operand, scratch):
+        # Register, memory or immediate operand with the value of operand;
+        # constants that do not fit an immediate are loaded into scratch
+        kind = operand & KIND_MASK
+        if kind == Operand.CONST:
+            value = self.quads.value(operand)
+            if isinstance(value, str):
+                self.ins("lea {label}(%rip), {scratch}".format(label=self.string_label(value), scratch=scratch))
+                return scratch
+            word = tagged(value)
+            if fits_imm32(word):
+                return "${word}".format(word=word)
+            self.ins("movabs ${word}, {scratch}".format(word=word, scratch=scratch))
+            return scratch
+        if kind == Operand.ATTR:
+            return self.attribute(operand)
+        return self.locations[operand]
+
+    def register(self, operand, scratch):
+        location = self.source(operand, scratch)
+        if is_register(location):
+            return location
+        self.ins("mov {location}, {scratch}".format(location=location, scratch=scratch))
+        return scratch
+
+    def target(self, operand):
+        # Register to compute a result in before store()
+        if operand & KIND_MASK in VARIABLE_KINDS and is_register(self.locations[operand]):
+            return self.locations[operand]
+        return "%rax"
+
+    def store(self, operand, register):
+        if operand & KIND_MASK == Operand.ATTR:
+            self.ins("mov {register}, {attribute}".format(register=register, attribute=self.attribute(operand)))
+            return
+        location = self.locations[operand]
+        if location != register:
+            self.ins("mov {register}, {location}".format(register=register, location=location))
+
+    def int_constant(self, operand):
+        # Word of an Int/Bool/void constant operand, None for anything else
+        if operand & KIND_MASK != Operand.CONST:
+            return None
+        value = self.quads.value(operand)
+        if isinstance(value, str):
+            return None
+        return tagged(value)
+
+    def boolean(self, i, condition, result):
+        # result = Bool of the flags after a cmp/test. A temporary only read by
+        # the IF_FALSE that follows becomes a conditional jump instead; returns
+        # True if that IF_FALSE was emitted
+        quads = self.quads
+        interval = self.intervals.get(result)
+        if quads.op[i + 1] == Op.IF_FALSE and quads.arg1[i + 1] == result and result & KIND_MASK == Operand.TEMP \
+                and interval.start == i and interval.end == i + 1:
+            self.ins("j{condition} .L{n}".format(condition=NEGATED[condition], n=quads.arg2[i + 1] >> KIND_BITS))
+            return True
+        target = self.target(result)
+        self.ins("set{condition} %al".format(condition=condition))
+        self.ins("movzbl %al, %eax")
+        self.ins("lea {false}(,%rax,4), {target}".format(false=FALSE, target=target))
+        self.store(result, target)
+        return False
+
+    # Instructions
+
+    def instruction(self, i, last):
+        # Emits quads[i]; True if it also took care of quads[i + 1]
+        quads = self.quads
+        op, arg1, arg2, result = quads[i]
+
+        if op == Op.ASSIGN:
+            self.store(result, self.register(arg1, self.target(result)))
+        elif op == Op.ADD:
+            if self.int_constant(arg1) is not None and self.int_constant(arg2) is None:
+                arg1, arg2 = arg2, arg1
+            target = self.target(result)
+            a = self.register(arg1, "%rax")
+            constant = self.int_constant(arg2)
+            if constant is not None and fits_imm32(constant - 1):
+                self.ins("lea {offset}({a}), {target}".format(offset=constant - 1, a=a, target=target))
+            else:
+                b = self.register(arg2, "%rdx")
+                self.ins("lea -1({a},{b}), {target}".format(a=a, b=b, target=target))
+            self.store(result, target)
+        elif op == Op.SUB:
+            target = self.target(result)
+            a = self.register(arg1, "%rax")
+            constant = self.int_constant(arg2)
+            if constant is not None and fits_imm32(1 - constant):
+                self.ins("lea {offset}({a}), {target}".format(offset=1 - constant, a=a, target=target))
+            else:
+                if a != "%rax":
+                    self.ins("mov {a}, %rax".format(a=a))
+                self.ins("sub {b}, %rax".format(b=self.source(arg2, "%rdx")))
+                self.ins("lea 1(%rax), {target}".format(target=target))
+            self.store(result, target)
+        elif op == Op.MUL:
+            target = self.target(result)
+            a = self.register(arg1, "%rax")
+            if a != "%rax":
+                self.ins("mov {a}, %rax".format(a=a))
+            self.ins("sar $1, %rax")
+            constant = self.int_constant(arg2)
+            if constant is not None and fits_imm32(constant - 1):
+                self.ins("imul ${factor}, %rax, %rax".format(factor=constant - 1))
+            else:
+                b = self.register(arg2, "%rdx")
+                self.ins("lea -1({b}), %rdx".format(b=b))
+                self.ins("imul %rdx, %rax")
+            self.ins("lea 1(%rax), {target}".format(target=target))
+            self.store(result, target)
+        elif op == Op.DIV:
+            target = self.target(result)
+            a = self.register(arg1, "%rax")
+            if a != "%rax":
+                self.ins("mov {a}, %rax".format(a=a))
+            b = self.register(arg2, "%r11")
+            if b != "%r11":
+                self.ins("mov {b}, %r11".format(b=b))
+            self.ins("sar $1, %rax")
+            self.ins("sar $1, %r11")
+            self.ins("jz rt_division_by_zero")
+            # idiv truncates toward zero, as int_div
+            self.ins("cqo")
+            self.ins("idiv %r11")
+            self.ins("lea 1(%rax,%rax), {target}".format(target=target))
+            self.store(result, target)
+        elif op == Op.NEG:
+            self.ins("mov $2, %rax")
+            self.ins("sub {a}, %rax".format(a=self.source(arg1, "%rdx")))
+            self.store(result, "%rax")
+        elif op == Op.NOT:
+            target = self.target(result)
+            a = self.register(arg1, target)
+            if a != target:
+                self.ins("mov {a}, {target}".format(a=a, target=target))
+            self.ins("xor ${mask}, {target}".format(mask=FALSE ^ TRUE, target=target))
+            self.store(result, target)
+        elif op in (Op.LT, Op.LE):
+            a = self.register(arg1, "%rax")
+            self.ins("cmp {b}, {a}".format(b=self.source(arg2, "%rdx"), a=a))
+            return self.boolean(i, "l" if op == Op.LT else "le", result)
+        elif op == Op.EQ:
+            return self.equal(i, arg1, arg2, result)
+        elif op == Op.ISVOID:
+            a = self.register(arg1, "%rax")
+            self.ins("test {a}, {a}".format(a=a))
+            return self.boolean(i, "e", result)
+        elif op == Op.LABEL:
+            self.emit(".L{n}:".format(n=arg1 >> KIND_BITS))
+        elif op == Op.GOTO:
+            self.ins("jmp .L{n}".format(n=arg1 >> KIND_BITS))
+        elif op == Op.IF_FALSE:
+            constant = self.int_constant(arg1)
+            if constant is not None:
+                if constant in (VOID, FALSE):
+                    self.ins("jmp .L{n}".format(n=arg2 >> KIND_BITS))
+                return False
+            condition = self.source(arg1, "%rax")
+            self.ins("{cmp} ${false}, {condition}".format(cmp="cmp" if is_register(condition) else "cmpq", false=FALSE, condition=condition))
+            self.ins("je .L{n}".format(n=arg2 >> KIND_BITS))
+        elif op == Op.PARAM:
+            self.ins("pushq {value}".format(value=self.source(arg1, "%rax")))
+        elif op == Op.CALL:
+            self.dynamic_call(quads.value(arg1), quads.value(arg2))
+            self.store(result, "%rax")
+        elif op == Op.STATIC_CALL:
+            self.static_call(quads.value(arg1), quads.value(arg2))
+            self.store(result, "%rax")
+        elif op == Op.NEW:
+            self.ins("call new.{name}".format(name=quads.value(arg1)))
+            self.store(result, "%rax")
+        elif op == Op.RETURN:
+            value = self.source(arg1, "%rax")
+            if value != "%rax":
+                self.ins("mov {value}, %rax".format(value=value))
+            if not last:
+                self.ins("jmp {label}".format(label=self.return_label))
+        return False
+
+    def equal(self, i, arg1, arg2, result):
+        # Ints, Bools and void are equal when their words are; two different
+        # pointers may still be equal Strings, which rt_equals compares
+        if self.int_constant(arg1) is not None:
+            arg1, arg2 = arg2, arg1
+        constant = self.int_constant(arg2)
+        if constant is not None and fits_imm32(constant):
+            a = self.register(arg1, "%rax")
+            self.ins("cmp ${word}, {a}".format(word=constant, a=a))
+            return self.boolean(i, "e", result)
+        a = self.register(arg1, "%rax")
+        if a != "%rax":
+            self.ins("mov {a}, %rax".format(a=a))
+        b = self.source(arg2, "%r11")
+        if b != "%r11":
+            self.ins("mov {b}, %r11".format(b=b))
+        self.ins("call rt_equals")
+        self.store(result, "%rax")
+        return False
+
+    def dynamic_call(self, name, count):
+        # The receiver is the first param, the deepest one on the stack
+        name_id = self.vm.name_ids.get(name)
+        self.ins("mov {offset}(%rsp), %rax".format(offset=8 * (count - 1)))
+        self.ins("test $3, %al")
+        self.ins("jnz 1f")
+        self.ins("test %rax, %rax")
+        self.ins("jz rt_dispatch_void")
+        self.ins("mov (%rax), %rax")
+        self.ins("jmp 2f")
+        self.emit("1:")
+        self.ins("call rt_tagged_class")
+        self.emit("2:")
+        if name_id not in self.slots:
+            self.ins("jmp {label}".format(label=self.missing_label(name)))
+        else:
+            entry = CLASS_HEADER + VTABLE_ENTRY * self.slots[name_id]
+            self.ins("cmpq ${id}, {offset}(%rax)".format(id=name_id, offset=entry))
+            self.ins("jne {label}".format(label=self.missing_label(name)))
+            self.ins("call *{offset}(%rax)".format(offset=entry + 8))
+        self.ins("add ${size}, %rsp".format(size=8 * count))
+
+    def static_call(self, name, count):
+        self.ins("cmpq $0, {offset}(%rsp)".format(offset=8 * (count - 1)))
+        self.ins("je rt_dispatch_void")
+        method = self.vm.static_methods.get(self.vm.name_ids.get(name))
+        if method is None:
+            self.ins("jmp {label}".format(label=self.missing_label(name)))
+        else:
+            self.ins("call {label}".format(label=self.method_label(method)))
+        self.ins("add ${size}, %rsp".format(size=8 * count))
+
+    # ----------------------------------------------------------------------
+    # Program
+    # ----------------------------------------------------------------------
+
+    def generate(self):
+        vm = self.vm
+        self.emit("# Generado por yaplNative")
+        self.emit("    .text")
+        self.emit("    .globl main")
+        self.emit("main:")
+        self.ins("push %rbp")
+        self.ins("mov %rsp, %rbp")
+        main_class = vm.classes.get("Main")
+        main = main_class.methods.get(vm.name_ids.get("main")) if main_class is not None else None
+        if main is None:
+            self.ins("lea msg.no_main(%rip), %rdi")
+            self.ins("jmp rt_error")
+        else:
+            self.ins("call new.Main")
+            self.ins("push %rax")
+            self.ins("call {label}".format(label=self.method_label(main)))
+            self.ins("mov stdout@GOTPCREL(%rip), %rax")
+            self.ins("mov (%rax), %rdi")
+            self.ins("call fflush@PLT")
+            self.ins("xor %eax, %eax")
+            self.ins("leave")
+            self.ins("ret")
+
+        for cls in vm.class_list:
+            self.new_function(cls)
+        for start, end in function_ranges(self.quads):
+            self.function(start, end)
+
+        for name, label in self.missing.items():
+            self.emit(label + ":")
+            self.ins("lea {label}(%rip), %rdi".format(label="name." + label[2:]))
+            self.ins("jmp rt_no_method")
+
+        self.emit("")
+        self.emit("    .section .rodata")
+        for name, label in self.missing.items():
+            self.emit("name.{label}:".format(label=label[2:]))
+            self.ins(".string \"{name}\"".format(name=name))
+
+        self.emit("")
+        self.emit("    .data")
+        for cls in vm.class_list:
+            self.class_data(cls)
+        self.string_label("")
+        for value, label in self.strings.items():
+            self.emit("    .balign 8")
+            self.emit(label + ":")
+            self.ins(".quad class.String, {length}".format(length=len(value.encode("utf-8"))))
+            self.emit(string_bytes(value))
+
+        return "\n".join(self.lines) + "\n" + RUNTIME
+
+
+# Runtime: errors, allocation and the built-in methods. The built-ins follow
+# the calling convention of the generated code (arguments on the stack); the
+# helpers the generated code calls between two instructions (rt_equals,
+# rt_tagged_class) only change %rax, %r11 and the flags. Objects are never
+# freed.
+RUNTIME = r"""
+    .section .rodata
+fmt.int:        .string "%ld"
+fmt.error:      .string "\nError de ejecucion: %s\n"
+fmt.no_method:  .string "\nError de ejecucion: Metodo no definido: %s\n"
+fmt.abort:      .string "\nError de ejecucion: abort() en %s\n"
+msg.division:   .string "Division entre cero"
+msg.void:       .string "Dispatch a void"
+msg.types:      .string "Operacion con tipos incompatibles"
+msg.out_string: .string "out_string espera un String"
+msg.out_int:    .string "out_int espera un Int"
+msg.substr:     .string "substr fuera de rango"
+msg.memory:     .string "Memoria agotada"
+msg.no_main:    .string "No existe Main.main"
+
+    .data
+heap.next:      .quad 0
+heap.end:       .quad 0
+
+    .text
+# rt_fail(format, argument): prints the error after the program output and exits
+rt_fail:
+    push %rbp
+    mov %rsp, %rbp
+    and $-16, %rsp
+    push %rdi
+    push %rsi
+    mov stdout@GOTPCREL(%rip), %rax
+    mov (%rax), %rdi
+    call fflush@PLT
+    pop %rdx
+    pop %rsi
+    mov stderr@GOTPCREL(%rip), %rax
+    mov (%rax), %rdi
+    xor %eax, %eax
+    call fprintf@PLT
+    mov $1, %edi
+    call exit@PLT
+
+rt_error:
+    mov %rdi, %rsi
+    lea fmt.error(%rip), %rdi
+    jmp rt_fail
+
+rt_no_method:
+    mov %rdi, %rsi
+    lea fmt.no_method(%rip), %rdi
+    jmp rt_fail
+
+rt_division_by_zero:
+    lea msg.division(%rip), %rdi
+    jmp rt_error
+
+rt_dispatch_void:
+    lea msg.void(%rip), %rdi
+    jmp rt_error
+
+rt_type_error:
+    lea msg.types(%rip), %rdi
+    jmp rt_error
+
+# rt_alloc(size in %rdi): zeroed memory from 1 MB chunks
+rt_alloc:
+    add $15, %rdi
+    and $-16, %rdi
+    mov heap.next(%rip), %rax
+    lea (%rax,%rdi), %rdx
+    cmp heap.end(%rip), %rdx
+    ja 1f
+    mov %rdx, heap.next(%rip)
+    ret
+1:  push %rbp
+    mov %rsp, %rbp
+    and $-16, %rsp
+    sub $16, %rsp
+    mov %rdi, (%rsp)
+    mov $1048576, %rsi
+    cmp %rsi, %rdi
+    cmova %rdi, %rsi
+    mov %rsi, 8(%rsp)
+    mov $1, %edi
+    call calloc@PLT
+    test %rax, %rax
+    jz 2f
+    mov 8(%rsp), %rdx
+    add %rax, %rdx
+    mov %rdx, heap.end(%rip)
+    mov (%rsp), %rdx
+    add %rax, %rdx
+    mov %rdx, heap.next(%rip)
+    leave
+    ret
+2:  lea msg.memory(%rip), %rdi
+    jmp rt_error
+
+# rt_string(bytes in %rdi, length in %rsi): new String
+rt_string:
+    push %rbp
+    mov %rsp, %rbp
+    push %rbx
+    push %r12
+    and $-16, %rsp
+    mov %rdi, %rbx
+    mov %rsi, %r12
+    lea 17(%rsi), %rdi
+    call rt_alloc
+    lea class.String(%rip), %rdx
+    mov %rdx, (%rax)
+    mov %r12, 8(%rax)
+    push %rax
+    push %rax
+    lea 16(%rax), %rdi
+    mov %rbx, %rsi
+    mov %r12, %rdx
+    call memcpy@PLT
+    pop %rax
+    pop %rax
+    lea -16(%rbp), %rsp
+    pop %r12
+    pop %rbx
+    pop %rbp
+    ret
+
+# rt_check_string(value in %rax): type error unless it is a String
+rt_check_string:
+    test %rax, %rax
+    jz rt_type_error
+    test $3, %al
+    jnz rt_type_error
+    lea class.String(%rip), %r11
+    cmp %r11, (%rax)
+    jne rt_type_error
+    ret
+
+# rt_tagged_class(Int or Bool in %rax): its class
+rt_tagged_class:
+    test $1, %al
+    jnz 1f
+    lea class.Bool(%rip), %rax
+    ret
+1:  lea class.Int(%rip), %rax
+    ret
+
+# rt_class_of(value in %rax): its class, Object for void
+rt_class_of:
+    test %rax, %rax
+    jz 1f
+    test $3, %al
+    jnz rt_tagged_class
+    mov (%rax), %rax
+    ret
+1:  lea class.Object(%rip), %rax
+    ret
+
+# rt_equals(%rax, %r11): Bool of a = b, comparing Strings by content
+rt_equals:
+    cmp %r11, %rax
+    je 2f
+    test %rax, %rax
+    jz 1f
+    test %r11, %r11
+    jz 1f
+    test $3, %al
+    jnz 1f
+    push %rcx
+    mov %r11, %rcx
+    test $3, %cl
+    jnz 3f
+    lea class.String(%rip), %rcx
+    cmp %rcx, (%rax)
+    jne 3f
+    cmp %rcx, (%r11)
+    jne 3f
+    mov 8(%rax), %rcx
+    cmp 8(%r11), %rcx
+    jne 3f
+    push %rsi
+    push %rdi
+    lea 16(%rax), %rsi
+    lea 16(%r11), %rdi
+    repe cmpsb
+    pop %rdi
+    pop %rsi
+    jne 3f
+    pop %rcx
+2:  mov $6, %eax
+    ret
+3:  pop %rcx
+1:  mov $2, %eax
+    ret
+
+builtin.out_string:
+    push %rbp
+    mov %rsp, %rbp
+    and $-16, %rsp
+    mov 16(%rbp), %rax
+    test %rax, %rax
+    jz 1f
+    test $3, %al
+    jnz 1f
+    lea class.String(%rip), %rdx
+    cmp %rdx, (%rax)
+    jne 1f
+    lea 16(%rax), %rdi
+    mov $1, %esi
+    mov 8(%rax), %rdx
+    mov stdout@GOTPCREL(%rip), %rcx
+    mov (%rcx), %rcx
+    call fwrite@PLT
+    mov 24(%rbp), %rax
+    leave
+    ret
+1:  lea msg.out_string(%rip), %rdi
+    jmp rt_error
+
+builtin.out_int:
+    push %rbp
+    mov %rsp, %rbp
+    and $-16, %rsp
+    mov 16(%rbp), %rsi
+    test $1, %sil
+    jnz 2f
+    mov %rsi, %rax
+    and $3, %eax
+    cmp $2, %eax
+    jne 1f
+    # A Bool prints as 0 or 1
+    shr $2, %rsi
+    jmp 3f
+2:  sar $1, %rsi
+3:  lea fmt.int(%rip), %rdi
+    xor %eax, %eax
+    call printf@PLT
+    mov 24(%rbp), %rax
+    leave
+    ret
+1:  lea msg.out_int(%rip), %rdi
+    jmp rt_error
+
+# rt_read_line: line of stdin without the newline in (%rsp+8), its length in
+# %rax (0 at the end of the input); the caller frees the line
+rt_read_line:
+    push %rbp
+    mov %rsp, %rbp
+    push %rbx
+    and $-16, %rsp
+    sub $16, %rsp
+    mov 16(%rbp), %rbx
+    movq $0, (%rbx)
+    movq $0, (%rsp)
+    mov %rbx, %rdi
+    mov %rsp, %rsi
+    mov stdin@GOTPCREL(%rip), %rdx
+    mov (%rdx), %rdx
+    call getline@PLT
+    test %rax, %rax
+    jg 1f
+    xor %eax, %eax
+    jmp 2f
+1:  mov (%rbx), %rdx
+    cmpb $10, -1(%rdx,%rax)
+    jne 2f
+    dec %rax
+    movb $0, (%rdx,%rax)
+2:  mov -8(%rbp), %rbx
+    leave
+    ret
+
+builtin.in_string:
+    push %rbp
+    mov %rsp, %rbp
+    push %rbx
+    and $-16, %rsp
+    sub $16, %rsp
+    lea 8(%rsp), %rax
+    push %rax
+    call rt_read_line
+    add $8, %rsp
+    mov 8(%rsp), %rdi
+    mov %rax, %rsi
+    test %rdi, %rdi
+    jnz 1f
+    mov %rsp, %rdi
+1:  call rt_string
+    mov %rax, %rbx
+    mov 8(%rsp), %rdi
+    call free@PLT
+    mov %rbx, %rax
+    mov -8(%rbp), %rbx
+    leave
+    ret
+
+builtin.in_int:
+    push %rbp
+    mov %rsp, %rbp
+    push %rbx
+    push %r12
+    and $-16, %rsp
+    sub $16, %rsp
+    xor %r12d, %r12d
+    lea 8(%rsp), %rax
+    push %rax
+    call rt_read_line
+    add $8, %rsp
+    test %rax, %rax
+    jz 3f
+    mov 8(%rsp), %rdi
+    mov %rsp, %rsi
+    mov $10, %edx
+    call strtol@PLT
+    mov %rax, %rbx
+    mov (%rsp), %rcx
+    cmp 8(%rsp), %rcx
+    je 3f
+    # Only blanks may follow the number
+1:  movzbl (%rcx), %eax
+    test %eax, %eax
+    jz 2f
+    cmp $32, %eax
+    je 4f
+    cmp $9, %eax
+    jb 3f
+    cmp $13, %eax
+    ja 3f
+4:  inc %rcx
+    jmp 1b
+2:  mov %rbx, %r12
+3:  mov 8(%rsp), %rdi
+    call free@PLT
+    lea 1(%r12,%r12), %rax
+    lea -16(%rbp), %rsp
+    pop %r12
+    pop %rbx
+    pop %rbp
+    ret
+
+builtin.abort:
+    mov 8(%rsp), %rax
+    call rt_class_of
+    mov (%rax), %rax
+    lea 16(%rax), %rsi
+    lea fmt.abort(%rip), %rdi
+    jmp rt_fail
+
+builtin.type_name:
+    mov 8(%rsp), %rax
+    call rt_class_of
+    mov (%rax), %rax
+    ret
+
+builtin.copy:
+    push %rbp
+    mov %rsp, %rbp
+    push %rbx
+    push %r12
+    and $-16, %rsp
+    mov 16(%rbp), %rbx
+    test %rbx, %rbx
+    jz 1f
+    test $3, %bl
+    jnz 1f
+    mov (%rbx), %rax
+    lea class.String(%rip), %rdx
+    cmp %rdx, %rax
+    je 1f
+    mov 16(%rax), %r12
+    mov %r12, %rdi
+    call rt_alloc
+    mov %rax, %rdi
+    mov %rbx, %rsi
+    mov %r12, %rdx
+    mov %rax, %rbx
+    call memcpy@PLT
+1:  mov %rbx, %rax
+    lea -16(%rbp), %rsp
+    pop %r12
+    pop %rbx
+    pop %rbp
+    ret
+
+builtin.length:
+    mov 8(%rsp), %rax
+    call rt_check_string
+    mov 8(%rax), %rax
+    lea 1(%rax,%rax), %rax
+    ret
+
+builtin.concat:
+    push %rbp
+    mov %rsp, %rbp
+    push %rbx
+    push %r12
+    and $-16, %rsp
+    mov 24(%rbp), %rax
+    call rt_check_string
+    mov %rax, %rbx
+    mov 16(%rbp), %rax
+    call rt_check_string
+    mov %rax, %r12
+    mov 8(%rbx), %rdi
+    add 8(%r12), %rdi
+    add $17, %rdi
+    call rt_alloc
+    lea class.String(%rip), %rdx
+    mov %rdx, (%rax)
+    mov 8(%rbx), %rdx
+    add 8(%r12), %rdx
+    mov %rdx, 8(%rax)
+    push %rax
+    push %rax
+    lea 16(%rax), %rdi
+    lea 16(%rbx), %rsi
+    mov 8(%rbx), %rdx
+    call memcpy@PLT
+    mov (%rsp), %rdi
+    add $16, %rdi
+    add 8(%rbx), %rdi
+    lea 16(%r12), %rsi
+    mov 8(%r12), %rdx
+    call memcpy@PLT
+    pop %rax
+    pop %rax
+    lea -16(%rbp), %rsp
+    pop %r12
+    pop %rbx
+    pop %rbp
+    ret
+
+builtin.substr:
+    push %rbp
+    mov %rsp, %rbp
+    and $-16, %rsp
+    mov 32(%rbp), %rax
+    call rt_check_string
+    mov 24(%rbp), %rsi
+    mov 16(%rbp), %rdx
+    test $1, %sil
+    jz rt_type_error
+    test $1, %dl
+    jz rt_type_error
+    sar $1, %rsi
+    sar $1, %rdx
+    test %rsi, %rsi
+    js 1f
+    test %rdx, %rdx
+    js 1f
+    lea (%rsi,%rdx), %rcx
+    cmp 8(%rax), %rcx
+    jg 1f
+    lea 16(%rax,%rsi), %rdi
+    mov %rdx, %rsi
+    call rt_string
+    leave
+    ret
+1:  lea msg.substr(%rip), %rdi
+    jmp rt_error
+
+    .section .note.GNU-stack,"",@progbits
+"""
+
+
+def assemble(assembly, output, compiler="gcc"):
+    # Assembles and links with the C library; returns the compiler's errors
+    with tempfile.NamedTemporaryFile("w", suffix=".s", delete=False) as source:
+        source.write(assembly)
+    try:
+        process = subprocess.run([compiler, "-o", output, source.name], capture_output=True, text=True)
+    finally:
+        os.unlink(source.name)
+    return process.stderr if process.returncode else None
+
+
+def main(argv=None):
+    from antlr4 import FileStream
+    from yaplCompiler import analyze
+    from yaplOptimizer import PassManager, LEVELS
+    from diagnostics import Diagnostic
+
+    parser = argparse.ArgumentParser(description="Compila un programa YAPL a ensamblador x86-64")
+    parser.add_argument("file", help="archivo .yapl o programa enlazado por yaplBuild (.json)")
+    parser.add_argument("-O", dest="level", type=int, choices=sorted(LEVELS), default=1, help="nivel de optimizacion")
+    parser.add_argument("-o", dest="output", help="archivo .s de salida (por defecto stdout)")
+    parser.add_argument("--exe", help="ensamblar y enlazar con gcc en este ejecutable")
+    parser.add_argument("--run", action="store_true", help="compilar en un directorio temporal y ejecutar")
+    parser.add_argument("--cc", default="gcc", help="compilador usado para ensamblar y enlazar")
+    parser.add_argument("--time", action="store_true", help="mostrar el tiempo de ejecucion")
+    parser.add_argument("--stats", action="store_true", help="mostrar registros asignados y spills")
+    args = parser.parse_args(argv)
+
+    if args.file.endswith(".json"):
+        # A program linked by yaplBuild
+        with open(args.file, "r", encoding="utf-8") as f:
+            quads = Quadruples.from_dict(json.load(f))
+    else:
+        result = analyze(FileStream(args.file, encoding="utf-8"))
+        errors = result["syntax_errors"] + result["errors"]
+        if errors:
+            for error in errors:
+                print(Diagnostic.from_dict(error), file=sys.stderr)
+            return 1
+        quads = Quadruples.from_dict(result["intermediate_code"])
+    PassManager(args.level).run(quads)
+    generator = NativeGenerator(quads)
+    assembly = generator.generate()
+    if args.stats:
+        print("Funciones: {functions}, variables: {intervals}, en memoria: {spilled}".format(**generator.stats), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(assembly)
+    elif not args.exe and not args.run:
+        sys.stdout.write(assembly)
+
+    if args.exe:
+        failure = assemble(assembly, args.exe, args.cc)
+        if failure:
+            print(failure, file=sys.stderr)
+            return 1
+
+    if args.run:
+        with tempfile.TemporaryDirectory() as directory:
+            executable = os.path.join(directory, "programa")
+            failure = assemble(assembly, executable, args.cc)
+            if failure:
+                print(failure, file=sys.stderr)
+                return 1
+            sys.stdout.flush()
+            start = time.perf_counter()
+            returncode = subprocess.run([executable]).returncode
+            if args.time:
+                print("\nTiempo de ejecucion: {seconds:.4f}s".format(seconds=time.perf_counter() - start), file=sys.stderr)
+            return returncode
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
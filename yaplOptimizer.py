@@ -0,0 +1,331 @@
+from intermediateCode import (
+    Op, Operand, NONE, KIND_MASK, PURE_OPS, DEFINING_OPS, USES_ARG1, USES_ARG2,
+    int_div, is_variable, basic_blocks,
+)
+from dataflow import ControlFlowGraph, Liveness
+from yaplInterprocedural import Program, PROGRAM_PASSES
+
+# Optimization passes over the intermediate code.
+#
+# Every pass works on one function at a time, as a list of
+# [op, arg1, arg2, result] lists between FUNC and END_FUNC, and returns the
+# new list. The local passes only look inside a basic block; calls (and new,
+# which runs the _init of the class) may change attributes, so whatever is
+# known about ATTR operands is forgotten after them. dead_code uses the
+# liveness of the whole function (dataflow.Liveness).
+#
+#   -O0  nothing
+#   -O1  constant folding/propagation, copy propagation, dead code
+#   -O2  -O1 + common subexpressions and unreachable blocks
+#   -O3  -O2 + devirtualization, inlining and tail calls, which work on the
+#        whole program (yaplInterprocedural) between two runs of the -O2 passes
+
+CALL_OPS = (Op.CALL, Op.STATIC_CALL, Op.NEW)
+COMMUTATIVE_OPS = (Op.ADD, Op.MUL, Op.EQ)
+
+
+def is_attr(operand):
+    return operand & KIND_MASK == Operand.ATTR
+
+
+def is_const(operand):
+    return operand & KIND_MASK == Operand.CONST
+
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def fold(op, a, b=None):
+    # Value of op applied to constants, or None when it cannot be folded
+    if op in (Op.ADD, Op.SUB, Op.MUL, Op.DIV, Op.LT, Op.LE):
+        if not (is_int(a) and is_int(b)):
+            return None
+        if op == Op.ADD:
+            return a + b
+        if op == Op.SUB:
+            return a - b
+        if op == Op.MUL:
+            return a * b
+        if op == Op.DIV:
+            return int_div(a, b) if b != 0 else None
+        if op == Op.LT:
+            return a < b
+        return a <= b
+    if op == Op.EQ:
+        return a == b if type(a) is type(b) else None
+    if op == Op.NEG:
+        return -a if is_int(a) else None
+    if op == Op.NOT:
+        return (not a) if isinstance(a, bool) else None
+    if op == Op.ISVOID:
+        return a is None
+    return None
+
+
+def substitute(instruction, values):
+    # Replaces the operands read by the instruction with their known values
+    op = instruction[0]
+    if op in USES_ARG1 and instruction[1] in values:
+        instruction[1] = values[instruction[1]]
+    if op in USES_ARG2 and instruction[2] in values:
+        instruction[2] = values[instruction[2]]
+
+
+def forget_attrs(values):
+    for key in [key for key, value in values.items() if is_attr(key) or is_attr(value)]:
+        del values[key]
+
+
+def body_blocks(code):
+    # Basic blocks between FUNC and END_FUNC, as (start, end) indexes of code
+    return [(start + 1, end + 1) for start, end in basic_blocks(code[1:-1])]
+
+
+# ----------------------------------------------------------------------
+# Passes
+# ----------------------------------------------------------------------
+
+def constant_folding(code, quads):
+    removed = set()
+
+    for start, end in body_blocks(code):
+        constants = {}
+        for i in range(start, end):
+            instruction = code[i]
+            substitute(instruction, constants)
+            op, arg1, arg2, result = instruction
+
+            if op in PURE_OPS and op != Op.ASSIGN and is_const(arg1) and (op not in USES_ARG2 or is_const(arg2)):
+                value = fold(op, quads.value(arg1), quads.value(arg2) if op in USES_ARG2 else None)
+                if value is not None:
+                    instruction[:] = [Op.ASSIGN, quads.const(value), NONE, result]
+                    op, arg1, arg2 = Op.ASSIGN, instruction[1], NONE
+
+            elif op == Op.IF_FALSE and is_const(arg1) and isinstance(quads.value(arg1), bool):
+                if quads.value(arg1):
+                    removed.add(i)
+                else:
+                    instruction[:] = [Op.GOTO, arg2, NONE, NONE]
+                continue
+
+            if op in DEFINING_OPS:
+                constants.pop(result, None)
+                if op == Op.ASSIGN and is_const(arg1):
+                    constants[result] = arg1
+            if op in CALL_OPS:
+                forget_attrs(constants)
+
+    return [instruction for i, instruction in enumerate(code) if i not in removed]
+
+
+def copy_propagation(code, quads):
+    for start, end in body_blocks(code):
+        copies = {}
+        for i in range(start, end):
+            instruction = code[i]
+            substitute(instruction, copies)
+            op, arg1, arg2, result = instruction
+
+            if op in DEFINING_OPS:
+                for key in [key for key, value in copies.items() if key == result or value == result]:
+                    del copies[key]
+                if op == Op.ASSIGN and is_variable(arg1) and arg1 != result:
+                    copies[result] = arg1
+            if op in CALL_OPS:
+                forget_attrs(copies)
+
+    # Copies of a variable into itself are left behind by the substitution
+    return [instruction for instruction in code if not (instruction[0] == Op.ASSIGN and instruction[1] == instruction[3])]
+
+
+def common_subexpressions(code, quads):
+    for start, end in body_blocks(code):
+        available = {}
+        for i in range(start, end):
+            instruction = code[i]
+            op, arg1, arg2, result = instruction
+            key = None
+
+            if op in PURE_OPS and op != Op.ASSIGN:
+                if op in COMMUTATIVE_OPS and arg2 < arg1:
+                    arg1, arg2 = arg2, arg1
+                key = (op, arg1, arg2)
+                if key in available:
+                    instruction[:] = [Op.ASSIGN, available[key], NONE, result]
+                    key = None
+
+            if op in DEFINING_OPS:
+                for other in [other for other, value in available.items() if value == result or result in other[1:]]:
+                    del available[other]
+                if key is not None and result not in key[1:]:
+                    available[key] = result
+            if op in CALL_OPS:
+                for other in [other for other, value in available.items() if is_attr(value) or is_attr(other[1]) or is_attr(other[2])]:
+                    del available[other]
+
+    return code
+
+
+def can_fail(instruction, quads):
+    # A division by a divisor that may be zero raises at run time, so it is
+    # kept even if its result is never read
+    op, arg1, arg2, result = instruction
+    return op == Op.DIV and not (is_const(arg2) and is_int(quads.value(arg2)) and quads.value(arg2) != 0)
+
+
+def dead_code(code, quads):
+    # Removes pure instructions whose temporary or local result is not live
+    # after them (never read again on any path), except the ones that can fail
+    while True:
+        body = code[1:-1]
+        liveness = Liveness(ControlFlowGraph(body))
+        bit = liveness.variables.bit
+        dead = set()
+        for b in range(len(liveness.cfg)):
+            for i, live in liveness.backward(b):
+                op, result = body[i][0], body[i][3]
+                if op in PURE_OPS and result & KIND_MASK in (Operand.TEMP, Operand.LOCAL) and not live & bit(result) and not can_fail(body[i], quads):
+                    dead.add(i)
+
+        if not dead:
+            return code
+        code = [code[0]] + [instruction for i, instruction in enumerate(body) if i not in dead] + [code[-1]]
+
+
+def unreachable_code(code, quads):
+    body = code[1:-1]
+    blocks = basic_blocks(body)
+    if not blocks:
+        return code
+
+    block_of_label = {}
+    for index, (start, end) in enumerate(blocks):
+        if body[start][0] == Op.LABEL:
+            block_of_label[body[start][1]] = index
+
+    # Blocks reachable from the entry of the function
+    reachable = set()
+    pending = [0]
+    while pending:
+        index = pending.pop()
+        if index in reachable or index >= len(blocks):
+            continue
+        reachable.add(index)
+
+        op, arg1, arg2, result = body[blocks[index][1] - 1]
+        if op == Op.GOTO:
+            pending.append(block_of_label.get(arg1, len(blocks)))
+        elif op == Op.IF_FALSE:
+            pending.append(block_of_label.get(arg2, len(blocks)))
+            pending.append(index + 1)
+        elif op != Op.RETURN:
+            pending.append(index + 1)
+
+    kept = []
+    for index, (start, end) in enumerate(blocks):
+        if index in reachable:
+            kept.extend(body[start:end])
+
+    # Jumps to the next instruction and labels nobody jumps to
+    kept = [instruction for i, instruction in enumerate(kept)
+            if not (instruction[0] == Op.GOTO and i + 1 < len(kept) and kept[i + 1][0] == Op.LABEL and kept[i + 1][1] == instruction[1])]
+    targets = set(instruction[1] for instruction in kept if instruction[0] == Op.GOTO)
+    targets.update(instruction[2] for instruction in kept if instruction[0] == Op.IF_FALSE)
+    kept = [instruction for instruction in kept if instruction[0] != Op.LABEL or instruction[1] in targets]
+
+    return [code[0]] + kept + [code[-1]]
+
+
+PASSES = {
+    "constant_folding": constant_folding,
+    "copy_propagation": copy_propagation,
+    "common_subexpressions": common_subexpressions,
+    "dead_code": dead_code,
+    "unreachable_code": unreachable_code,
+}
+
+LEVELS = {
+    0: [],
+    1: ["constant_folding", "copy_propagation", "dead_code"],
+    2: ["constant_folding", "copy_propagation", "common_subexpressions", "copy_propagation", "dead_code", "unreachable_code"],
+}
+LEVELS[3] = ["devirtualization", "inlining", "tail_calls"] + LEVELS[2]
+
+
+class PassManager:
+
+    def __init__(self, level=1, passes=None, max_iterations=10):
+        self.passes = passes if passes is not None else LEVELS[level]
+        self.max_iterations = max_iterations
+
+    def run(self, quads):
+        # Runs the passes until the code stops changing; returns the number of
+        # instructions each function pass removed and the number of calls each
+        # whole-program pass changed
+        report = {name: 0 for name in self.passes}
+        if not self.passes:
+            return report
+
+        segments = split_functions(quads)
+        local = [name for name in self.passes if name in PASSES]
+        whole = [name for name in self.passes if name in PROGRAM_PASSES]
+
+        # The function passes run before and after the whole-program ones:
+        # smaller methods fit the inlining budget, inlined code gets cleaned up
+        functions = [index for index, segment in enumerate(segments) if segment[0][0] == Op.FUNC]
+        self.run_local(segments, quads, local, functions, report)
+        if whole:
+            before = [[list(instruction) for instruction in segments[index]] for index in functions]
+            program = Program(segments, quads)
+            for name in whole:
+                report[name] += PROGRAM_PASSES[name](program)
+            changed = [index for index, code in zip(functions, before) if segments[index] != code]
+            self.run_local(segments, quads, local, changed, report)
+
+        quads.replace([instruction for segment in segments for instruction in segment])
+        return report
+
+    def run_local(self, segments, quads, passes, pending, report):
+        # The passes only look at one function, so a function that did not
+        # change in an iteration is not visited again
+        for iteration in range(self.max_iterations):
+            changed = []
+            for index in pending:
+                segment = segments[index]
+                before = [list(instruction) for instruction in segment]
+                for name in passes:
+                    size = len(segment)
+                    segment = PASSES[name](segment, quads)
+                    report[name] += size - len(segment)
+
+                segments[index] = segment
+                if segment != before:
+                    changed.append(index)
+
+            if not changed:
+                break
+            pending = changed
+
+
+def split_functions(quads):
+    # Functions as lists of [op, arg1, arg2, result]; anything between functions
+    # (class headers) goes to segments of its own
+    segments = []
+    current = []
+    for instruction in quads:
+        op = instruction[0]
+        if op == Op.FUNC and current:
+            segments.append(current)
+            current = []
+        current.append(list(instruction))
+        if op == Op.END_FUNC:
+            segments.append(current)
+            current = []
+    if current:
+        segments.append(current)
+    return segments
+
+
+def optimize(quads, level=1):
+    return PassManager(level).run(quads)
@@ -0,0 +1,199 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from build.yaplParser import yaplParser
+from yaplWalker import yaplWalker
+from yaplAst import NodeKind
+from classHierarchy import ClassHierarchy, class_header
+from symbolTable import BUILTIN_CLASS
+from diagnostics import Diagnostics
+from yaplIncremental import walk_classes, replay_classes
+
+# Semantic analysis of the classes of one program on several processes.
+#
+# The class hierarchy (names, parents and feature signatures of every class)
+# is built first, as visitProg does. The classes are then split in
+# contiguous chunks of about the same number of tokens, and every chunk is
+# walked by a forked worker, which inherits the syntax tree and the hierarchy
+# without copying them. A worker starts from what the classes before its
+# chunk declare (their names and features) and returns what each class
+# added: symbols, literals, errors and expression types.
+#
+# The main process replays the contributions in source order, so errors and
+# symbol rows come out as with a single walker. A contribution is only used
+# if the class could not have seen more than the worker did: a redefined
+# class, one that reported as undefined a name an earlier class declared in
+# the meantime, one that would reach the error limit or one whose walk
+# failed is walked again in the main process, along with the rest of its
+# chunk.
+
+# Chunks per process, so a slow chunk does not leave the others idle
+CHUNKS_PER_JOB = 4
+# Smaller programs are not worth starting the workers
+MIN_CHUNK_TOKENS = 2000
+
+# (ast, classes, hierarchy, max_errors) of the program being walked,
+# inherited by the forked workers
+shared = None
+
+
+def can_fork():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def class_tokens(ast, node):
+    if ast.start[node] == -1 or ast.stop[node] == -1:
+        return 1
+    return max(1, ast.stop[node] - ast.start[node] + 1)
+
+
+def split_chunks(ast, classes, jobs):
+    # [(start, end)] of contiguous chunks with about the same number of tokens
+    sizes = [class_tokens(ast, node) for node in classes]
+    total = sum(sizes)
+    count = min(jobs * CHUNKS_PER_JOB, total // MIN_CHUNK_TOKENS, len(classes))
+    if count < 2:
+        return [(0, len(classes))]
+
+    chunks = []
+    start = 0
+    filled = 0
+    for i, size in enumerate(sizes):
+        filled += size
+        if filled * count >= total * (len(chunks) + 1) and i + 1 < len(classes):
+            chunks.append((start, i + 1))
+            start = i + 1
+    chunks.append((start, len(classes)))
+    return chunks
+
+
+def class_name(ast, node):
+    return ast.text(class_header(ast, node)[0])
+
+
+def class_parent(ast, node):
+    parents = class_header(ast, node)[1]
+    return ast.text(parents[0]) if parents else None
+
+
+def declare_class(table, ast, node):
+    # What visitClass_def leaves visible to the classes after it
+    name = class_name(ast, node)
+    table.add("TYPE_ID", name, ast.text(ast.token(node, yaplParser.CLASS)))
+    table.enter_class(name, class_parent(ast, node))
+    table.exit_scope()
+    for feature in ast.children(node):
+        if ast.kind[feature] in (NodeKind.FEAT_DEF, NodeKind.FEAT_ASGN):
+            table.add("OBJECT_ID", ast.text(ast.token(feature, yaplParser.OBJECT_ID)), ast.text(ast.token(feature, yaplParser.TYPE_ID)), scope=name, scope_type="global")
+
+
+def walk_chunk(start, end):
+    # Runs in a worker: a contribution for every class of the chunk, up to the
+    # first one that could not be walked
+    ast, classes, hierarchy, max_errors = shared
+    walker = yaplWalker(Diagnostics(max_errors))
+    walker.initSymbolTable()
+    walker.begin_program(hierarchy)
+    try:
+        for node in classes[:start]:
+            declare_class(walker.symbolTable, ast, node)
+    except Exception:
+        return []
+
+    # A redefined class adds the types of its formals to the methods of the
+    # first class with its name, which the main process walks again anyway
+    defined = set(class_name(ast, node) for node in classes[:start])
+    contributions = []
+    for node in classes[start:end]:
+        try:
+            name = class_name(ast, node)
+            if name in defined:
+                break
+            defined.add(name)
+            contribution = walk_classes(walker, ast, [node])
+        except Exception:
+            break
+        # Nodes are numbered the same in every process. Only the code
+        # generator reads the types, and only for programs without errors
+        types = walker.types
+        contribution["types"] = {expr: types[expr] for expr in range(node, ast.end(node)) if expr in types} if not contribution["errors"] else None
+        contributions.append(contribution)
+    return contributions
+
+
+def valid(walker, ast, node, contribution, defined):
+    # True if the walk of the class in a worker is the one the walker of the
+    # main process would do now
+    if class_name(ast, node) in defined:
+        return False
+
+    errors = walker.errors
+    if errors.max_errors and errors.error_count + len(contribution["errors"]) >= errors.max_errors:
+        return False
+
+    table = walker.symbolTable
+    parent = class_parent(ast, node)
+    parent = table.class_scopes.get(parent) if parent is not None else None
+    builtin = table.class_scopes.get(BUILTIN_CLASS)
+    for kind, name in contribution["undefined"]:
+        if kind == "TYPE_ID":
+            if table.find("TYPE_ID", name):
+                return False
+        elif (parent is not None and parent.lookup(name)) or (builtin is not None and name in builtin.symbols):
+            return False
+    return True
+
+
+def walk_program(walker, ast, jobs):
+    # Same result as walker.walk(ast), with the classes walked on up to jobs
+    # processes. Returns how many classes were replayed and walked again
+    global shared
+    # Classes the parser could not name are skipped by the walker too
+    classes = [node for node in ast.class_defs() if class_header(ast, node)[0] != -1]
+    stats = {"chunks": 1, "replayed": 0, "walked": len(classes)}
+    chunks = split_chunks(ast, classes, jobs) if jobs > 1 and can_fork() else [(0, len(classes))]
+    if len(chunks) < 2:
+        walker.walk(ast)
+        return stats
+
+    hierarchy = ClassHierarchy.from_ast(ast)
+    stats = {"chunks": len(chunks), "replayed": 0, "walked": 0}
+    shared = (ast, classes, hierarchy, walker.errors.max_errors)
+    try:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(chunks)), mp_context=multiprocessing.get_context("fork")) as executor:
+            futures = [executor.submit(walk_chunk, start, end) for start, end in chunks]
+            try:
+                walker.begin_program(hierarchy)
+                defined = set()
+                replayed = []
+                for (start, end), future in zip(chunks, futures):
+                    try:
+                        contributions = future.result()
+                    except Exception:
+                        # A worker that died only costs its chunk
+                        contributions = []
+
+                    again = False
+                    for i in range(start, end):
+                        node = classes[i]
+                        contribution = contributions[i - start] if i - start < len(contributions) else None
+                        again = again or contribution is None or not valid(walker, ast, node, contribution, defined)
+                        if again:
+                            walker.walk(ast, node)
+                            stats["walked"] += 1
+                        else:
+                            replay_classes(walker, [(class_name(ast, node), class_parent(ast, node))], contribution)
+                            replayed.append(contribution["types"])
+                            stats["replayed"] += 1
+                        defined.add(class_name(ast, node))
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        shared = None
+
+    walker.end_program()
+    if not walker.errors.error_count:
+        for types in replayed:
+            walker.types.update(types)
+    return stats
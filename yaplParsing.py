@@ -0,0 +1,81 @@
+from antlr4 import *
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+from build.yaplLexer import yaplLexer
+from build.yaplParser import yaplParser
+
+# Parsing strategies for yaplParser.
+#
+# "two-stage" first parses with PredictionMode.SLL and a bail-out error
+# strategy, which is much cheaper on the left-recursive expr rule, and only
+# reparses with full LL when SLL fails (a real syntax error or an input that
+# needs full context). "ll" is the plain full-LL parse the GUI always did.
+#
+# The prediction DFAs (yaplParser.decisionsToDFA / sharedContextCache) are
+# class attributes, so every parser in the same process reuses them;
+# warm_up() fills them from a representative corpus before timing anything.
+
+PARSE_MODES = ["two-stage", "ll"]
+
+stats = {
+    "parses": 0,
+    "sll_success": 0,
+    "ll_fallbacks": 0,
+}
+
+
+def parse(stream, listeners=(), mode="two-stage", profiler=None):
+    # Returns (tree, parser, used_ll) for the prog rule of the given token stream
+    parser = yaplParser(stream)
+    parser.removeErrorListeners()
+    stats["parses"] += 1
+    if profiler is not None:
+        profiler.instrument_parser(parser)
+
+    if mode == "two-stage":
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser._errHandler = BailErrorStrategy()
+        try:
+            tree = parser.prog()
+            stats["sll_success"] += 1
+            for listener in listeners:
+                parser.addErrorListener(listener)
+            return tree, parser, False
+        except ParseCancellationException:
+            stats["ll_fallbacks"] += 1
+            stream.seek(0)
+            parser._errHandler = DefaultErrorStrategy()
+            parser.reset()
+
+    parser._interp.predictionMode = PredictionMode.LL
+    for listener in listeners:
+        parser.addErrorListener(listener)
+
+    tree = parser.prog()
+    return tree, parser, mode == "two-stage"
+
+
+def dfa_size():
+    # Number of DFA states cached for the parser and lexer decisions
+    parser_states = sum(len(dfa._states) for dfa in yaplParser.decisionsToDFA)
+    lexer_states = sum(len(dfa._states) for dfa in yaplLexer.decisionsToDFA)
+    return {"parser": parser_states, "lexer": lexer_states}
+
+
+def warm_up(paths):
+    for path in paths:
+        lexer = yaplLexer(FileStream(path, encoding="utf-8"))
+        lexer.removeErrorListeners()
+        stream = CommonTokenStream(lexer)
+        stream.fill()
+        parse(stream)
+
+    # Warm-up parses are not part of the reported statistics
+    reset_stats()
+    return dfa_size()
+
+
+def reset_stats():
+    for key in stats:
+        stats[key] = 0
@@ -0,0 +1,269 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Runtime instrumentation of the compiler pipeline.
+#
+# A Profiler measures the phases of a run (wall time and, optionally,
+# allocations), the calls and cumulative time of every yaplWalker visitor,
+# SymbolTable.add/find calls and the prediction work of the ANTLR parser.
+# Nothing is instrumented unless a Profiler is passed in: the instrument_*
+# methods wrap the methods of one instance, the classes are never touched.
+#
+# Callers can subscribe to the events as they happen:
+#
+#   profiler = Profiler()
+#   profiler.subscribe(lambda event, data: print(event, data))
+#
+# Events: "phase_start", "phase_end", "visit", "symbol_add", "symbol_find",
+# "prediction".
+#
+# report() returns everything as a dict, format_report() as text and
+# write_folded() writes the visitor stacks in the folded format that
+# flamegraph.pl and speedscope read.
+
+
+class Profiler:
+
+    def __init__(self, allocations=False):
+        self.allocations = allocations
+        self.subscribers = []
+
+        self.phases = {}
+        self.visitors = {}
+        self.symbols = {"add": 0, "find": 0, "find_hits": 0}
+        self.prediction = {"predictions": 0, "dfa_misses": 0, "full_context": 0, "seconds": 0.0, "decisions": {}}
+        self.dfa = {}
+
+        # Self time in microseconds of each visitor call stack
+        self.stacks = {}
+        self.stack = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def emit(self, event, data):
+        for callback in self.subscribers:
+            callback(event, data)
+
+    # ----------------------------------------------------------------------
+    # Phases
+    # ----------------------------------------------------------------------
+
+    @contextmanager
+    def phase(self, name):
+        tracing = self.allocations and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if self.allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+
+        self.emit("phase_start", {"phase": name})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            data = {"phase": name, "seconds": time.perf_counter() - start}
+            if self.allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                data["allocated_bytes"] = current - before
+                data["peak_bytes"] = peak - before
+            if tracing:
+                tracemalloc.stop()
+
+            totals = self.phases.setdefault(name, {"calls": 0, "seconds": 0.0})
+            totals["calls"] += 1
+            totals["seconds"] += data["seconds"]
+            if self.allocations:
+                totals["allocated_bytes"] = totals.get("allocated_bytes", 0) + data["allocated_bytes"]
+                totals["peak_bytes"] = max(totals.get("peak_bytes", 0), data["peak_bytes"])
+            self.emit("phase_end", data)
+
+    # ----------------------------------------------------------------------
+    # Instrumentation
+    # ----------------------------------------------------------------------
+
+    def instrument_walker(self, walker):
+        # Times every visitor of this walker instance (see AstVisitor.hooks)
+        walker.hooks = VisitorHooks(self, walker)
+        return walker
+
+    def instrument_symbol_table(self, table):
+        add, find = table.add, table.find
+        symbols = self.symbols
+
+        def counted_add(*args, **kwargs):
+            symbols["add"] += 1
+            if self.subscribers:
+                self.emit("symbol_add", {"kind": str(args[0]) if args else kwargs.get("kind"), "id": str(args[1]) if len(args) > 1 else kwargs.get("id")})
+            return add(*args, **kwargs)
+
+        def counted_find(*args, **kwargs):
+            symbols["find"] += 1
+            symbol = find(*args, **kwargs)
+            if symbol is not None:
+                symbols["find_hits"] += 1
+            if self.subscribers:
+                self.emit("symbol_find", {"kind": str(args[0]) if args else kwargs.get("kind"), "id": str(args[1]) if len(args) > 1 else kwargs.get("id"), "found": symbol is not None})
+            return symbol
+
+        table.add = counted_add
+        table.find = counted_find
+        return table
+
+    def instrument_parser(self, parser):
+        # Counts adaptivePredict calls per decision, the DFA misses (target
+        # states computed from the ATN) and the full-context (LL) predictions
+        interp = parser._interp
+        adaptive_predict = interp.adaptivePredict
+        compute_target_state = interp.computeTargetState
+        full_context = interp.execATNWithFullContext
+        prediction = self.prediction
+        decisions = prediction["decisions"]
+
+        def predict(input, decision, outer_context):
+            start = time.perf_counter()
+            alt = adaptive_predict(input, decision, outer_context)
+            elapsed = time.perf_counter() - start
+            prediction["predictions"] += 1
+            prediction["seconds"] += elapsed
+            decisions[decision] = decisions.get(decision, 0) + 1
+            if self.subscribers:
+                self.emit("prediction", {"decision": decision, "alt": alt, "seconds": elapsed})
+            return alt
+
+        def target_state(*args):
+            prediction["dfa_misses"] += 1
+            return compute_target_state(*args)
+
+        def with_full_context(*args):
+            prediction["full_context"] += 1
+            return full_context(*args)
+
+        interp.adaptivePredict = predict
+        interp.computeTargetState = target_state
+        interp.execATNWithFullContext = with_full_context
+        return parser
+
+    def record_dfa(self, name, sizes):
+        self.dfa[name] = dict(sizes)
+
+    # ----------------------------------------------------------------------
+    # Reports
+    # ----------------------------------------------------------------------
+
+    def report(self):
+        return {
+            "phases": self.phases,
+            "visitors": self.visitors,
+            "symbol_table": self.symbols,
+            "prediction": {
+                "predictions": self.prediction["predictions"],
+                "dfa_misses": self.prediction["dfa_misses"],
+                "dfa_hits": self.prediction["predictions"] - self.prediction["dfa_misses"],
+                "full_context": self.prediction["full_context"],
+                "seconds": self.prediction["seconds"],
+                "decisions": {str(decision): count for decision, count in sorted(self.prediction["decisions"].items())},
+            },
+            "dfa_states": self.dfa,
+            "stacks": self.stacks,
+        }
+
+    def merge(self, report):
+        # Adds a report() of another run (e.g. from a worker process)
+        for name, values in report["phases"].items():
+            totals = self.phases.setdefault(name, {"calls": 0, "seconds": 0.0})
+            for key, value in values.items():
+                totals[key] = max(totals.get(key, 0), value) if key == "peak_bytes" else totals.get(key, 0) + value
+        for name, values in report["visitors"].items():
+            totals = self.visitors.setdefault(name, {"calls": 0, "seconds": 0.0, "self_seconds": 0.0})
+            for key, value in values.items():
+                totals[key] += value
+        for key, value in report["symbol_table"].items():
+            self.symbols[key] += value
+        for key in ("predictions", "dfa_misses", "full_context", "seconds"):
+            self.prediction[key] += report["prediction"][key]
+        for decision, count in report["prediction"]["decisions"].items():
+            decisions = self.prediction["decisions"]
+            decisions[int(decision)] = decisions.get(int(decision), 0) + count
+        for key, value in report["stacks"].items():
+            self.stacks[key] = self.stacks.get(key, 0) + value
+        # DFA sizes: the smallest "before" and the largest "after" of all runs
+        for name, sizes in report["dfa_states"].items():
+            current = self.dfa.setdefault(name, dict(sizes))
+            for key, value in sizes.items():
+                current[key] = min(current[key], value) if name == "before" else max(current[key], value)
+
+    def format_report(self, top=15):
+        lines = ["Fases:"]
+        for name, values in self.phases.items():
+            line = "  {name:<10} {seconds:>10.4f}s".format(name=name, seconds=values["seconds"])
+            if "allocated_bytes" in values:
+                line += "  {allocated:>12} B asignados  {peak:>12} B pico".format(allocated=values["allocated_bytes"], peak=values["peak_bytes"])
+            lines.append(line)
+
+        lines.append("Visitors (por tiempo acumulado):")
+        ordered = sorted(self.visitors.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        for name, values in ordered[:top]:
+            if values["calls"]:
+                lines.append("  {name:<24} {calls:>8} llamadas {seconds:>10.4f}s {self_seconds:>10.4f}s propio".format(name=name, **values))
+
+        lines.append("Tabla de simbolos: {add} add, {find} find ({find_hits} encontrados)".format(**self.symbols))
+
+        prediction = self.report()["prediction"]
+        lines.append("Prediccion: {predictions} llamadas, {dfa_hits} en DFA, {dfa_misses} fallos de DFA, {full_context} LL completo, {seconds:.4f}s".format(**prediction))
+        for name, sizes in self.dfa.items():
+            lines.append("Estados DFA ({name}): {sizes}".format(name=name, sizes=sizes))
+        return "\n".join(lines)
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, microseconds in sorted(self.stacks.items()):
+                if int(microseconds) > 0:
+                    f.write("{stack} {value}\n".format(stack=stack, value=int(microseconds)))
+
+
+class VisitorHooks:
+
+    # Calls, cumulative and self time of every visitor, and the folded stacks
+    # of the profiler, from the enter/exit calls of an AstVisitor
+
+    def __init__(self, profiler, walker):
+        self.profiler = profiler
+        self.walker = walker
+        # Depth of every visitor in the stack, so recursive calls are not counted twice
+        self.depth = {}
+        # Start time of every frame of profiler.stack
+        self.starts = []
+
+    def enter(self, name, node):
+        self.profiler.stack.append([name, 0.0])
+        self.depth[name] = self.depth.get(name, 0) + 1
+        self.starts.append(time.perf_counter())
+
+    def exit(self, name, node):
+        profiler = self.profiler
+        stack = profiler.stack
+        elapsed = time.perf_counter() - self.starts.pop()
+        self.depth[name] -= 1
+        frame = stack.pop()
+
+        stats = profiler.visitors.setdefault(name, {"calls": 0, "seconds": 0.0, "self_seconds": 0.0})
+        stats["calls"] += 1
+        if self.depth[name] == 0:
+            stats["seconds"] += elapsed
+        self_seconds = elapsed - frame[1]
+        stats["self_seconds"] += self_seconds
+        if stack:
+            stack[-1][1] += elapsed
+
+        key = ";".join(entry[0] for entry in stack) + (";" if stack else "") + name
+        profiler.stacks[key] = profiler.stacks.get(key, 0) + self_seconds * 1e6
+        if profiler.subscribers:
+            line = self.walker.ast.line[node]
+            profiler.emit("visit", {"visitor": name, "seconds": elapsed, "line": line if line != -1 else None})
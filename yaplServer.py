@@ -0,0 +1,223 @@
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import OrderedDict
+from antlr4 import InputStream
+from yaplParsing import warm_up, dfa_size, stats, PARSE_MODES
+from yaplCompiler import analyze, collect_files
+from intermediateCode import Quadruples
+from yaplOptimizer import PassManager, LEVELS
+
+# Resident compiler: JSON-RPC 2.0 over stdin/stdout, one message per line.
+#
+#   python yaplServer.py --warm input/
+#
+#   -> {"jsonrpc": "2.0", "id": 1, "method": "check", "params": {"source": "class Main {...};"}}
+#   <- {"jsonrpc": "2.0", "id": 1, "result": {"ok": false, "diagnostics": [...], ...}}
+#
+# The lexer/parser ATNs and the prediction DFA stay loaded between requests,
+# and the results of the last sources are kept in memory, so an editor or a
+# CI hook only pays for the analysis itself.
+#
+# Methods:
+#   check    {source, parse_mode?, max_errors?}            diagnostics
+#   symbols  {source, parse_mode?, max_errors?}            diagnostics + symbol table rows
+#   compile  {source, level?, parse_mode?, max_errors?}    diagnostics + intermediate code
+#   stats    {}                               requests, cache hits, DFA size
+#   shutdown {}                               answers and exits
+
+JSONRPC_VERSION = "2.0"
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+DEFAULT_CACHE_ENTRIES = 64
+
+
+class RequestError(Exception):
+
+    def __init__(self, code, msg):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+
+
+def diagnostics(analysis):
+    # Errors of the listener (lexer and parser) and of the walker, and the
+    # warnings of the dataflow analyses, in one list
+    result = []
+    for error in analysis["syntax_errors"]:
+        result.append(dict(error, source="syntax"))
+    for error in analysis["errors"]:
+        result.append(dict(error, source="semantic"))
+    for warning in analysis.get("warnings", []):
+        result.append(dict(warning, source="semantic"))
+    return result
+
+
+class CompilerServer:
+
+    def __init__(self, cache_entries=DEFAULT_CACHE_ENTRIES):
+        self.cache_entries = cache_entries
+        # (source hash, parse mode, max errors) -> analysis, least recently used first
+        self.cache = OrderedDict()
+        self.running = True
+        self.counters = {"requests": 0, "errors": 0, "cache_hits": 0}
+        self.methods = {
+            "check": self.check,
+            "symbols": self.symbols,
+            "compile": self.compile,
+            "stats": self.stats,
+            "shutdown": self.shutdown,
+        }
+
+    # ----------------------------------------------------------------------
+    # Methods
+    # ----------------------------------------------------------------------
+
+    def analysis(self, params):
+        source = params.get("source")
+        if not isinstance(source, str):
+            raise RequestError(INVALID_PARAMS, "params.source debe ser un string")
+        parse_mode = params.get("parse_mode", "two-stage")
+        if parse_mode not in PARSE_MODES:
+            raise RequestError(INVALID_PARAMS, "parse_mode invalido: {mode}".format(mode=parse_mode))
+
+        max_errors = params.get("max_errors")
+        if max_errors is not None and (not isinstance(max_errors, int) or max_errors < 1):
+            raise RequestError(INVALID_PARAMS, "max_errors debe ser un entero positivo")
+
+        key = (hashlib.sha256(source.encode("utf-8")).hexdigest(), parse_mode, max_errors)
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            self.counters["cache_hits"] += 1
+            return result
+
+        result = analyze(InputStream(source), parse_mode, max_errors=max_errors)
+        self.cache[key] = result
+        if len(self.cache) > self.cache_entries:
+            self.cache.popitem(last=False)
+        return result
+
+    def check(self, params):
+        return self.summary(self.analysis(params))
+
+    def summary(self, analysis):
+        found = diagnostics(analysis)
+        return {
+            "ok": not (analysis["syntax_errors"] or analysis["errors"]),
+            "diagnostics": found,
+            "truncated": analysis["truncated"],
+            "tokens": analysis["tokens"],
+            "symbols": analysis["symbols"],
+            "timings": analysis["timings"],
+        }
+
+    def symbols(self, params):
+        analysis = self.analysis(params)
+        result = self.summary(analysis)
+        result["columns"] = ["kind", "id", "class_type", "line", "column", "value", "scope", "scope_type", "numParams", "paramTypes", "size", "max_size", "address_id"]
+        result["symbol_table"] = analysis["symbol_table"]
+        return result
+
+    def compile(self, params):
+        level = params.get("level", 0)
+        if level not in LEVELS:
+            raise RequestError(INVALID_PARAMS, "level invalido: {level}".format(level=level))
+
+        analysis = self.analysis(params)
+        result = self.summary(analysis)
+        if analysis["intermediate_code"] is None:
+            result["code"] = None
+            return result
+
+        # The cached analysis keeps the unoptimized code
+        quads = Quadruples.from_dict(analysis["intermediate_code"])
+        if level:
+            start = time.perf_counter()
+            result["optimizations"] = PassManager(level).run(quads)
+            result["timings"] = dict(result["timings"], optimize=time.perf_counter() - start)
+        result["instructions"] = len(quads)
+        result["code"] = list(quads.lines())
+        return result
+
+    def stats(self, params):
+        return dict(self.counters, cached_sources=len(self.cache), dfa_states=dfa_size(), parsing=dict(stats))
+
+    def shutdown(self, params):
+        self.running = False
+        return None
+
+    # ----------------------------------------------------------------------
+    # Protocol
+    # ----------------------------------------------------------------------
+
+    def handle(self, line):
+        # Returns the response to one line of input, or None for notifications
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return self.error(None, PARSE_ERROR, "JSON invalido: {msg}".format(msg=e))
+
+        if not isinstance(request, dict) or request.get("jsonrpc") != JSONRPC_VERSION or not isinstance(request.get("method"), str):
+            return self.error(request.get("id") if isinstance(request, dict) else None, INVALID_REQUEST, "Solicitud invalida")
+
+        request_id = request.get("id")
+        params = request.get("params", {})
+        # Requests without id are notifications and get no answer, not even
+        # an error
+        notification = "id" not in request
+        self.counters["requests"] += 1
+        try:
+            method = self.methods.get(request["method"])
+            if method is None:
+                raise RequestError(METHOD_NOT_FOUND, "Metodo desconocido: {method}".format(method=request["method"]))
+            if not isinstance(params, dict):
+                raise RequestError(INVALID_PARAMS, "params debe ser un objeto")
+            result = method(params)
+        except RequestError as e:
+            response = self.error(request_id, e.code, e.msg)
+            return None if notification else response
+        except Exception as e:
+            response = self.error(request_id, INTERNAL_ERROR, "{name}: {msg}".format(name=type(e).__name__, msg=e))
+            return None if notification else response
+
+        if notification:
+            return None
+        return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "result": result}
+
+    def error(self, request_id, code, msg):
+        self.counters["errors"] += 1
+        return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "error": {"code": code, "message": msg}}
+
+    def serve(self, input=sys.stdin, output=sys.stdout):
+        for line in input:
+            if not line.strip():
+                continue
+            response = self.handle(line)
+            if response is not None:
+                output.write(json.dumps(response) + "\n")
+                output.flush()
+            if not self.running:
+                break
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor JSON-RPC del compilador de YAPL (stdin/stdout)")
+    parser.add_argument("--warm", action="append", default=[], help="archivos o directorios para precalentar el DFA de prediccion")
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_CACHE_ENTRIES, help="resultados recientes que se guardan en memoria")
+    args = parser.parse_args(argv)
+
+    warm_up(collect_files(args.warm))
+    CompilerServer(args.cache_entries).serve()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import queue
+import threading
+from antlr4 import *
+from build.yaplLexer import yaplLexer
+from build.yaplParser import yaplParser
+from yaplWalker import yaplWalker
+from yaplAst import Ast
+from yaplErrorListener import yaplErrorListener
+from yaplCodeGenerator import yaplCodeGenerator
+from yaplProfiler import Profiler
+from symbolTable import SymbolTable
+from diagnostics import Diagnostics, TooManyErrors, SYNTAX
+
+# Analysis of the GUI editor buffer, off the Tk thread.
+#
+# analyze_source() runs the same steps main.py always printed (tokens, parse
+# tree, symbol table, errors and intermediate code) on an in-memory string and
+# returns the output instead of printing it; write_output() prints it, the
+# symbol table one line at a time. AnalysisWorker runs it on a background
+# thread: only the newest request matters, so a run replaces any pending one
+# and the result of a run that was superseded meanwhile is dropped. Tk
+# widgets must only be touched from the mainloop, so results are handed over
+# through a queue that the GUI polls.
+
+
+# Tokens lexed, or rules entered by the parser, between checks for cancellation
+CANCEL_CHECK_INTERVAL = 1000
+# Errors after which the analysis of the buffer stops
+MAX_ERRORS = 100
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+class CancelListener(ParseTreeListener):
+
+    # Stops the parser of a superseded run instead of letting it finish
+
+    def __init__(self, cancelled):
+        self.cancelled = cancelled
+        self.count = 0
+
+    def enterEveryRule(self, ctx):
+        self.count += 1
+        if self.count % CANCEL_CHECK_INTERVAL == 0 and self.cancelled():
+            raise AnalysisCancelled()
+
+
+def error_box(lines):
+    return ["", yaplErrorListener.ANSI_RED, "----------------------------- ERROR -----------------------------"] + lines + ["-----------------------------------------------------------------", "", yaplErrorListener.ANSI_RESET]
+
+
+def write_output(output, file=sys.stdout):
+    # output is a list of strings and the SymbolTable, which is streamed
+    for part in output:
+        if isinstance(part, SymbolTable):
+            for line in part.lines():
+                file.write(line + "\n")
+        else:
+            file.write(part + "\n")
+
+
+def analyze_source(source, cancelled=lambda: False):
+    # Returns {"output", "symbol_table", "errors", "seconds"}; raises AnalysisCancelled
+    # soon after cancelled() becomes true
+    start = time.perf_counter()
+    output = []
+
+    # YAPL_PROFILE=1 adds a profiling report; any other value is also used as
+    # the path of a flamegraph (folded stacks) file
+    profiler = Profiler() if os.environ.get("YAPL_PROFILE") else None
+
+    # Lexer, parser and walker report to the same Diagnostics, which stops
+    # the analysis after MAX_ERRORS errors
+    diagnostics = Diagnostics(MAX_ERRORS)
+    walker = yaplWalker(diagnostics)
+    walker.initSymbolTable()
+    ast = None
+    tree_text = None
+    truncated = None
+
+    lexer = yaplLexer(InputStream(source))
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(yaplErrorListener(quiet=True, diagnostics=diagnostics))
+    stream = CommonTokenStream(lexer)
+
+    try:
+        while stream.fetch(CANCEL_CHECK_INTERVAL) == CANCEL_CHECK_INTERVAL:
+            if cancelled():
+                raise AnalysisCancelled()
+
+        parser = yaplParser(stream)
+        parser.removeErrorListeners()
+        parser.addErrorListener(yaplErrorListener(quiet=True, diagnostics=diagnostics))
+        parser.addParseListener(CancelListener(cancelled))
+        if profiler:
+            profiler.instrument_parser(parser)
+        tree = parser.prog()
+        if cancelled():
+            raise AnalysisCancelled()
+
+        # The parse tree is printed as text, then only the syntax tree is kept
+        tree_text = tree.toStringTree(parser.ruleNames)
+        ast = Ast.from_tree(tree)
+        tree = None
+
+        if profiler:
+            profiler.instrument_walker(walker)
+            profiler.instrument_symbol_table(walker.symbolTable)
+            with profiler.phase("walk"):
+                walker.walk(ast)
+        else:
+            walker.walk(ast)
+        if cancelled():
+            raise AnalysisCancelled()
+    except TooManyErrors as e:
+        truncated = str(e)
+
+    errors = diagnostics.sorted()
+    output.append("Tokens:")
+    output.extend(str(token) for token in stream.tokens)
+    for diagnostic in errors:
+        if diagnostic.code == SYNTAX:
+            output.extend(error_box([str(diagnostic)]))
+    if tree_text is not None:
+        output.append("\nParse Tree:")
+        output.append(tree_text)
+
+    output.append("\nSymbol Table:")
+    output.append(walker.symbolTable)
+
+    semantic_errors = [str(diagnostic) for diagnostic in errors if diagnostic.code != SYNTAX]
+    if semantic_errors:
+        output.extend(error_box(semantic_errors))
+    elif ast is not None and not errors:
+        quads = yaplCodeGenerator(constants=walker.symbolTable.constants, types=walker.types).walk(ast)
+        output.append("\nCodigo intermedio:")
+        output.append(str(quads))
+    if truncated:
+        output.extend(error_box([truncated]))
+
+    if profiler:
+        output.append("\nProfiling:")
+        output.append(profiler.format_report())
+        if os.environ["YAPL_PROFILE"] != "1":
+            profiler.write_folded(os.environ["YAPL_PROFILE"])
+
+    return {
+        "output": output,
+        "symbol_table": walker.symbolTable,
+        "errors": diagnostics.error_count,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class AnalysisWorker:
+
+    def __init__(self, analyze=analyze_source):
+        self.analyze = analyze
+        # (generation, result) of finished runs, read by the GUI thread
+        self.results = queue.Queue()
+        self.condition = threading.Condition()
+        self.pending = None
+        # Increased by every submit/cancel; a run is stale once it changes
+        self.generation = 0
+
+        self.thread = threading.Thread(target=self.loop, name="yapl-analysis", daemon=True)
+        self.thread.start()
+
+    def submit(self, source, analyze=None):
+        # analyze replaces the default analysis for this run only
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, source, analyze or self.analyze)
+            self.condition.notify()
+            return self.generation
+
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            self.pending = None
+
+    def is_stale(self, generation):
+        return generation != self.generation
+
+    def loop(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                generation, source, analyze = self.pending
+                self.pending = None
+
+            try:
+                result = analyze(source, lambda: self.is_stale(generation))
+            except AnalysisCancelled:
+                continue
+            except Exception as e:
+                result = {"output": ["Error: {name}: {msg}".format(name=type(e).__name__, msg=e)], "symbol_table": None, "errors": 1, "seconds": 0.0}
+
+            if not self.is_stale(generation):
+                self.results.put((generation, result))
+
+    def poll(self):
+        # Newest current result, or None; stale results are discarded
+        latest = None
+        while True:
+            try:
+                generation, result = self.results.get_nowait()
+            except queue.Empty:
+                return latest
+            if not self.is_stale(generation):
+                latest = result
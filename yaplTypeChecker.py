@@ -0,0 +1,330 @@
+from build.yaplParser import yaplParser
+from yaplAst import AstVisitor, NodeKind
+from classHierarchy import SELF_TYPE, ROOT_CLASS
+from symbolTable import BUILTIN_CLASS
+from diagnostics import TYPE_MISMATCH, ARGUMENTS, UNDEFINED
+
+# Static types of the expressions of one class at a time, run by yaplWalker
+# after it visits the class.
+#
+# Every expression visitor returns the type of its node (a class name,
+# SELF_TYPE, or None when it cannot be known, e.g. after an undefined name,
+# so one error does not cascade into many). type_of() keeps the result in
+# `types`, keyed by node of the Ast; the code generator reads the same table
+# instead of computing types again.
+#
+# Rules follow the COOL type system: the branches of an if join at their
+# nearest common ancestor, SELF_TYPE is the class of self, a dispatch that
+# returns SELF_TYPE has the type of its receiver, and every assignment,
+# initialization, argument and method body must conform to its declared type.
+
+
+class yaplTypeChecker(AstVisitor):
+
+    def __init__(self, hierarchy, errors) -> None:
+        self.hierarchy = hierarchy
+        self.errors = errors
+        # expr node -> static type
+        self.types = {}
+        self.current_class = None
+        # Stack of {name: type} for formals and let variables
+        self.scopes = []
+        super().__init__()
+
+    def type_of(self, node):
+        # Generator: type_id = yield from self.type_of(node)
+        if node == -1:
+            return None
+        type_id = self.types[node] = yield node
+        return type_id
+
+    def known(self, type_id):
+        # Declared type, or None for classes that do not exist (or hang from
+        # an inheritance cycle), which are reported elsewhere
+        type_id = str(type_id) if type_id is not None else None
+        if type_id == SELF_TYPE:
+            return SELF_TYPE
+        if type_id not in self.hierarchy or type_id in self.hierarchy.cycles:
+            return None
+        return type_id
+
+    def resolve(self, type_id):
+        # SELF_TYPE stands for the class being checked
+        return self.current_class if type_id == SELF_TYPE else type_id
+
+    def conforms(self, type_id, expected):
+        if type_id is None or expected is None:
+            return True
+        if expected == SELF_TYPE:
+            return type_id == SELF_TYPE
+        return self.hierarchy.conforms(self.resolve(type_id), expected)
+
+    def join(self, a, b):
+        if a is None or b is None:
+            return None
+        if a == b:
+            return a
+        return self.hierarchy.join(self.resolve(a), self.resolve(b))
+
+    def lookup(self, name):
+        if name == "self":
+            return SELF_TYPE
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return self.known(self.hierarchy.lookup_attribute(self.current_class, name))
+
+    def check(self, type_id, expected, msg, position):
+        if not self.conforms(type_id, expected):
+            self.errors.error(TYPE_MISMATCH, msg.format(type=type_id, expected=expected), position)
+
+    def check_operands(self, node, expected, result):
+        # Operator whose operands must all be `expected`
+        operands = self.ast.exprs(node)
+        types = []
+        for operand in operands:
+            types.append((yield from self.type_of(operand)))
+        if any(type_id is not None and type_id != expected for type_id in types):
+            found = " y ".join(str(type_id) for type_id in types)
+            self.errors.error(TYPE_MISMATCH, "{op} requiere {expected}, no {found}".format(op=self.ast.operator(node), expected=expected, found=found), self.ast.start_position(node))
+        return result
+
+    def dispatch(self, receiver_type, dispatch_type, name, args, position, implicit_self=False):
+        arg_types = []
+        for arg in args:
+            arg_types.append((yield from self.type_of(arg)))
+        cls = self.resolve(dispatch_type if dispatch_type is not None else receiver_type)
+        if cls is None:
+            return None
+
+        method = self.hierarchy.lookup_method(cls, name)
+        # The IO methods are resolved from any class, like yaplWalker does
+        if method is None and implicit_self:
+            method = self.hierarchy.lookup_method(BUILTIN_CLASS, name)
+        if method is None:
+            # Names no class defines are already reported by yaplWalker
+            if name in self.hierarchy.method_names:
+                self.errors.error(UNDEFINED, "{cls} no tiene un metodo {id}".format(cls=cls, id=name), position)
+            return None
+
+        if len(args) != len(method.param_types):
+            self.errors.error(ARGUMENTS, "{id} espera {n} argumentos, recibio {m}".format(id=name, n=len(method.param_types), m=len(args)), position)
+        else:
+            for i, (arg_type, param_type) in enumerate(zip(arg_types, method.param_types)):
+                self.check(arg_type, self.known(param_type), "Argumento {i} de {id} debe ser {{expected}}, no {{type}}".format(i=i + 1, id=name), self.ast.start_position(args[i]))
+
+        if method.return_type == SELF_TYPE:
+            return receiver_type
+        return self.known(method.return_type)
+
+    def name(self, node, token_type=yaplParser.OBJECT_ID):
+        # (text, position) of a terminal of node
+        terminal = self.ast.token(node, token_type)
+        return self.ast.text(terminal), self.ast.position(terminal)
+
+
+    # Visit a class_def node.
+    def visitClass_def(self, node):
+        ast = self.ast
+        self.current_class, _ = self.name(node, yaplParser.TYPE_ID)
+        for feature in ast.children(node):
+            if ast.kind[feature] in (NodeKind.FEAT_DEF, NodeKind.FEAT_ASGN):
+                yield feature
+        return None
+
+
+    # Visit a feat_def node.
+    def visitFeat_def(self, node):
+        ast = self.ast
+        self.scopes = [{str(self.name(formal)[0]): self.known(self.name(formal, yaplParser.TYPE_ID)[0]) for formal in ast.children(node, NodeKind.FORMAL)}]
+        exprs = ast.exprs(node)
+        body = yield from self.type_of(exprs[0] if exprs else -1)
+        name, position = self.name(node)
+        self.check(body, self.known(self.name(node, yaplParser.TYPE_ID)[0]), "El cuerpo de {id} es {{type}}, debe ser {{expected}}".format(id=name), position)
+        self.scopes = []
+        return None
+
+
+    # Visit a feat_asgn node.
+    def visitFeat_asgn(self, node):
+        exprs = self.ast.exprs(node)
+        if exprs:
+            value = yield from self.type_of(exprs[0])
+            name, position = self.name(node)
+            self.check(value, self.known(self.name(node, yaplParser.TYPE_ID)[0]), "No se puede asignar {{type}} a {id} de tipo {{expected}}".format(id=name), position)
+        return None
+
+
+    # ========================================================================================
+    # Expressions
+    # ========================================================================================
+
+
+    # Visit an expr_asgn node.
+    def visitExpr_asgn(self, node):
+        value = yield from self.type_of(self.ast.child(node))
+        name, position = self.name(node)
+        self.check(value, self.lookup(str(name)), "No se puede asignar {{type}} a {id} de tipo {{expected}}".format(id=name), position)
+        return value
+
+
+    # Visit an expr_class_call node.
+    def visitExpr_class_call(self, node):
+        exprs = self.ast.exprs(node)
+        receiver = yield from self.type_of(exprs[0] if exprs else -1)
+        dispatch_type = None
+        type_id, type_position = self.name(node, yaplParser.TYPE_ID)
+        if type_id is not None:
+            dispatch_type = self.known(type_id)
+            if dispatch_type is None:
+                return None
+            self.check(receiver, dispatch_type, "{type} no hereda de {expected}", type_position)
+        name, position = self.name(node)
+        return (yield from self.dispatch(receiver, dispatch_type, str(name), exprs[1:], position))
+
+
+    # Visit an expr_call node.
+    def visitExpr_call(self, node):
+        name, position = self.name(node)
+        return (yield from self.dispatch(SELF_TYPE, None, str(name), self.ast.exprs(node), position, implicit_self=True))
+
+
+    # Visit an expr_if node.
+    def visitExpr_if(self, node):
+        condition, then, otherwise = (self.ast.exprs(node) + [-1, -1, -1])[:3]
+        self.check((yield from self.type_of(condition)), "Bool", "La condicion debe ser {expected}, no {type}", self.ast.start_position(condition))
+        then = yield from self.type_of(then)
+        return self.join(then, (yield from self.type_of(otherwise)))
+
+
+    # Visit an expr_while node.
+    def visitExpr_while(self, node):
+        condition, body = (self.ast.exprs(node) + [-1, -1])[:2]
+        self.check((yield from self.type_of(condition)), "Bool", "La condicion debe ser {expected}, no {type}", self.ast.start_position(condition))
+        yield from self.type_of(body)
+        return ROOT_CLASS
+
+
+    # Visit an expr_brackets node.
+    def visitExpr_brackets(self, node):
+        type_id = None
+        for expr in self.ast.exprs(node):
+            type_id = yield from self.type_of(expr)
+        return type_id
+
+
+    # Visit an expr_decl node.
+    def visitExpr_decl(self, node):
+        ast = self.ast
+        scope = {}
+        self.scopes.append(scope)
+
+        # One let_var per variable, then the body
+        type_id = None
+        for child in ast.children(node):
+            if ast.kind[child] != NodeKind.LET_VAR:
+                type_id = yield from self.type_of(child)
+                continue
+
+            name, position = self.name(child)
+            declared = self.known(self.name(child, yaplParser.TYPE_ID)[0])
+
+            # The initializer does not see its own variable
+            if ast.first[child] != -1:
+                value = yield from self.type_of(ast.first[child])
+                self.check(value, declared, "No se puede asignar {{type}} a {id} de tipo {{expected}}".format(id=name), position)
+            scope[str(name)] = declared
+
+        self.scopes.pop()
+        return type_id
+
+
+    # Visit an expr_instance node.
+    def visitExpr_instance(self, node):
+        return self.known(self.name(node, yaplParser.TYPE_ID)[0])
+
+
+    # Visit an expr_isvoid node.
+    def visitExpr_isvoid(self, node):
+        yield from self.type_of(self.ast.child(node))
+        return "Bool"
+
+
+    # Visit an expr_suma node.
+    def visitExpr_suma(self, node):
+        return (yield from self.check_operands(node, "Int", "Int"))
+
+
+    # Visit an expr_mult node.
+    def visitExpr_mult(self, node):
+        return (yield from self.check_operands(node, "Int", "Int"))
+
+
+    # Visit an expr_negative node.
+    def visitExpr_negative(self, node):
+        return (yield from self.check_operands(node, "Int", "Int"))
+
+
+    # Visit an expr_negado node.
+    def visitExpr_negado(self, node):
+        return (yield from self.check_operands(node, "Int", "Int"))
+
+
+    # Visit an expr_less_than node.
+    def visitExpr_less_than(self, node):
+        return (yield from self.check_operands(node, "Int", "Bool"))
+
+
+    # Visit an expr_equal node.
+    def visitExpr_equal(self, node):
+        # Int, String and Bool can only be compared with the same type
+        left, right = (self.ast.exprs(node) + [-1, -1])[:2]
+        left = yield from self.type_of(left)
+        right = yield from self.type_of(right)
+        basic = ("Int", "String", "Bool")
+        if left is not None and right is not None and left != right and (left in basic or right in basic):
+            self.errors.error(TYPE_MISMATCH, "No se puede comparar {left} con {right}".format(left=left, right=right), self.ast.start_position(node))
+        return "Bool"
+
+
+    # Visit an expr_not node.
+    def visitExpr_not(self, node):
+        return (yield from self.check_operands(node, "Bool", "Bool"))
+
+
+    # Visit an expr_parenthesis node.
+    def visitExpr_parenthesis(self, node):
+        return (yield from self.type_of(self.ast.child(node)))
+
+
+    # Visit an expr_id node.
+    def visitExpr_id(self, node):
+        name = self.ast.token(node, yaplParser.OBJECT_ID)
+        if name != -1:
+            return self.lookup(self.ast.text(name))
+        return None
+
+
+    # Visit an expr_int node.
+    def visitExpr_int(self, node):
+        return "Int"
+
+
+    # Visit an expr_str node.
+    def visitExpr_str(self, node):
+        return "String"
+
+
+    # Visit an expr_true node.
+    def visitExpr_true(self, node):
+        return "Bool"
+
+
+    # Visit an expr_false node.
+    def visitExpr_false(self, node):
+        return "Bool"
+
+
+    # Visit an expr_self node.
+    def visitExpr_self(self, node):
+        return SELF_TYPE
@@ -0,0 +1,614 @@
+import sys
+import json
+import time
+import argparse
+from intermediateCode import Quadruples, Op, Operand, KIND_MASK, INIT_METHOD, int_div
+
+# Bytecode virtual machine for YAPL.
+#
+# Every function of the intermediate code is compiled to a flat list of ints.
+# All operands are frame slots: self is slot 0, the formals follow, then the
+# locals and temporaries, and the constants of the function are already in
+# their slots in the frame template that each call copies. Attributes are
+# read and written with LOAD_ATTR/STORE_ATTR through a scratch slot.
+#
+# Method dispatch uses one table per class (name id -> function) with the
+# inherited methods already flattened into it, and calls push the caller on
+# an explicit stack, so deep recursion does not use the Python stack.
+#
+# Run a program with: python yaplVM.py input/p2_fibonacci.yapl -O2
+
+# Opcodes
+MOVE = 0            # MOVE dest src
+ADD = 1             # ADD dest a b
+SUB = 2
+MUL = 3
+DIV = 4
+LT = 5
+LE = 6
+EQ = 7
+NEG = 8             # NEG dest a
+NOT = 9
+ISVOID = 10
+JUMP = 11           # JUMP target
+JUMP_IF_FALSE = 12  # JUMP_IF_FALSE a target
+CALL = 13           # CALL dest name_id nargs arg...
+STATIC_CALL = 14    # STATIC_CALL dest function_id nargs arg...
+NEW = 15            # NEW dest class_id
+LOAD_ATTR = 16      # LOAD_ATTR dest index
+STORE_ATTR = 17     # STORE_ATTR index src
+RETURN = 18         # RETURN src
+
+BINARY = {Op.ADD: ADD, Op.SUB: SUB, Op.MUL: MUL, Op.DIV: DIV, Op.LT: LT, Op.LE: LE, Op.EQ: EQ}
+UNARY = {Op.NEG: NEG, Op.NOT: NOT, Op.ISVOID: ISVOID}
+
+BASIC_CLASSES = ["Object", "IO", "Int", "String", "Bool"]
+
+
+class YaplRuntimeError(Exception):
+    pass
+
+
+class Instance:
+
+    __slots__ = ("cls", "attrs")
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.attrs = [None] * len(cls.attributes)
+
+
+class ClassInfo:
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        # Attribute names, inherited ones first, so subclasses keep the indexes
+        self.attributes = []
+        self.attribute_index = {}
+        # name id -> Function or builtin
+        self.methods = {}
+        # Own functions by method name, before flattening
+        self.functions = {}
+
+
+class Function:
+
+    __slots__ = ("name", "cls", "code", "template", "formals")
+
+    def __init__(self, name, cls):
+        self.name = name
+        self.cls = cls
+        self.code = []
+        self.template = []
+        self.formals = 0
+
+
+class YaplVM:
+
+    def __init__(self, quads, stdin=None, stdout=None):
+        self.quads = quads
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+
+        self.names = []
+        self.name_ids = {}
+        self.classes = {}
+        self.class_list = []
+        self.class_ids = {}
+        self.functions = []
+        self.function_ids = {}
+
+        self.load_classes()
+        self.compile()
+        self.build_method_tables()
+
+    def name_id(self, name):
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return self.name_ids[name]
+
+    def class_id(self, name):
+        return self.class_ids[name]
+
+    # ----------------------------------------------------------------------
+    # Loading
+    # ----------------------------------------------------------------------
+
+    def add_class(self, name, parent):
+        cls = ClassInfo(name, parent)
+        self.classes[name] = cls
+        self.class_ids[name] = len(self.class_list)
+        self.class_list.append(cls)
+        return cls
+
+    def load_classes(self):
+        quads = self.quads
+        self.add_class("Object", None)
+        for name in BASIC_CLASSES[1:]:
+            self.add_class(name, "Object")
+
+        for op, arg1, arg2, result in quads:
+            if op == Op.CLASS:
+                self.add_class(quads.value(arg1), quads.value(arg2) if arg2 else "Object")
+
+        # Attributes are the ones assigned by _init or used by the methods
+        used = {name: set() for name in self.classes}
+        current = None
+        for op, arg1, arg2, result in quads:
+            if op == Op.FUNC:
+                current = used[quads.value(arg1).split(".")[0]]
+            for operand in (arg1, arg2, result):
+                if operand & KIND_MASK == Operand.ATTR:
+                    current.add(quads.value(operand))
+
+        for cls in self.ordered_classes():
+            parent = self.classes.get(cls.parent)
+            if parent is not None:
+                cls.attributes = list(parent.attributes)
+            for name in sorted(used[cls.name]):
+                if name not in cls.attributes and not self.inherited_attribute(cls, name):
+                    cls.attributes.append(name)
+            cls.attribute_index = {name: i for i, name in enumerate(cls.attributes)}
+
+    def inherited_attribute(self, cls, name):
+        parent = self.classes.get(cls.parent)
+        return parent is not None and name in parent.attributes
+
+    def ordered_classes(self):
+        # Parents before children
+        ordered = []
+        seen = set()
+
+        def add(cls):
+            if cls.name in seen:
+                return
+            seen.add(cls.name)
+            parent = self.classes.get(cls.parent)
+            if parent is not None:
+                add(parent)
+            ordered.append(cls)
+
+        for cls in self.class_list:
+            add(cls)
+        return ordered
+
+    # ----------------------------------------------------------------------
+    # Compilation
+    # ----------------------------------------------------------------------
+
+    def compile(self):
+        quads = self.quads
+        i = 0
+        while i < len(quads):
+            if quads.op[i] == Op.FUNC:
+                i = self.compile_function(i)
+            i += 1
+
+    def compile_function(self, start):
+        quads = self.quads
+        class_name, method_name = quads.value(quads.arg1[start]).split(".", 1)
+        cls = self.classes[class_name]
+
+        function = Function(quads.value(quads.arg1[start]), cls)
+        function.formals = quads.value(quads.arg2[start])
+        self.function_ids[function.name] = len(self.functions)
+        self.functions.append(function)
+        cls.functions[method_name] = function
+
+        template = [None]
+        slots = {quads.local("self"): 0}
+        code = function.code
+        labels = {}
+        jumps = []
+        params = []
+
+        # The formals follow self, in the order the caller passes them
+        i = start + 1
+        while quads.op[i] == Op.FORMAL:
+            slots[quads.arg1[i]] = len(template)
+            template.append(None)
+            i += 1
+
+        # Three scratch slots to read and write attributes
+        scratch = [len(template), len(template) + 1, len(template) + 2]
+        template.extend([None, None, None])
+
+        def slot(operand):
+            if operand not in slots:
+                slots[operand] = len(template)
+                kind = operand & KIND_MASK
+                template.append(quads.value(operand) if kind == Operand.CONST else None)
+            return slots[operand]
+
+        def read(operand, scratch_slot):
+            if operand & KIND_MASK == Operand.ATTR:
+                code.extend([LOAD_ATTR, scratch_slot, cls.attribute_index[quads.value(operand)]])
+                return scratch_slot
+            return slot(operand)
+
+        def write(operand):
+            # Slot to store a result in, and the attribute index to copy it to after
+            if operand & KIND_MASK == Operand.ATTR:
+                return scratch[2], cls.attribute_index[quads.value(operand)]
+            return slot(operand), None
+
+        def store(attr_index):
+            if attr_index is not None:
+                code.extend([STORE_ATTR, attr_index, scratch[2]])
+
+        while quads.op[i] != Op.END_FUNC:
+            op, arg1, arg2, result = quads[i]
+
+            if op == Op.ASSIGN:
+                source = read(arg1, scratch[0])
+                dest, attr_index = write(result)
+                if result & KIND_MASK == Operand.ATTR:
+                    code.extend([STORE_ATTR, attr_index, source])
+                else:
+                    code.extend([MOVE, dest, source])
+            elif op in BINARY:
+                a = read(arg1, scratch[0])
+                b = read(arg2, scratch[1])
+                dest, attr_index = write(result)
+                code.extend([BINARY[op], dest, a, b])
+                store(attr_index)
+            elif op in UNARY:
+                a = read(arg1, scratch[0])
+                dest, attr_index = write(result)
+                code.extend([UNARY[op], dest, a])
+                store(attr_index)
+            elif op == Op.LABEL:
+                labels[arg1] = len(code)
+            elif op == Op.GOTO:
+                code.extend([JUMP, 0])
+                jumps.append((len(code) - 1, arg1))
+            elif op == Op.IF_FALSE:
+                condition = read(arg1, scratch[0])
+                code.extend([JUMP_IF_FALSE, condition, 0])
+                jumps.append((len(code) - 1, arg2))
+            elif op == Op.PARAM:
+                # Attribute params are copied to their own slot, the scratch
+                # slots would be overwritten by the following params
+                if arg1 & KIND_MASK == Operand.ATTR:
+                    param_slot = len(template)
+                    template.append(None)
+                    code.extend([LOAD_ATTR, param_slot, cls.attribute_index[quads.value(arg1)]])
+                    params.append(param_slot)
+                else:
+                    params.append(slot(arg1))
+            elif op in (Op.CALL, Op.STATIC_CALL):
+                count = quads.value(arg2)
+                args = params[len(params) - count:]
+                del params[len(params) - count:]
+                dest, attr_index = write(result)
+                if op == Op.CALL:
+                    code.extend([CALL, dest, self.name_id(quads.value(arg1)), count] + args)
+                else:
+                    code.extend([STATIC_CALL, dest, self.name_id(quads.value(arg1)), count] + args)
+                store(attr_index)
+            elif op == Op.NEW:
+                dest, attr_index = write(result)
+                code.extend([NEW, dest, self.class_id(quads.value(arg1))])
+                store(attr_index)
+            elif op == Op.RETURN:
+                code.extend([RETURN, read(arg1, scratch[0])])
+            i += 1
+
+        for position, label in jumps:
+            code[position] = labels[label]
+
+        function.template = template
+        return i
+
+    def build_method_tables(self):
+        builtins = self.builtins()
+        for cls in self.ordered_classes():
+            parent = self.classes.get(cls.parent)
+            if parent is not None:
+                cls.methods = dict(parent.methods)
+            else:
+                # The walker resolves the IO methods from any class
+                cls.methods = {self.name_id(name): method for name, method in builtins.items()}
+            for name, function in cls.functions.items():
+                cls.methods[self.name_id(name)] = function
+
+        # Static calls are resolved now: "Type.method" -> function
+        self.static_methods = {}
+        for name, name_id in list(self.name_ids.items()):
+            if "." in name:
+                type_name, method_name = name.split(".", 1)
+                cls = self.classes.get(type_name)
+                if cls is not None:
+                    method = cls.methods.get(self.name_id(method_name))
+                    if method is not None:
+                        self.static_methods[name_id] = method
+
+    # ----------------------------------------------------------------------
+    # Built-in methods
+    # ----------------------------------------------------------------------
+
+    def builtins(self):
+        stdin, stdout = self.stdin, self.stdout
+
+        def out_string(receiver, value=""):
+            if not isinstance(value, str):
+                raise YaplRuntimeError("out_string espera un String")
+            stdout.write(value)
+            return receiver
+
+        def out_int(receiver, value=0):
+            if not isinstance(value, int):
+                raise YaplRuntimeError("out_int espera un Int")
+            stdout.write(str(int(value)))
+            return receiver
+
+        def in_string(receiver, *args):
+            line = stdin.readline()
+            return line[:-1] if line.endswith("\n") else line
+
+        def in_int(receiver, *args):
+            line = stdin.readline().strip()
+            try:
+                return int(line)
+            except ValueError:
+                return 0
+
+        def abort(receiver):
+            raise YaplRuntimeError("abort() en {cls}".format(cls=self.class_name(receiver)))
+
+        def type_name(receiver):
+            return self.class_name(receiver)
+
+        def copy(receiver):
+            if isinstance(receiver, Instance):
+                clone = Instance(receiver.cls)
+                clone.attrs = list(receiver.attrs)
+                return clone
+            return receiver
+
+        def length(receiver):
+            return len(receiver)
+
+        def concat(receiver, other):
+            return receiver + other
+
+        def substr(receiver, start, count):
+            if start < 0 or count < 0 or start + count > len(receiver):
+                raise YaplRuntimeError("substr fuera de rango")
+            return receiver[start:start + count]
+
+        return {
+            "out_string": out_string,
+            "out_int": out_int,
+            "in_string": in_string,
+            "in_int": in_int,
+            "abort": abort,
+            "type_name": type_name,
+            "copy": copy,
+            "length": length,
+            "concat": concat,
+            "substr": substr,
+        }
+
+    def class_name(self, value):
+        if isinstance(value, Instance):
+            return value.cls.name
+        if isinstance(value, bool):
+            return "Bool"
+        if isinstance(value, int):
+            return "Int"
+        if isinstance(value, str):
+            return "String"
+        return "Object"
+
+    def class_of(self, value):
+        if isinstance(value, Instance):
+            return value.cls
+        if value is None:
+            raise YaplRuntimeError("Dispatch a void")
+        return self.classes[self.class_name(value)]
+
+    # ----------------------------------------------------------------------
+    # Execution
+    # ----------------------------------------------------------------------
+
+    def instantiate(self, cls_id):
+        # Returns the new value and the _init functions to run, root class first
+        cls = self.class_list[cls_id]
+        if cls.name == "Int":
+            return 0, []
+        if cls.name == "String":
+            return "", []
+        if cls.name == "Bool":
+            return False, []
+
+        instance = Instance(cls)
+        inits = []
+        while cls is not None:
+            init = cls.functions.get(INIT_METHOD)
+            if init is not None:
+                inits.append(init)
+            cls = self.classes.get(cls.parent)
+        return instance, inits
+
+    def run_main(self):
+        if "Main" not in self.classes or self.name_id("main") not in self.classes["Main"].methods:
+            raise YaplRuntimeError("No existe Main.main")
+
+        # Bootstrap: t0 = new Main; t1 = t0.main(); return t1
+        boot = Function("(new Main).main()", self.classes["Object"])
+        boot.template = [None, None, None]
+        boot.code = [NEW, 1, self.class_id("Main"), CALL, 2, self.name_id("main"), 1, 1, RETURN, 2]
+        return self.execute(boot, [None])
+
+    def execute(self, function, args):
+        try:
+            return self.run(function, args)
+        except TypeError:
+            # Operations on values of the wrong type, in code that was not
+            # generated from a program accepted by the type checker
+            raise YaplRuntimeError("Operacion con tipos incompatibles")
+
+    def run(self, function, args):
+        frame = function.template[:]
+        frame[:len(args)] = args
+        code = function.code
+        pc = 0
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        static_methods = self.static_methods
+        class_of = self.class_of
+        instantiate = self.instantiate
+
+        while True:
+            op = code[pc]
+
+            if op == MOVE:
+                frame[code[pc + 1]] = frame[code[pc + 2]]
+                pc += 3
+            elif op == ADD:
+                frame[code[pc + 1]] = frame[code[pc + 2]] + frame[code[pc + 3]]
+                pc += 4
+            elif op == SUB:
+                frame[code[pc + 1]] = frame[code[pc + 2]] - frame[code[pc + 3]]
+                pc += 4
+            elif op == JUMP_IF_FALSE:
+                if frame[code[pc + 1]]:
+                    pc += 3
+                else:
+                    pc = code[pc + 2]
+            elif op == EQ:
+                frame[code[pc + 1]] = frame[code[pc + 2]] == frame[code[pc + 3]]
+                pc += 4
+            elif op == LT:
+                frame[code[pc + 1]] = frame[code[pc + 2]] < frame[code[pc + 3]]
+                pc += 4
+            elif op == LE:
+                frame[code[pc + 1]] = frame[code[pc + 2]] <= frame[code[pc + 3]]
+                pc += 4
+            elif op == CALL or op == STATIC_CALL:
+                count = code[pc + 3]
+                args = [frame[slot] for slot in code[pc + 4:pc + 4 + count]]
+                if op == CALL:
+                    method = class_of(args[0]).methods.get(code[pc + 2])
+                else:
+                    if args[0] is None:
+                        raise YaplRuntimeError("Dispatch a void")
+                    method = static_methods.get(code[pc + 2])
+                if method is None:
+                    raise YaplRuntimeError("Metodo no definido: {name}".format(name=self.names[code[pc + 2]]))
+
+                if not isinstance(method, Function):
+                    frame[code[pc + 1]] = method(*args)
+                    pc += 4 + count
+                    continue
+                if count != method.formals + 1:
+                    raise YaplRuntimeError("{name} espera {n} argumentos".format(name=method.name, n=method.formals))
+
+                push((code, pc + 4 + count, frame, code[pc + 1]))
+                code = method.code
+                frame = method.template[:]
+                frame[:count] = args
+                pc = 0
+            elif op == RETURN:
+                value = frame[code[pc + 1]]
+                if not stack:
+                    return value
+                code, pc, frame, dest = pop()
+                if dest is not None:
+                    frame[dest] = value
+            elif op == JUMP:
+                pc = code[pc + 1]
+            elif op == MUL:
+                frame[code[pc + 1]] = frame[code[pc + 2]] * frame[code[pc + 3]]
+                pc += 4
+            elif op == DIV:
+                divisor = frame[code[pc + 3]]
+                if divisor == 0:
+                    raise YaplRuntimeError("Division entre cero")
+                frame[code[pc + 1]] = int_div(frame[code[pc + 2]], divisor)
+                pc += 4
+            elif op == LOAD_ATTR:
+                frame[code[pc + 1]] = frame[0].attrs[code[pc + 2]]
+                pc += 3
+            elif op == STORE_ATTR:
+                frame[0].attrs[code[pc + 1]] = frame[code[pc + 2]]
+                pc += 3
+            elif op == NEW:
+                value, inits = instantiate(code[pc + 2])
+                dest = code[pc + 1]
+                pc += 3
+                if not inits:
+                    frame[dest] = value
+                    continue
+
+                # The _init functions run root class first; the last one to
+                # finish (the class itself) returns the new object to dest
+                push((code, pc, frame, dest))
+                for init in inits[:-1]:
+                    init_frame = init.template[:]
+                    init_frame[0] = value
+                    push((init.code, 0, init_frame, None))
+                code = inits[-1].code
+                frame = inits[-1].template[:]
+                frame[0] = value
+                pc = 0
+            elif op == NEG:
+                frame[code[pc + 1]] = -frame[code[pc + 2]]
+                pc += 3
+            elif op == NOT:
+                frame[code[pc + 1]] = not frame[code[pc + 2]]
+                pc += 3
+            elif op == ISVOID:
+                frame[code[pc + 1]] = frame[code[pc + 2]] is None
+                pc += 3
+            else:
+                raise YaplRuntimeError("Opcode invalido {op}".format(op=op))
+
+
+def main(argv=None):
+    from antlr4 import FileStream
+    from yaplCompiler import analyze
+    from yaplOptimizer import PassManager, LEVELS
+    from diagnostics import Diagnostic
+
+    parser = argparse.ArgumentParser(description="Ejecuta un programa YAPL: (new Main).main()")
+    parser.add_argument("file", help="archivo .yapl o programa enlazado por yaplBuild (.json)")
+    parser.add_argument("-O", dest="level", type=int, choices=sorted(LEVELS), default=1, help="nivel de optimizacion")
+    parser.add_argument("--time", action="store_true", help="mostrar el tiempo de ejecucion")
+    args = parser.parse_args(argv)
+
+    if args.file.endswith(".json"):
+        # A program linked by yaplBuild
+        with open(args.file, "r", encoding="utf-8") as f:
+            quads = Quadruples.from_dict(json.load(f))
+    else:
+        result = analyze(FileStream(args.file, encoding="utf-8"))
+        errors = result["syntax_errors"] + result["errors"]
+        if errors:
+            for error in errors:
+                print(Diagnostic.from_dict(error), file=sys.stderr)
+            return 1
+        quads = Quadruples.from_dict(result["intermediate_code"])
+    PassManager(args.level).run(quads)
+
+    vm = YaplVM(quads)
+    start = time.perf_counter()
+    try:
+        vm.run_main()
+    except YaplRuntimeError as e:
+        print("\nError de ejecucion: {msg}".format(msg=e), file=sys.stderr)
+        return 1
+    finally:
+        sys.stdout.flush()
+
+    if args.time:
+        print("\nTiempo de ejecucion: {seconds:.4f}s".format(seconds=time.perf_counter() - start), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
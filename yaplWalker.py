@@ -1,25 +1,32 @@
 
-import sys
-import ctypes
-from antlr4 import *
 from symbolTable import SymbolTable
+from classHierarchy import ClassHierarchy, class_header
+from yaplTypeChecker import yaplTypeChecker
+from diagnostics import Diagnostics, UNDEFINED, DUPLICATE, MAIN_CLASS, MAIN_METHOD, MAIN_INHERITS, MAIN_PARAMS, BASIC_INHERITANCE, RECURSIVE_INHERITANCE, MULTIPLE_INHERITANCE, OVERRIDE_SIGNATURE
 from build.yaplParser import yaplParser
-from build.yaplVisitor import yaplVisitor
+from yaplAst import AstVisitor, NodeKind
 
-# This class defines a custom visitor for a parse tree.
+# This class defines a custom visitor for the syntax tree (yaplAst).
 
 BOOL_MAX_SIZE = 28
 MAX_SIZE = 1234567890
 
-class yaplWalker(yaplVisitor):
+class yaplWalker(AstVisitor):
 
-    def __init__(self) -> None:
+    def __init__(self, diagnostics=None) -> None:
         self.basic_types = ["Int", "String", "Bool"]
-        self.errors = []
+        # Semantic errors go to the Diagnostics shared with the lexer and parser, if given
+        self.errors = diagnostics if diagnostics is not None else Diagnostics()
         self.main_class_count = 0
         self.main_method_count = 0
         self.current_class = None
         self.current_method = None
+        self.hierarchy = None
+        # Static type of every expression node, filled by the type checker
+        self.types = {}
+        # (kind, name) of every name reported as undefined; the walker
+        # declares them, so later lookups of the same name succeed
+        self.undefined = []
         super().__init__()
 
     def initSymbolTable(self):
@@ -28,54 +35,74 @@ class yaplWalker(yaplVisitor):
     def getSymbolTable(self):
         return  self.symbolTable
 
-    def find_or_create_type_id(self, ctx):
-
-        if not ctx.TYPE_ID():
+    def find_or_create_type_id(self, node):
+        terminal = self.ast.token(node, yaplParser.TYPE_ID)
+        if terminal == -1:
             return None
 
-        symbol = self.symbolTable.find("TYPE_ID", ctx.TYPE_ID())
-
-        if ctx.TYPE_ID():
-            payload_value = ctx.TYPE_ID().getPayload()
-        else:
-            payload_value = None
+        # Every class of the program is known before any body is visited, so
+        # a class can be used above its definition
+        name = self.ast.text(terminal)
+        symbol = name in self.hierarchy or self.symbolTable.find("TYPE_ID", name)
 
         if not symbol:
-            self.errors.append({
-                "msg": "Undefined: {id}".format(id=ctx.TYPE_ID()),
-                "payload": ctx.TYPE_ID().getPayload()
-            })
-
-            self.errors.append({
-            "msg": "...",
-            "payload": payload_value
-            })
+            self.errors.error(UNDEFINED, "Undefined: {id}".format(id=name), self.ast.position(terminal))
+            self.undefined.append(("TYPE_ID", name))
 
+            line, column = self.ast.position(terminal)
             self.symbolTable.add(
                 "TYPE_ID",
-                ctx.TYPE_ID(),
-                line=ctx.TYPE_ID().getPayload().line,
-                column=ctx.TYPE_ID().getPayload().column
+                name,
+                line=line,
+                column=column
             )
 
-    def find_or_create_object_id(self, ctx):
-        symbol = self.symbolTable.find("OBJECT_ID", ctx.OBJECT_ID())
+    def find_or_create_object_id(self, node):
+        terminal = self.ast.token(node, yaplParser.OBJECT_ID)
+        if terminal == -1:
+            return None
+
+        # Names are resolved through the scope chain (local -> method -> class
+        # -> inherited classes), so the innermost definition wins
+        name = self.ast.text(terminal)
+        symbol = self.symbolTable.resolve(name)
+
+        # Attributes and methods come from the hierarchy, built before any
+        # body is visited: they can be used above their definition, and the
+        # scope of a parent defined further down is still empty
+        if not symbol and self.current_class is not None:
+            symbol = self.hierarchy.lookup_attribute(self.current_class, name) or self.hierarchy.lookup_method(self.current_class, name)
 
         if not symbol:
-            self.errors.append({
-                "msg": "Undefined: {id}".format(id=ctx.OBJECT_ID()),
-                "payload": ctx.OBJECT_ID().getPayload()
-            })
+            self.errors.error(UNDEFINED, "Undefined: {id}".format(id=name), self.ast.position(terminal))
+            self.undefined.append(("OBJECT_ID", name))
 
-            self.symbolTable.add(
+            line, column = self.ast.position(terminal)
+            symbol = self.symbolTable.add(
                 "OBJECT_ID",
-                ctx.OBJECT_ID(),
-                line=ctx.OBJECT_ID().getPayload().line,
-                column=ctx.OBJECT_ID().getPayload().column
+                name,
+                line=line,
+                column=column
             )
-
-    # Visit a parse tree produced by yaplParser#prog.
-    def visitProg(self, ctx:yaplParser.ProgContext):
+            # Reported once per scope, not on every use
+            self.symbolTable.declare(symbol)
+
+    # Visit a prog node.
+    def visitProg(self, node):
+        # Inheritance, methods and attributes of every class, before any body
+        # is visited
+        self.begin_program(ClassHierarchy.from_ast(self.ast))
+        yield from self.visitChildren(node)
+        self.end_program()
+        return node
+
+
+    # visitProg is split in two so classes can also be walked one at a time
+    # (see yaplIncremental)
+    def begin_program(self, hierarchy):
+        self.hierarchy = hierarchy
+        self.checker = yaplTypeChecker(hierarchy, self.errors)
+        self.types = self.checker.types
 
         # Defining Int
         self.symbolTable.add(
@@ -145,152 +172,154 @@ class yaplWalker(yaplVisitor):
             scope_type="global",
         )
 
-        self.visitChildren(ctx)
-
+    def end_program(self):
         # Checking the amount of Main classes
         if self.main_class_count != 1:
-            self.errors.append({
-                "msg": "Solo una clase Main debe existir",
-                # "payload": ctx.TYPE_ID()[0].getPayload()
-            })
+            self.errors.error(MAIN_CLASS, "Solo una clase Main debe existir")
 
         # Checking the amount of main methods
         if self.main_method_count != 1:
-            self.errors.append({
-                "msg": "Solo un metodo main en la clase Main debe existir",
-                # "payload": feat_child_ctx.OBJECT_ID().getPayload()
-            })
-
-        return ctx
+            self.errors.error(MAIN_METHOD, "Solo un metodo main en la clase Main debe existir")
 
 
-    # Visit a parse tree produced by yaplParser#class_def.
-    def visitClass_def(self, ctx:yaplParser.Class_defContext):
+    # Visit a class_def node.
+    def visitClass_def(self, node):
+        ast = self.ast
+        name, parents = class_header(ast, node)
+        # A class the parser could not recognize
+        if name == -1:
+            return node
 
-        self.current_class = str(ctx.TYPE_ID()[0])
+        self.current_class = ast.text(name)
 
         # Checking Main Class errors
         if self.current_class == "Main":
             self.main_class_count += 1
-            if len(ctx.TYPE_ID()) > 1:
-                self.errors.append({
-                    "msg": "Clase Main no debe heredar de ninguna",
-                    "payload": ctx.TYPE_ID()[1].getPayload()
-                })
+            if parents:
+                self.errors.error(MAIN_INHERITS, "Clase Main no debe heredar de ninguna", ast.position(parents[0]))
 
+        class_token = ast.token(node, yaplParser.CLASS)
+        line, column = ast.position(class_token)
         self.symbolTable.add(
             "TYPE_ID",
             self.current_class,
-            ctx.CLASS(),
-            line=ctx.CLASS().getPayload().line,
-            column=ctx.CLASS().getPayload().column
+            ast.text(class_token),
+            line=line,
+            column=column
         )
 
         # Class inheritance validations
-        if ctx.INHERITS():
+        if parents:
             # Inherit from a basic type is not possible
-            if str(ctx.TYPE_ID()[1]) in self.basic_types:
-                self.errors.append({
-                    "msg": "No se puede heredar de un tipo basico",
-                    "payload": ctx.TYPE_ID()[1].getPayload()
-                })
-
-            # Recursive inheritance is not possible
-            if self.current_class == str(ctx.TYPE_ID()[1]):
-                self.errors.append({
-                    "msg": "No se puede heredar recursivamente",
-                    "payload": ctx.TYPE_ID()[1].getPayload()
-                })
+            if ast.text(parents[0]) in self.basic_types:
+                self.errors.error(BASIC_INHERITANCE, "No se puede heredar de un tipo basico", ast.position(parents[0]))
+
+            # Recursive inheritance (directly or through other classes) is not possible
+            if self.current_class in self.hierarchy.cycles:
+                self.errors.error(RECURSIVE_INHERITANCE, "No se puede heredar recursivamente", ast.position(parents[0]))
 
             # Multiple inheritance is not possible
-            if len(ctx.TYPE_ID()) >= 3 and ctx.TYPE_ID()[2]:
-                self.errors.append({
-                    "msg": "No se puede tener multiple herencia",
-                    "payload": ctx.TYPE_ID()[2].getPayload()
-                })
+            if len(parents) >= 2:
+                self.errors.error(MULTIPLE_INHERITANCE, "No se puede tener multiple herencia", ast.position(parents[1]))
+
+        parent = ast.text(parents[0]) if parents else None
+        self.symbolTable.enter_class(self.current_class, parent)
+        yield from self.visitChildren(node)
+        self.symbolTable.exit_scope()
 
-        self.visitChildren(ctx)
-        return ctx
+        # Expression types, once every name of the class was checked
+        self.checker.walk(ast, node)
+        return node
 
 
-    # Visit a parse tree produced by yaplParser#feat_def.
-    def visitFeat_def(self, ctx:yaplParser.Feat_defContext):
-        self.current_method = str(ctx.OBJECT_ID())
+    # Visit a feat_def node.
+    def visitFeat_def(self, node):
+        ast = self.ast
+        name = ast.token(node, yaplParser.OBJECT_ID)
+        formals = ast.children(node, NodeKind.FORMAL)
+        self.current_method = ast.text(name)
+        line, column = ast.position(name)
 
         # Checking the amount of main methods
-        if str(ctx.OBJECT_ID()) == "main":
+        if self.current_method == "main":
             self.main_method_count += 1
 
-            if len(ctx.formal()) > 0:
-                self.errors.append({
-                    "msg": "Metodo main no debe tener parametros formales",
-                    "payload": ctx.OBJECT_ID().getPayload()
-                })
+            if len(formals) > 0:
+                self.errors.error(MAIN_PARAMS, "Metodo main no debe tener parametros formales", ast.position(name))
 
         self.symbolTable.add(
             "OBJECT_ID",
-            ctx.OBJECT_ID(),
-            ctx.TYPE_ID(),
-            line=ctx.OBJECT_ID().getPayload().line,
-            column=ctx.OBJECT_ID().getPayload().column,
-            numParams=len(ctx.formal()),
+            self.current_method,
+            ast.text(ast.token(node, yaplParser.TYPE_ID)),
+            line=line,
+            column=column,
+            numParams=len(formals),
             paramTypes=[],
             scope="{class_scope}".format(class_scope=self.current_class),
             scope_type="global",
         )
 
-        self.visitChildren(ctx)
-        return ctx
+        # An override must keep the signature of the inherited method
+        method = self.hierarchy.lookup_method(self.current_class, self.current_method)
+        inherited = self.hierarchy.overridden(self.current_class, self.current_method)
+        if method is not None and inherited is not None and method.owner == self.current_class and not method.same_signature(inherited):
+            self.errors.error(OVERRIDE_SIGNATURE, "{id} debe tener la misma firma que en {cls}".format(id=self.current_method, cls=inherited.owner), ast.position(name))
+
+        # Formals and the body live in a scope of the method
+        self.symbolTable.enter_scope(self.current_method)
+        yield from self.visitChildren(node)
+        self.symbolTable.exit_scope()
+        return node
 
 
-    # Visit a parse tree produced by yaplParser#feat_asgn.
-    def visitFeat_asgn(self, ctx:yaplParser.Feat_asgnContext):
+    # Visit a feat_asgn node.
+    def visitFeat_asgn(self, node):
+        ast = self.ast
+        name = ast.token(node, yaplParser.OBJECT_ID)
+        line, column = ast.position(name)
         self.symbolTable.add(
             "OBJECT_ID",
-            ctx.OBJECT_ID(),
-            ctx.TYPE_ID(),
-            line=ctx.OBJECT_ID().getPayload().line,
-            column=ctx.OBJECT_ID().getPayload().column,
+            ast.text(name),
+            ast.text(ast.token(node, yaplParser.TYPE_ID)),
+            line=line,
+            column=column,
             scope="{class_scope}".format(class_scope=self.current_class),
             scope_type="global",
         )
 
-        self.visitChildren(ctx)
-        return ctx
+        yield from self.visitChildren(node)
+        return node
 
 
-    # Visit a parse tree produced by yaplParser#formal.
-    def visitFormal(self, ctx:yaplParser.FormalContext):
+    # Visit a formal node.
+    def visitFormal(self, node):
+        ast = self.ast
         global_scope = "{class_scope}".format(class_scope=self.current_class)
         scope = "{method_scope}".format(method_scope=self.current_method)
+        name = ast.token(node, yaplParser.OBJECT_ID)
+        type_id = ast.text(ast.token(node, yaplParser.TYPE_ID))
 
         # Adding the current formal to the feature which belongs
         feature_symbol = self.symbolTable.find("OBJECT_ID", self.current_method, global_scope, "global")
 
         if feature_symbol:
-            feature_symbol.paramTypes.append(str(ctx.TYPE_ID()))
+            feature_symbol.paramTypes.append(str(type_id))
 
         # Checking if already exists this formal on the current_scope
-        symbol = self.symbolTable.find("OBJECT_ID", ctx.OBJECT_ID(), scope, "local")
-
-        if symbol:
-            self.errors.append({
-                "msg": "{id} already exists".format(id=ctx.OBJECT_ID()),
-                "payload": ctx.OBJECT_ID().getPayload()
-            })
+        if str(ast.text(name)) in self.symbolTable.current_scope().symbols:
+            self.errors.error(DUPLICATE, "{id} already exists".format(id=ast.text(name)), ast.position(name))
 
+        line, column = ast.position(name)
         self.symbolTable.add(
             "OBJECT_ID",
-            ctx.OBJECT_ID(),
-            ctx.TYPE_ID(),
-            line=ctx.OBJECT_ID().getPayload().line,
-            column=ctx.OBJECT_ID().getPayload().column,
+            ast.text(name),
+            type_id,
+            line=line,
+            column=column,
             scope=scope,
             scope_type="local",
         )
-
-        self.visitChildren(ctx)
-        return ctx
+        return node
 
 
     # ========================================================================================
@@ -298,177 +327,105 @@ class yaplWalker(yaplVisitor):
     # ========================================================================================
 
 
-    # Visit a parse tree produced by yaplParser#expr_asgn.
-    def visitExpr_asgn(self, ctx:yaplParser.Expr_asgnContext):
-        self.find_or_create_object_id(ctx)
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_class_call.
-    def visitExpr_class_call(self, ctx:yaplParser.Expr_class_callContext):
-        self.find_or_create_type_id(ctx)
-        self.find_or_create_object_id(ctx)
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_call.
-    def visitExpr_call(self, ctx:yaplParser.Expr_callContext):
-        self.find_or_create_object_id(ctx)
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_if.
-    def visitExpr_if(self, ctx:yaplParser.Expr_ifContext):
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_while.
-    def visitExpr_while(self, ctx:yaplParser.Expr_whileContext):
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_brackets.
-    def visitExpr_brackets(self, ctx:yaplParser.Expr_bracketsContext):
-        return self.visitChildren(ctx)
-
+    # Visit an expr_asgn node.
+    def visitExpr_asgn(self, node):
+        self.find_or_create_object_id(node)
+        return (yield from self.visitChildren(node))
 
-    # Visit a parse tree produced by yaplParser#expr_decl.
-    def visitExpr_decl(self, ctx:yaplParser.Expr_declContext):
 
-        # TODO: revisar
-        self.symbolTable.add(
-            "OBJECT_ID",
-            ctx.OBJECT_ID()[0],
-            ctx.TYPE_ID()[0],
-            line=ctx.LET().getPayload().line,
-            column=ctx.LET().getPayload().column
-        )
-
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_instance.
-    def visitExpr_instance(self, ctx:yaplParser.Expr_instanceContext):
-        self.find_or_create_type_id(ctx)
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_isvoid.
-    def visitExpr_isvoid(self, ctx:yaplParser.Expr_isvoidContext):
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_suma.
-    def visitExpr_suma(self, ctx:yaplParser.Expr_sumaContext):
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_mult.
-    def visitExpr_mult(self, ctx:yaplParser.Expr_multContext):
-        return self.visitChildren(ctx)
-
-
-    # Visit a parse tree produced by yaplParser#expr_negative.
-    def visitExpr_negative(self, ctx:yaplParser.Expr_negativeContext):
-        return self.visitChildren(ctx)
+    # Visit an expr_class_call node.
+    def visitExpr_class_call(self, node):
+        # The method belongs to the type of the receiver, not to the current
+        # scopes: expr@Type.method() must find it in Type, otherwise some
+        # class has to define it
+        ast = self.ast
+        self.find_or_create_type_id(node)
+        type_id = ast.text(ast.token(node, yaplParser.TYPE_ID))
+        name = ast.token(node, yaplParser.OBJECT_ID)
+        if type_id is not None:
+            found = type_id not in self.hierarchy or self.hierarchy.lookup_method(type_id, ast.text(name)) is not None
+        else:
+            found = str(ast.text(name)) in self.hierarchy.method_names
 
+        if not found:
+            self.errors.error(UNDEFINED, "Undefined: {id}".format(id=ast.text(name)), ast.position(name))
+        return (yield from self.visitChildren(node))
 
-    # Visit a parse tree produced by yaplParser#expr_negado.
-    def visitExpr_negado(self, ctx:yaplParser.Expr_negadoContext):
-        return self.visitChildren(ctx)
 
+    # Visit an expr_call node.
+    def visitExpr_call(self, node):
+        self.find_or_create_object_id(node)
+        return (yield from self.visitChildren(node))
 
-    # Visit a parse tree produced by yaplParser#expr_less_than.
-    def visitExpr_less_than(self, ctx:yaplParser.Expr_less_thanContext):
-        return self.visitChildren(ctx)
 
+    # Visit an expr_decl node.
+    def visitExpr_decl(self, node):
+        ast = self.ast
+        self.symbolTable.enter_scope("let@{line}:{column}".format(line=ast.line[node], column=ast.column[node]))
 
-    # Visit a parse tree produced by yaplParser#expr_equal.
-    def visitExpr_equal(self, ctx:yaplParser.Expr_equalContext):
-        return self.visitChildren(ctx)
+        # One let_var per variable, then the body
+        for child in ast.children(node):
+            if ast.kind[child] != NodeKind.LET_VAR:
+                yield child
+                continue
 
+            # The initializer does not see its own variable
+            yield ast.first[child]
 
-    # Visit a parse tree produced by yaplParser#expr_not.
-    def visitExpr_not(self, ctx:yaplParser.Expr_notContext):
-        return self.visitChildren(ctx)
+            name = ast.token(child, yaplParser.OBJECT_ID)
+            line, column = ast.position(name)
+            self.symbolTable.add(
+                "OBJECT_ID",
+                ast.text(name),
+                ast.text(ast.token(child, yaplParser.TYPE_ID)),
+                line=line,
+                column=column,
+                scope=self.symbolTable.current_scope().name,
+                scope_type="local",
+            )
 
+        self.symbolTable.exit_scope()
+        return node
 
-    # Visit a parse tree produced by yaplParser#expr_parenthesis.
-    def visitExpr_parenthesis(self, ctx:yaplParser.Expr_parenthesisContext):
-        return self.visitChildren(ctx)
 
+    # Visit an expr_instance node.
+    def visitExpr_instance(self, node):
+        self.find_or_create_type_id(node)
+        return None
 
-    # Visit a parse tree produced by yaplParser#expr_id.
-    def visitExpr_id(self, ctx:yaplParser.Expr_idContext):
-        self.find_or_create_type_id(ctx)
-        self.find_or_create_object_id(ctx)
-        return self.visitChildren(ctx)
 
+    # Visit an expr_id node.
+    def visitExpr_id(self, node):
+        self.find_or_create_type_id(node)
+        self.find_or_create_object_id(node)
+        return None
 
-    # Visit a parse tree produced by yaplParser#expr_int.
-    def visitExpr_int(self, ctx:yaplParser.Expr_intContext):
-        # x = 14
-        # print(id(x))
-        # print(hex(id(x)))
-        # print(ctypes.string_at(id(x), sys.getsizeof(x)))
 
-        self.symbolTable.add(
-            "INT",
-            ctx.INT(),
-            line=ctx.INT().getPayload().line,
-            column=ctx.INT().getPayload().column,
-            size=sys.getsizeof(int(ctx.INT().getText())),
-            max_size=MAX_SIZE,
-            address_id=id(int(ctx.INT().getText()))
-        )
-        return self.visitChildren(ctx)
+    # Literals go to the constant pool of the symbol table: one symbol per
+    # distinct value, with the position of every occurrence
 
+    def add_literal(self, node, kind, token_type, max_size):
+        token = self.ast.token(node, token_type)
+        line, column = self.ast.position(token)
+        self.symbolTable.add_literal(kind, self.ast.text(token), line, column, max_size)
+        return None
 
-    # Visit a parse tree produced by yaplParser#expr_str.
-    def visitExpr_str(self, ctx:yaplParser.Expr_strContext):
-        self.symbolTable.add(
-            "STRING",
-            ctx.STRING(),
-            line=ctx.STRING().getPayload().line,
-            column=ctx.STRING().getPayload().column,
-            size=sys.getsizeof(str(ctx.STRING().getText())),
-            max_size=MAX_SIZE,
-            address_id=id(str(ctx.STRING().getText()))
-        )
-        return self.visitChildren(ctx)
-
+    # Visit an expr_int node.
+    def visitExpr_int(self, node):
+        return self.add_literal(node, "INT", yaplParser.INT, MAX_SIZE)
 
-    # Visit a parse tree produced by yaplParser#expr_true.
-    def visitExpr_true(self, ctx:yaplParser.Expr_trueContext):
-        self.symbolTable.add(
-            "TRUE",
-            ctx.TRUE(),
-            line=ctx.TRUE().getPayload().line,
-            column=ctx.TRUE().getPayload().column,
-            size=sys.getsizeof(bool(ctx.TRUE().getText())),
-            max_size=BOOL_MAX_SIZE,
-            address_id=id(bool(ctx.TRUE().getText()))
-        )
-        return self.visitChildren(ctx)
 
+    # Visit an expr_str node.
+    def visitExpr_str(self, node):
+        return self.add_literal(node, "STRING", yaplParser.STRING, MAX_SIZE)
 
-    # Visit a parse tree produced by yaplParser#expr_false.
-    def visitExpr_false(self, ctx:yaplParser.Expr_falseContext):
-        self.symbolTable.add(
-            "FALSE",
-            ctx.FALSE(),
-            line=ctx.FALSE().getPayload().line,
-            column=ctx.FALSE().getPayload().column,
-            size=sys.getsizeof(bool(ctx.FALSE().getText())),
-            max_size=BOOL_MAX_SIZE,
-            address_id=id(bool(ctx.FALSE().getText()))
-        )
-        return self.visitChildren(ctx)
 
+    # Visit an expr_true node.
+    def visitExpr_true(self, node):
+        return self.add_literal(node, "TRUE", yaplParser.TRUE, BOOL_MAX_SIZE)
 
-    # Visit a parse tree produced by yaplParser#expr_self.
-    def visitExpr_self(self, ctx:yaplParser.Expr_selfContext):
-        return self.visitChildren(ctx)
 
+    # Visit an expr_false node.
+    def visitExpr_false(self, node):
+        return self.add_literal(node, "FALSE", yaplParser.FALSE, BOOL_MAX_SIZE)
 
-del yaplParser